@@ -71,12 +71,14 @@ async def backup_sales_data(
 @router.post("/inventory", response_model=BackupResponse)
 async def backup_inventory_data(
     current_user: User = Depends(get_current_user),
+    incremental: bool = Query(False),
     db: Session = Depends(get_db),
 ):
     """
     Trigger a manual backup of inventory (products) data
 
     - **Admin only**: Requires admin role
+    - **Incremental**: Only products changed since the last inventory backup
     """
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
@@ -86,10 +88,13 @@ async def backup_inventory_data(
     if not backup_service.is_initialized:
         raise HTTPException(status_code=503, detail="Backup service is not initialized")
 
-    result = await backup_service.backup_inventory_data()
+    result = await backup_service.backup_inventory_data(incremental)
 
     # Log backup in database
-    if result.get("status") == BackupStatus.completed.value:
+    if result.get("status") in (
+        BackupStatus.completed.value,
+        BackupStatus.no_changes.value,
+    ):
         backup_log = BackupLog(
             backup_id=result.get("backup_id"),
             backup_type="inventory",
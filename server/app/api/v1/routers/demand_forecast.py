@@ -4,7 +4,7 @@
 # ===========================================
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
@@ -65,6 +65,11 @@ class TrainModelResponse(BaseModel):
     trained_at: str
 
 
+class TrainAndForecastResponse(BaseModel):
+    training: TrainModelResponse
+    forecast: GenerateForecastResponse
+
+
 class ForecastMetricsOut(BaseModel):
     mae: float = Field(..., description="Mean Absolute Error")
     mape: Optional[float] = Field(None, description="Mean Absolute Percentage Error")
@@ -173,6 +178,32 @@ def generate_forecast(
     return result
 
 
+@router.post("/train-and-forecast", response_model=TrainAndForecastResponse)
+def train_and_forecast(
+    request: GenerateForecastRequest,
+    db: Session = Depends(get_db),
+    current_user: m.User = Depends(get_current_user),
+):
+    """
+    Train a model for a product and generate its forecast in one request.
+
+    - **product_id**: Product to train on and forecast
+    - **days_ahead**: Number of days to forecast (default: 30)
+    - **model_type**: Forecasting model to use (default: ensemble)
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can train models")
+
+    result = demand_forecast_service.train_and_forecast(
+        db, request.product_id, request.days_ahead, request.model_type, current_user.id
+    )
+
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+
+    return result
+
+
 @router.get("/summary/{product_id}", response_model=ForecastSummaryOut)
 def get_forecast_summary(
     product_id: int,
@@ -192,6 +223,21 @@ def get_forecast_summary(
     return result
 
 
+@router.get("/summaries", response_model=Dict[int, ForecastSummaryOut])
+def get_forecast_summaries(
+    product_ids: List[int] = Query(..., description="Product IDs to summarize"),
+    db: Session = Depends(get_db),
+    current_user: m.User = Depends(get_current_user),
+):
+    """
+    Get summaries of the latest forecasts for several products.
+
+    - **product_ids**: Product IDs to get forecast summaries; products without
+      a forecast are left out
+    """
+    return demand_forecast_service.get_forecast_summary_many(db, product_ids)
+
+
 @router.get("/low-stock-alerts", response_model=List[LowStockAlert])
 def get_low_stock_alerts(
     threshold_days: int = Query(
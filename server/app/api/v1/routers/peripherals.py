@@ -349,6 +349,8 @@ def generate_barcode(
     Returns:
     - Base64 encoded PNG image
     - SVG version for web display
+
+    Pass `outputs` (e.g. `["png"]`) to render only the formats you need.
     """
     try:
         result = barcode_service.generate_barcode(
@@ -357,6 +359,7 @@ def generate_barcode(
             width=request.width,
             height=request.height,
             include_text=request.include_text,
+            outputs=frozenset(request.outputs),
         )
 
         return GenerateBarcodeResponse(
@@ -7,7 +7,7 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import HTMLResponse, PlainTextResponse
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 
 from app.api.v1.schemas.refund import RefundItem, RefundRequest, RefundResponse
@@ -22,13 +22,13 @@ from app.api.v1.schemas.sales import (
 )
 from app.core.deps import get_current_user, get_db
 from app.db import models as m
+from app.services.email_service import EmailService
 from app.services.receipt import (
     Receipt,
     ReceiptItem,
     generate_receipt_html,
     generate_receipt_text,
 )
-from app.services.email_service import EmailService
 from app.services.sms_service import SMSService
 from app.services.tax_service import TaxService
 from app.services.ws_manager import manager
@@ -59,19 +59,22 @@ def refund_sale(
         raise HTTPException(400, detail="Employee ID is required for refund processing")
 
     # Verify employee exists (check by ID or email)
+    employee_email = payload.employee_id.strip().lower()
     if payload.employee_id.isdigit():
         employee = (
             db.query(m.User)
             .filter(
                 or_(
                     m.User.id == int(payload.employee_id),
-                    m.User.email == payload.employee_id,
+                    func.lower(m.User.email) == employee_email,
                 )
             )
             .first()
         )
     else:
-        employee = db.query(m.User).filter(m.User.email == payload.employee_id).first()
+        employee = (
+            db.query(m.User).filter(func.lower(m.User.email) == employee_email).first()
+        )
     if not employee:
         raise HTTPException(400, detail="Invalid Employee ID")
     if not employee.is_active:
@@ -140,19 +143,22 @@ def return_sale(
         raise HTTPException(400, detail="Employee ID is required for return processing")
 
     # Verify employee exists (check by ID or email)
+    employee_email = payload.employee_id.strip().lower()
     if payload.employee_id.isdigit():
         employee = (
             db.query(m.User)
             .filter(
                 or_(
                     m.User.id == int(payload.employee_id),
-                    m.User.email == payload.employee_id,
+                    func.lower(m.User.email) == employee_email,
                 )
             )
             .first()
         )
     else:
-        employee = db.query(m.User).filter(m.User.email == payload.employee_id).first()
+        employee = (
+            db.query(m.User).filter(func.lower(m.User.email) == employee_email).first()
+        )
     if not employee:
         raise HTTPException(400, detail="Invalid Employee ID")
     if not employee.is_active:
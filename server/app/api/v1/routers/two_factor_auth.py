@@ -3,8 +3,7 @@ Vendly POS - Two-Factor Authentication API Routes
 Supports: TOTP (authenticator apps), Email, SMS
 """
 
-import random
-import string
+import secrets
 from datetime import datetime, timedelta
 from typing import Literal, Optional
 
@@ -366,7 +365,7 @@ async def send_2fa_code(
         )
 
     # Generate 6-digit code
-    code = "".join(random.choices(string.digits, k=6))
+    code = f"{secrets.randbelow(10**6):06d}"
     expires_at = datetime.utcnow() + timedelta(minutes=5)
 
     # Store code temporarily
@@ -383,7 +382,9 @@ async def send_2fa_code(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="User has no email address",
             )
-        success = EmailService.send_2fa_code(user.email, code, user.full_name or "User")
+        success = await EmailService.send_2fa_code_async(
+            user.email, code, user.full_name or "User"
+        )
         masked = f"{user.email[:3]}***@{user.email.split('@')[-1]}"
     else:  # sms
         phone = getattr(user, "phone", None)
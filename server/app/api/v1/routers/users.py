@@ -6,6 +6,7 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.core.deps import get_current_user, get_db, require_role
@@ -16,7 +17,7 @@ from app.services.audit import (
     log_user_created,
     log_user_deleted,
 )
-from app.services.auth import hash_password
+from app.services.auth import hash_password, invalidate_user_cache, normalize_email
 
 router = APIRouter()
 
@@ -79,8 +80,10 @@ def create_user(
     admin=Depends(require_admin),
 ):
     """Create a new user (admin only)"""
+    email = normalize_email(payload.email)
+
     # Check for duplicate email
-    existing = db.query(m.User).filter(m.User.email == payload.email).first()
+    existing = db.query(m.User).filter(func.lower(m.User.email) == email).first()
     if existing:
         raise HTTPException(400, detail="User with this email already exists")
 
@@ -92,7 +95,7 @@ def create_user(
         )
 
     new_user = m.User(
-        email=payload.email,
+        email=email,
         password_hash=hash_password(payload.password),
         full_name=payload.full_name,
         role=payload.role,
@@ -101,6 +104,7 @@ def create_user(
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    invalidate_user_cache(new_user.email)
 
     # Audit log
     log_user_created(admin.id, new_user.id, new_user.email, new_user.role)
@@ -134,8 +138,9 @@ def update_user(
         raise HTTPException(404, detail="User not found")
 
     # Check for duplicate email if changing
-    if payload.email and payload.email != db_user.email:
-        existing = db.query(m.User).filter(m.User.email == payload.email).first()
+    email = normalize_email(payload.email) if payload.email else None
+    if email and email != db_user.email.lower():
+        existing = db.query(m.User).filter(func.lower(m.User.email) == email).first()
         if existing:
             raise HTTPException(400, detail="User with this email already exists")
 
@@ -148,8 +153,9 @@ def update_user(
             )
 
     # Apply updates
-    if payload.email is not None:
-        db_user.email = payload.email
+    previous_email = db_user.email
+    if email is not None:
+        db_user.email = email
     if payload.full_name is not None:
         db_user.full_name = payload.full_name
     if payload.role is not None:
@@ -161,6 +167,8 @@ def update_user(
 
     db.commit()
     db.refresh(db_user)
+    invalidate_user_cache(previous_email)
+    invalidate_user_cache(db_user.email)
     return db_user
 
 
@@ -182,5 +190,7 @@ def delete_user(
     # Audit log before deletion
     log_user_deleted(current_user.id, db_user.id, db_user.email)
 
+    deleted_email = db_user.email
     db.delete(db_user)
     db.commit()
+    invalidate_user_cache(deleted_email)
@@ -65,8 +65,11 @@ class Settings(BaseSettings):
 
     # Audit Logging
     AUDIT_LOG_ENABLED: bool = Field(default=True, alias="AUDIT_LOG_ENABLED")
+    # Each process writes its own file, with its PID before the extension
     AUDIT_LOG_FILE: str = Field(default="audit.log", alias="AUDIT_LOG_FILE")
     AUDIT_LOG_LEVEL: str = Field(default="INFO", alias="AUDIT_LOG_LEVEL")
+    AUDIT_LOG_MAX_BYTES: int = Field(default=50_000_000, alias="AUDIT_LOG_MAX_BYTES")
+    AUDIT_LOG_BACKUP_COUNT: int = Field(default=10, alias="AUDIT_LOG_BACKUP_COUNT")
 
     # Session Management
     SESSION_TIMEOUT_MINUTES: int = Field(default=15, alias="SESSION_TIMEOUT_MINUTES")
@@ -92,6 +95,9 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = Field(default="", alias="SMTP_PASSWORD")
     SMTP_FROM: str = Field(default="noreply@vendly.com", alias="SMTP_FROM")
     SMTP_TLS: bool = Field(default=True, alias="SMTP_TLS")
+    # Pooled SMTP connections are retired after this many messages or seconds
+    SMTP_MAX_MSGS_PER_CONN: int = Field(default=100, alias="SMTP_MAX_MSGS_PER_CONN")
+    SMTP_MAX_CONN_AGE: int = Field(default=1800, alias="SMTP_MAX_CONN_AGE")
 
     # SMS Configuration (for 2FA)
     SMS_ENABLED: bool = Field(default=False, alias="SMS_ENABLED")
@@ -150,6 +156,11 @@ class Settings(BaseSettings):
     STORAGE_TYPE: str = "local"
     STORAGE_PATH: str = "./uploads"
 
+    # Barcode render cache: entries are fresh for BARCODE_CACHE_TTL seconds,
+    # then served stale for up to BARCODE_CACHE_SWR_TTL more while refreshed
+    BARCODE_CACHE_TTL: int = Field(default=3600, alias="BARCODE_CACHE_TTL")
+    BARCODE_CACHE_SWR_TTL: int = Field(default=600, alias="BARCODE_CACHE_SWR_TTL")
+
     # Cloud Backup Configuration
     BACKUP_ENABLED: bool = Field(default=True, alias="BACKUP_ENABLED")
     BACKUP_PROVIDER: str = Field(
@@ -180,6 +191,9 @@ class Settings(BaseSettings):
         default="02:00", alias="BACKUP_SCHEDULE_TIME"
     )  # Format: HH:MM
     BACKUP_RETENTION_DAYS: int = Field(default=30, alias="BACKUP_RETENTION_DAYS")
+    # Let S3/GCS expire backups after BACKUP_RETENTION_DAYS with a bucket
+    # lifecycle rule (applies to every job, regardless of its own retention)
+    BACKUP_LIFECYCLE_RULES: bool = Field(default=False, alias="BACKUP_LIFECYCLE_RULES")
 
     # APScheduler Configuration
     SCHEDULER_ENABLED: bool = Field(default=True, alias="SCHEDULER_ENABLED")
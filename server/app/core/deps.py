@@ -1,9 +1,9 @@
 # app/core/deps.py
 from typing import Callable, Generator, List, Union
 
+import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
@@ -50,7 +50,7 @@ def get_current_user(
             )
 
         return user
-    except JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
@@ -1,7 +1,7 @@
-from datetime import datetime, timedelta, timezone
+import time
 
 import bcrypt
-from jose import jwt
+import jwt
 
 from app.core.config import settings
 
@@ -17,16 +17,14 @@ def verify_password(p: str, h: str) -> bool:
 
 
 def create_access_token(sub: str, expires_min: int | None = None) -> str:
-    expire = datetime.now(timezone.utc) + timedelta(
-        minutes=expires_min or settings.ACCESS_TTL_MIN
-    )
+    expire = int(time.time()) + (expires_min or settings.ACCESS_TTL_MIN) * 60
     return jwt.encode(
         {"sub": sub, "exp": expire}, settings.JWT_SECRET, algorithm=settings.JWT_ALG
     )
 
 
 def create_refresh_token(sub: str) -> str:
-    expire = datetime.now(timezone.utc) + timedelta(days=settings.REFRESH_TTL_DAYS)
+    expire = int(time.time()) + settings.REFRESH_TTL_DAYS * 86400
     return jwt.encode(
         {"sub": sub, "exp": expire, "type": "refresh"},
         settings.JWT_SECRET,
@@ -0,0 +1,51 @@
+"""Add case-insensitive unique index on users.email
+
+Revision ID: 20261018_01
+Revises: 004_multistore_franchise
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "20261018_01"
+down_revision = "004_multistore_franchise"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Accounts differing only by case or whitespace would make the UPDATE
+    # below violate the existing unique index on email; they must be merged
+    # by hand, since sales, sessions and audit rows point at each user id.
+    duplicates = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT lower(trim(email)) AS email, count(*) AS accounts"
+                " FROM users GROUP BY lower(trim(email)) HAVING count(*) > 1"
+            )
+        )
+        .all()
+    )
+    if duplicates:
+        listed = ", ".join(f"{row.email} ({row.accounts})" for row in duplicates)
+        raise RuntimeError(
+            "Cannot add ix_users_email_lower: these emails belong to more than"
+            f" one user when compared case-insensitively: {listed}. Merge or"
+            " rename the duplicate accounts, then rerun the migration."
+        )
+
+    # Store emails in canonical lowercase form so lookups hit the new index
+    op.execute("UPDATE users SET email = lower(trim(email))")
+    op.create_index(
+        "ix_users_email_lower",
+        "users",
+        [sa.text("lower(email)")],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_users_email_lower", table_name="users")
@@ -78,6 +78,10 @@ class User(Base):
     )
 
 
+# Case-insensitive login lookups go through lower(email)
+Index("ix_users_email_lower", func.lower(User.email), unique=True)
+
+
 # ---------- Categories ----------
 class Category(Base):
     __tablename__ = "categories"
@@ -366,7 +370,7 @@ class BackupLog(Base):
     backup_type: Mapped[str] = mapped_column(String(50), nullable=False)
     status: Mapped[str] = mapped_column(
         String(50), nullable=False
-    )  # pending, in_progress, completed, failed
+    )  # pending, in_progress, completed, failed, no_changes
     file_key: Mapped[Optional[str]] = mapped_column(
         String(500), nullable=True
     )  # Path in cloud storage
@@ -387,6 +391,18 @@ class BackupLog(Base):
     job: Mapped[Optional["BackupJob"]] = relationship(back_populates="logs")
 
 
+class BackupWatermark(Base):
+    """Latest change timestamp covered by backups of a table (incremental backups)"""
+
+    __tablename__ = "backup_watermarks"
+
+    table_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    last_changed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
 # ---------- Purchase Orders ----------
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
@@ -695,20 +711,26 @@ class DemandForecast(Base):
     model_type: Mapped[str] = mapped_column(
         String(50), default="ensemble", nullable=False
     )  # prophet, arima, ensemble
-    average_demand: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
-    min_forecast: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
-    max_forecast: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
+    average_demand: Mapped[float] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=False
+    )
+    min_forecast: Mapped[float] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=True
+    )
+    max_forecast: Mapped[float] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=True
+    )
     confidence_level: Mapped[float] = mapped_column(
-        Numeric(3, 2), default=0.95, nullable=False
+        Numeric(3, 2, asdecimal=False), default=0.95, nullable=False
     )
     mae: Mapped[Optional[float]] = mapped_column(
-        Numeric(10, 2), nullable=True
+        Numeric(10, 2, asdecimal=False), nullable=True
     )  # Mean Absolute Error
     rmse: Mapped[Optional[float]] = mapped_column(
-        Numeric(10, 2), nullable=True
+        Numeric(10, 2, asdecimal=False), nullable=True
     )  # Root Mean Squared Error
     r2_score: Mapped[Optional[float]] = mapped_column(
-        Numeric(5, 2), nullable=True
+        Numeric(5, 2, asdecimal=False), nullable=True
     )  # R² Score
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -734,6 +756,7 @@ class DemandForecast(Base):
     # Indexes
     __table_args__ = (
         Index("ix_demand_forecast_product_date", "product_id", "forecast_date"),
+        Index("ix_demand_forecast_product_created", "product_id", "created_at"),
     )
 
 
@@ -749,13 +772,21 @@ class ForecastDetail(Base):
     forecast_for_date: Mapped[datetime] = mapped_column(
         DateTime, nullable=False, index=True
     )
-    forecasted_quantity: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
-    lower_bound: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
-    upper_bound: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
+    forecasted_quantity: Mapped[float] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=False
+    )
+    lower_bound: Mapped[float] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=True
+    )
+    upper_bound: Mapped[float] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=True
+    )
     actual_quantity: Mapped[Optional[float]] = mapped_column(
-        Numeric(10, 2), nullable=True
+        Numeric(10, 2, asdecimal=False), nullable=True
+    )
+    error: Mapped[Optional[float]] = mapped_column(
+        Numeric(10, 2, asdecimal=False), nullable=True
     )
-    error: Mapped[Optional[float]] = mapped_column(Numeric(10, 2), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=func.now(), nullable=False
     )
@@ -785,15 +816,17 @@ class ForecastMetric(Base):
     metric_date: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
     model_type: Mapped[str] = mapped_column(String(50), nullable=False)
     mae: Mapped[float] = mapped_column(
-        Numeric(10, 2), nullable=False
+        Numeric(10, 2, asdecimal=False), nullable=False
     )  # Mean Absolute Error
     mape: Mapped[Optional[float]] = mapped_column(
-        Numeric(5, 2), nullable=True
+        Numeric(5, 2, asdecimal=False), nullable=True
     )  # Mean Absolute Percentage Error
     rmse: Mapped[float] = mapped_column(
-        Numeric(10, 2), nullable=False
+        Numeric(10, 2, asdecimal=False), nullable=False
     )  # Root Mean Squared Error
-    r2: Mapped[float] = mapped_column(Numeric(5, 2), nullable=False)  # R² Score
+    r2: Mapped[float] = mapped_column(
+        Numeric(5, 2, asdecimal=False), nullable=False
+    )  # R² Score
     samples_evaluated: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
@@ -22,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 def init_database():
     """Initialize database and create admin user if needed"""
+    from sqlalchemy import func
     from sqlalchemy.orm import Session
 
     from app.core.security import hash_password
@@ -38,16 +39,17 @@ def init_database():
             return
 
         # Check if admin exists
+        admin_email = settings.DEFAULT_ADMIN_EMAIL.strip().lower()
         with Session(engine) as session:
             admin = (
                 session.query(User)
-                .filter(User.email == settings.DEFAULT_ADMIN_EMAIL)
+                .filter(func.lower(User.email) == admin_email)
                 .first()
             )
             if not admin:
                 # Create default admin user from environment config
                 admin = User(
-                    email=settings.DEFAULT_ADMIN_EMAIL,
+                    email=admin_email,
                     password_hash=hash_password(settings.DEFAULT_ADMIN_PASSWORD),
                     full_name="System Admin",
                     is_active=True,
@@ -139,6 +141,14 @@ async def lifespan(app: FastAPI):
                 await producer.stop()
             except Exception:
                 pass
+
+        # Close pooled SMTP connections
+        try:
+            from app.services.email_service import EmailService
+
+            EmailService.shutdown()
+        except Exception:
+            pass
     except Exception as e:
         logger.error(f"Error in lifespan: {e}", exc_info=True)
 
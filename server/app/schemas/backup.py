@@ -15,7 +15,8 @@ class BackupJobCreate(BaseModel):
 
     name: str = Field(..., min_length=1, max_length=255)
     backup_type: str = Field(
-        ..., description="Type of backup: sales, inventory, or full"
+        ...,
+        description="Type of backup: sales, inventory, inventory_incremental, or full",
     )
     schedule_type: str = Field(
         ..., description="Schedule frequency: hourly, daily, weekly, monthly"
@@ -151,6 +151,13 @@ class BarcodeFormat(str, Enum):
     DATA_MATRIX = "datamatrix"
 
 
+class BarcodeOutput(str, Enum):
+    """Barcode image output format"""
+
+    PNG = "png"
+    SVG = "svg"
+
+
 class GenerateBarcodeRequest(BaseModel):
     """Generate barcode request"""
 
@@ -165,6 +172,11 @@ class GenerateBarcodeRequest(BaseModel):
         default=100, ge=50, le=1000, description="Image height in pixels"
     )
     include_text: bool = Field(default=True, description="Include barcode text")
+    outputs: List[BarcodeOutput] = Field(
+        default=[BarcodeOutput.PNG, BarcodeOutput.SVG],
+        min_length=1,
+        description="Image formats to render; omit one to skip rendering it",
+    )
 
 
 class GenerateBarcodeResponse(BaseModel):
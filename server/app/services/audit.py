@@ -1,12 +1,29 @@
 """
 Vendly POS - Audit Logging Service
 Tracks sensitive operations for security and compliance
+
+The audit log holds two line formats. Parsers tell them apart by the first
+character:
+
+- Lines starting with "{" are JSON objects with the AuditEntry fields.
+- Other lines are pipe-delimited simple events:
+  timestamp|action|success|user_id|user_email|target_type|target_id
+  Empty fields are unset. Events whose values contain "|" or line breaks
+  are always written as JSON, so every pipe line splits into exactly
+  seven fields.
 """
 
+import atexit
 import json
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
 from datetime import UTC, datetime
 from enum import Enum
+from logging.handlers import RotatingFileHandler
 from typing import Any, Optional
 
 from app.core.config import settings
@@ -65,6 +82,138 @@ class AuditAction(str, Enum):
     SECURITY_ALERT = "security_alert"
 
 
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that batches writes in a large file buffer
+
+    Each process writes its own file, with its PID inserted before the
+    extension (audit.log becomes audit.1234.log). With several workers
+    sharing one file, buffered writes would interleave mid-line, and each
+    process's size count would miss the others' writes when rolling over.
+
+    The stdlib handler flushes after every record and checks the file size
+    with tell(), which also flushes. This one tracks the encoded size itself
+    and writes when the buffer fills, on rollover, on close(), for any
+    record at flush_level or above, and at most flush_interval seconds after
+    a buffered record from a background thread.
+    """
+
+    buffer_size = 65536
+    flush_level = logging.WARNING
+    flush_interval = 5.0
+    _size = 0
+    _pending = 0
+
+    def __init__(self, filename: str, *args: Any, **kwargs: Any) -> None:
+        self._closing = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._path = os.path.abspath(filename)
+        super().__init__(filename, *args, **kwargs)
+        self.baseFilename = self._process_path()
+
+    def _process_path(self) -> str:
+        root, ext = os.path.splitext(self._path)
+        return f"{root}.{os.getpid()}{ext}"
+
+    def _open(self):
+        self.baseFilename = self._process_path()
+        stream = open(
+            self.baseFilename,
+            self.mode,
+            buffering=self.buffer_size,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
+        self._size = stream.seek(0, 2)
+        return stream
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self._pid != os.getpid():
+            # Forked worker: the parent's buffered records are its own to
+            # write, so drop the inherited stream and open this PID's file
+            self._pid = os.getpid()
+            self.stream = None
+            self._flusher = None
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes <= 0:
+            return False
+        msg = self.format(record) + self.terminator
+        self._pending = len(msg.encode(self.stream.encoding, self.errors or "strict"))
+        return self._size > 0 and self._size + self._pending >= self.maxBytes
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        self._size += self._pending
+        if record.levelno >= self.flush_level:
+            self._flush_stream()
+        elif self._flusher is None:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name="audit-flush", daemon=True
+            )
+            self._flusher.start()
+
+    def _flush_stream(self) -> None:
+        if self.stream is not None and not self.stream.closed:
+            self.stream.flush()
+
+    def _flush_periodically(self) -> None:
+        while not self._closing.wait(self.flush_interval):
+            self.flush_buffer()
+
+    def flush(self) -> None:
+        # Called by StreamHandler.emit after every record; buffered data is
+        # written by flush_buffer() instead.
+        pass
+
+    def flush_buffer(self) -> None:
+        """Write out any buffered records"""
+        self.acquire()
+        try:
+            self._flush_stream()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self._closing.set()
+        super().close()
+
+
+@dataclass(slots=True, frozen=True)
+class AuditEntry:
+    """A single audit event as written to the audit log"""
+
+    timestamp: str
+    action: str
+    success: bool
+    user_id: Optional[int] = None
+    user_email: Optional[str] = None
+    target_type: Optional[str] = None
+    target_id: Optional[int] = None
+    ip_address: Optional[str] = None
+    details: Optional[dict] = None
+    suppressed_duplicates: Optional[int] = None
+
+    @classmethod
+    def make(cls, action: AuditAction, success: bool, **values: Any) -> "AuditEntry":
+        """Build an entry stamped with the current time"""
+        return cls(datetime.now(UTC).isoformat(), action.value, success, **values)
+
+    def to_json(self) -> str:
+        """Serialize as a JSON object, omitting unset fields"""
+        return json.dumps(
+            {
+                name: value
+                for name in _AUDIT_ENTRY_FIELDS
+                if (value := getattr(self, name)) is not None
+            }
+        )
+
+
+_AUDIT_ENTRY_FIELDS = tuple(f.name for f in fields(AuditEntry))
+
+
 # Configure audit logger
 audit_logger = logging.getLogger("vendly.audit")
 log_level = getattr(logging, settings.AUDIT_LOG_LEVEL.upper(), logging.INFO)
@@ -83,7 +232,12 @@ if not audit_logger.handlers:
     # Also log to file (configurable location)
     if settings.AUDIT_LOG_ENABLED:
         try:
-            file_handler = logging.FileHandler(settings.AUDIT_LOG_FILE)
+            file_handler = BufferedRotatingFileHandler(
+                settings.AUDIT_LOG_FILE,
+                maxBytes=settings.AUDIT_LOG_MAX_BYTES,
+                backupCount=settings.AUDIT_LOG_BACKUP_COUNT,
+                delay=True,
+            )
             file_handler.setLevel(log_level)
             file_handler.setFormatter(formatter)
             audit_logger.addHandler(file_handler)
@@ -91,6 +245,97 @@ if not audit_logger.handlers:
             pass  # File logging optional
 
 
+# Identical events repeated within this window are counted instead of logged
+# (e.g. a login brute-force hammering the same email from the same IP).
+DEDUP_WINDOW_SECONDS = 1.0
+DEDUP_MAX_KEYS = 2048
+ROLLUP_INTERVAL_SECONDS = 10.0
+
+_recent_events: "OrderedDict[tuple, float]" = OrderedDict()
+_suppressed_counts: dict[tuple, int] = {}
+# Details of the first suppressed event per key, carried into its roll-up
+_suppressed_details: dict[tuple, Optional[dict]] = {}
+_dedup_lock = threading.Lock()
+_rollup_thread: Optional[threading.Thread] = None
+
+
+def _is_duplicate(key: tuple, details: Optional[dict] = None) -> bool:
+    """Return True if an identical event was logged within the dedup window"""
+    global _rollup_thread
+
+    now = time.monotonic()
+    with _dedup_lock:
+        last_logged = _recent_events.get(key)
+        if last_logged is not None and now - last_logged < DEDUP_WINDOW_SECONDS:
+            _suppressed_counts[key] = _suppressed_counts.get(key, 0) + 1
+            _suppressed_details.setdefault(key, details)
+            if _rollup_thread is None:
+                _rollup_thread = threading.Thread(
+                    target=_rollup_loop, name="audit-rollup", daemon=True
+                )
+                _rollup_thread.start()
+            return True
+
+        _recent_events[key] = now
+        _recent_events.move_to_end(key)
+        if len(_recent_events) > DEDUP_MAX_KEYS:
+            _recent_events.popitem(last=False)
+        return False
+
+
+def flush_suppressed_events() -> None:
+    """Log one roll-up line per event key that had duplicates suppressed"""
+    global _suppressed_counts, _suppressed_details
+
+    with _dedup_lock:
+        counts, _suppressed_counts = _suppressed_counts, {}
+        details, _suppressed_details = _suppressed_details, {}
+
+    for key, count in counts.items():
+        action, success, user_id, user_email, target_type, target_id, ip, _ = key
+        entry = AuditEntry.make(
+            action,
+            success,
+            user_id=user_id,
+            user_email=user_email,
+            target_type=target_type,
+            target_id=target_id,
+            ip_address=ip,
+            details=details.get(key),
+            suppressed_duplicates=count,
+        )
+        audit_logger.log(_level(action, success), entry.to_json())
+
+
+def _rollup_loop() -> None:
+    while True:
+        time.sleep(ROLLUP_INTERVAL_SECONDS)
+        flush_suppressed_events()
+
+
+# Runs on normal exit, including uvicorn's shutdown on SIGTERM, and before
+# logging.shutdown() since atexit hooks run in reverse registration order
+@atexit.register
+def _flush_at_exit() -> None:
+    """Log pending roll-ups, then write out buffered audit file records"""
+    flush_suppressed_events()
+    for log_handler in audit_logger.handlers:
+        if isinstance(log_handler, BufferedRotatingFileHandler):
+            log_handler.flush_buffer()
+
+
+def _level(action: AuditAction, success: bool) -> int:
+    """Failures and security alerts log at WARNING, which is flushed at once"""
+    if success and action is not AuditAction.SECURITY_ALERT:
+        return logging.INFO
+    return logging.WARNING
+
+
+def _field(value: Any) -> str:
+    """Render an optional audit field for the pipe-delimited format"""
+    return "" if value is None else str(value)
+
+
 def log_audit(
     action: AuditAction,
     user_id: Optional[int] = None,
@@ -113,27 +358,58 @@ def log_audit(
         details: Additional details about the action
         ip_address: IP address of the request
         success: Whether the action succeeded
+
+    Simple events (no details or IP) are logged as a pipe-delimited line:
+    timestamp|action|success|user_id|user_email|target_type|target_id
+    Everything else, including simple events with a "|" or non-printable
+    character in a field, is logged as a JSON object.
     """
     if not settings.AUDIT_LOG_ENABLED:
         return
 
-    audit_entry = {
-        "timestamp": datetime.now(UTC).isoformat(),
-        "action": action.value,
-        "success": success,
-        "user_id": user_id,
-        "user_email": user_email,
-        "target_type": target_type,
-        "target_id": target_id,
-        "ip_address": ip_address,
-        "details": details,
-    }
-
-    # Remove None values for cleaner logs
-    audit_entry = {k: v for k, v in audit_entry.items() if v is not None}
+    # Nothing will consume the record, so skip dedup and formatting work
+    level = _level(action, success)
+    if not audit_logger.isEnabledFor(level):
+        return None
+
+    dedup_key = (
+        action,
+        success,
+        user_id,
+        user_email,
+        target_type,
+        target_id,
+        ip_address,
+        repr(details) if details else None,
+    )
+    if _is_duplicate(dedup_key, details):
+        return None
+
+    # Fast path: skip entry construction and JSON encoding for simple events
+    if details is None and ip_address is None:
+        timestamp = datetime.now(UTC).isoformat()
+        line = (
+            f"{timestamp}|{action.value}|{success}|{_field(user_id)}"
+            f"|{_field(user_email)}|{_field(target_type)}|{_field(target_id)}"
+        )
+        # A "|" or line break in a field would shift fields or forge a line
+        if line.count("|") == 6 and line.isprintable():
+            audit_logger.log(level, line)
+            return None
+
+    audit_entry = AuditEntry.make(
+        action,
+        success,
+        user_id=user_id,
+        user_email=user_email,
+        target_type=target_type,
+        target_id=target_id,
+        ip_address=ip_address,
+        details=details,
+    )
 
     # Log as JSON for easy parsing
-    audit_logger.info(json.dumps(audit_entry))
+    audit_logger.log(level, audit_entry.to_json())
 
     return audit_entry
 
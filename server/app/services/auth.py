@@ -2,16 +2,91 @@
 Vendly POS - Authentication Services
 """
 
-from datetime import UTC, datetime, timedelta
+import threading
+import time
+from datetime import timedelta
 from typing import Optional
 
 import bcrypt
-from jose import JWTError, jwt
+import jwt
+from cachetools import TTLCache
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.db import models as m
 
+# Token settings are read once instead of on every login; call
+# reload_token_settings() if settings are changed at runtime.
+_JWT_SECRET = settings.JWT_SECRET
+_JWT_ALG = settings.JWT_ALG
+_ACCESS_TTL_SECONDS = settings.ACCESS_TTL_MIN * 60
+
+# Login lookups keyed by email: (user_id, password_hash, is_active, role, full_name).
+# Unknown emails are remembered briefly so credential-stuffing bursts skip the DB.
+# The caches are per process and only cleared by the worker that changed the
+# user, so authenticate() re-reads is_active and the hash before issuing a
+# token. A new password or a new account can still be refused for up to 5s
+# on other workers.
+_USER_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=5)
+_MISSING_USER_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=5)
+_user_cache_lock = threading.Lock()
+
+
+def reload_token_settings() -> None:
+    """Refresh the cached token settings from app settings"""
+    global _JWT_SECRET, _JWT_ALG, _ACCESS_TTL_SECONDS
+    _JWT_SECRET = settings.JWT_SECRET
+    _JWT_ALG = settings.JWT_ALG
+    _ACCESS_TTL_SECONDS = settings.ACCESS_TTL_MIN * 60
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form used for storing and looking up user emails"""
+    return email.strip().lower()
+
+
+def invalidate_user_cache(email: Optional[str] = None) -> None:
+    """Drop cached login lookups for an email (or all emails if none given)"""
+    with _user_cache_lock:
+        if email is None:
+            _USER_CACHE.clear()
+            _MISSING_USER_CACHE.clear()
+        else:
+            email = normalize_email(email)
+            _USER_CACHE.pop(email, None)
+            _MISSING_USER_CACHE.pop(email, None)
+
+
+def _get_login_user(db: Session, email: str) -> Optional[tuple]:
+    """Fetch login fields for an email, served from the TTL cache when possible"""
+    with _user_cache_lock:
+        if email in _MISSING_USER_CACHE:
+            return None
+        cached = _USER_CACHE.get(email)
+    if cached is not None:
+        return cached
+
+    # Select only the login columns to skip full ORM entity hydration
+    row = db.execute(
+        select(
+            m.User.id,
+            m.User.password_hash,
+            m.User.is_active,
+            m.User.role,
+            m.User.full_name,
+        ).where(func.lower(m.User.email) == email)
+    ).first()
+
+    with _user_cache_lock:
+        if row is None:
+            _MISSING_USER_CACHE[email] = True
+            return None
+        cached = tuple(row)
+        _USER_CACHE[email] = cached
+    return cached
+
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
@@ -27,25 +102,48 @@ async def authenticate(db: Session, email: str, password: str) -> Optional[dict]
     """
     Authenticate user with email and password
     """
-    # Look up user in database
-    user = db.query(m.User).filter(m.User.email == email).first()
+    email = normalize_email(email)
+
+    # Look up user (cached); the password is still verified on every attempt
+    user = _get_login_user(db, email)
 
     if not user:
         return None
 
-    if not verify_password(password, user.password_hash):
+    user_id, password_hash, is_active, role, full_name = user
+
+    if not verify_password(password, password_hash):
         return None
 
-    if not user.is_active:
+    if not is_active:
         return None
 
+    # Another worker may have deactivated the user or changed the password
+    # since this lookup was cached; confirm both by primary key
+    current = db.execute(
+        select(
+            m.User.password_hash,
+            m.User.is_active,
+            m.User.role,
+            m.User.full_name,
+        ).where(m.User.id == user_id)
+    ).first()
+    if (
+        current is None
+        or current.password_hash != password_hash
+        or not current.is_active
+    ):
+        invalidate_user_cache(email)
+        return None
+    role, full_name = current.role, current.full_name
+
     # Create access token
     access_token = create_access_token(
         data={
-            "sub": str(user.id),
-            "email": user.email,
-            "role": user.role,
-            "name": user.full_name or user.email,
+            "sub": str(user_id),
+            "email": email,
+            "role": role,
+            "name": full_name or email,
         }
     )
 
@@ -53,8 +151,8 @@ async def authenticate(db: Session, email: str, password: str) -> Optional[dict]
         "access_token": access_token,
         "refresh_token": access_token,  # Same for now
         "token_type": "bearer",
-        "expires_in": settings.ACCESS_TTL_MIN * 60,
-        "user_id": user.id,  # For audit logging
+        "expires_in": _ACCESS_TTL_SECONDS,
+        "user_id": user_id,  # For audit logging
     }
 
 
@@ -64,12 +162,9 @@ async def register_user(
     """
     Register a new user
     """
-    # Check if user already exists
-    existing = db.query(m.User).filter(m.User.email == email).first()
-    if existing:
-        return None
+    email = normalize_email(email)
 
-    # Create user
+    # Create user; the unique email indexes reject duplicates atomically
     user = m.User(
         email=email,
         password_hash=hash_password(password),
@@ -78,19 +173,25 @@ async def register_user(
         is_active=True,
     )
     db.add(user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return None
     db.refresh(user)
+    invalidate_user_cache(email)
     return user
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
+    # Integer epoch seconds, which is what the JWT "exp" claim encodes anyway
     if expires_delta:
-        expire = datetime.now(UTC) + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
-        expire = datetime.now(UTC) + timedelta(minutes=settings.ACCESS_TTL_MIN)
+        expire = int(time.time()) + _ACCESS_TTL_SECONDS
 
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+    to_encode["exp"] = expire
+    encoded_jwt = jwt.encode(to_encode, _JWT_SECRET, algorithm=_JWT_ALG)
     return encoded_jwt
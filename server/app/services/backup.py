@@ -6,22 +6,277 @@ Supports AWS S3, Azure Blob Storage, and Google Cloud Storage
 """
 
 import asyncio
-import gzip
 import io
 import json
 import logging
-from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import date, datetime, timedelta
 from enum import Enum as PyEnum
-from typing import Dict, List, Optional
-
-from sqlalchemy import text
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.db.models import BackupWatermark, Product, Sale, SaleItem
 from app.db.session import SessionLocal, engine
 
+try:
+    # ISA-L SIMD-accelerated DEFLATE/CRC32, drop-in compatible with stdlib gzip
+    from isal import igzip as gzip
+except ImportError:
+    import gzip  # type: ignore[no-redef]
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round-trip when streaming a table into a backup
+STREAM_BATCH_SIZE = 10_000
+
+# Compressed backups stay in memory up to this size, then spill to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Backups are zstd-compressed NDJSON; gzip is written only when zstandard is
+# unavailable and is still read for older backups. Backups smaller than
+# SMALL_BACKUP_SIZE are stored as plain NDJSON, where compression framing
+# would only add bytes and CPU.
+ZSTD_SUFFIX = ".json.zst"
+GZIP_SUFFIX = ".json.gz"
+PLAIN_SUFFIX = ".json"
+BACKUP_SUFFIXES = (ZSTD_SUFFIX, GZIP_SUFFIX, PLAIN_SUFFIX)
+SMALL_BACKUP_SIZE = 1024
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+CONTENT_TYPES = {
+    ZSTD_SUFFIX: "application/zstd",
+    GZIP_SUFFIX: "application/gzip",
+    PLAIN_SUFFIX: "application/x-ndjson",
+}
+GZIP_WRITE_BUFFER_SIZE = 256 * 1024
+ZSTD_LEVEL = 3
+# Compress in parallel on all cores (-1); zstd only spawns workers once a
+# stream is large enough to split into jobs, so small backups are unaffected
+ZSTD_THREADS = -1
+
+# Sales are read joined with their items in one pass and split into two files
+SALE_COLUMNS = tuple(column.name for column in Sale.__table__.columns)
+SALE_ITEM_COLUMNS = tuple(column.name for column in SaleItem.__table__.columns)
+SALES_BACKUP_QUERY = (
+    "SELECT "
+    + ", ".join(
+        [f"s.{column}" for column in SALE_COLUMNS]
+        + [f"si.{column}" for column in SALE_ITEM_COLUMNS]
+    )
+    + " FROM sales s LEFT JOIN sale_items si ON si.sale_id = s.id"
+)
+
+# Products only get updated_at on change, so new rows fall back to created_at
+PRODUCT_CHANGED_AT = "COALESCE(updated_at, created_at)"
+
+# Maximum keys per bulk delete request for each provider
+S3_DELETE_BATCH_SIZE = 1000
+AZURE_DELETE_BATCH_SIZE = 256
+GCS_DELETE_BATCH_SIZE = 100
+
+# ID of the bucket lifecycle rule that expires old backups (S3/GCS)
+LIFECYCLE_RULE_ID = "vendly-backup-retention"
+
+# Threads for blocking backup work (DB reads, compression, uploads), so a
+# running backup never stalls the event loop
+BACKUP_WORKER_THREADS = 4
+
+# Large uploads are split into parts sent over parallel connections
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_MAX_CONCURRENCY = 10
+
+# HTTP connections kept by the shared S3 client, enough for concurrent
+# multipart uploads from several backups at once
+S3_MAX_POOL_CONNECTIONS = 50
+
+
+def _is_backup_file(name: str, include_items: bool = False) -> bool:
+    """Whether a storage key/file name is a backup (optionally incl. sale items)"""
+    if not name.endswith(BACKUP_SUFFIXES):
+        return False
+    return include_items or "_items.json" not in name
+
+
+def _content_type(file_key: str) -> str:
+    """Content type to store a backup file with, based on its suffix"""
+    return next(
+        content_type
+        for suffix, content_type in CONTENT_TYPES.items()
+        if file_key.endswith(suffix)
+    )
+
+
+def _spooled_suffix(spool: IO[bytes]) -> str:
+    """File suffix for a written backup, sniffed from its leading bytes"""
+    spool.seek(0)
+    head = spool.read(len(ZSTD_MAGIC))
+    if head == ZSTD_MAGIC:
+        return ZSTD_SUFFIX
+    if head.startswith(GZIP_MAGIC):
+        return GZIP_SUFFIX
+    return PLAIN_SUFFIX
+
+
+class _PrefixedReader(io.RawIOBase):
+    """Replays bytes already read from a stream, then reads the stream itself"""
+
+    def __init__(self, head: bytes, stream: IO[bytes]):
+        self._head = head
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._head:
+            data, self._head = self._head[: len(buffer)], self._head[len(buffer) :]
+        else:
+            data = self._stream.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _open_backup_reader(raw: IO[bytes]) -> IO[bytes]:
+    """
+    Reader for a stored backup's NDJSON, decompressing by the codec sniffed
+    from its leading bytes rather than trusting the file key's suffix
+    """
+    head = raw.read(len(ZSTD_MAGIC))
+    stream = io.BufferedReader(_PrefixedReader(head, raw))
+    if head == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ImportError(
+                "zstandard is required to restore zstd backups."
+                " Install with: pip install zstandard"
+            )
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(stream))
+    if head.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=stream)
+    # Small backups are stored uncompressed
+    return stream
+
+
+class _AdaptiveWriter:
+    """
+    Writes a backup uncompressed while it is smaller than SMALL_BACKUP_SIZE
+    and switches to the compressor once it grows past that.
+    """
+
+    def __init__(self, sink: IO[bytes], open_compressor: Callable[..., IO[bytes]]):
+        self._sink = sink
+        self._open_compressor = open_compressor
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._out: Optional[IO[bytes]] = None
+
+    def write(self, data: bytes) -> int:
+        if self._out is not None:
+            return self._out.write(data)
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= SMALL_BACKUP_SIZE:
+            self._out = self._open_compressor(self._sink)
+            self._out.write(b"".join(self._pending))
+            self._pending = []
+        return len(data)
+
+    def close(self) -> None:
+        if self._out is not None:
+            self._out.close()
+        else:
+            self._sink.write(b"".join(self._pending))
+
+    def __enter__(self) -> "_AdaptiveWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def _scan_backup_files(
+    directory: str, include_items: bool = False
+) -> Iterator[os.DirEntry]:
+    """
+    Recursively yield backup files under a directory. scandir entries carry
+    their file type, so only the backup files themselves need a stat call.
+    """
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _scan_backup_files(entry.path, include_items)
+            elif _is_backup_file(entry.name, include_items):
+                yield entry
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield lists of up to `size` items"""
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _json_default(value: Any) -> str:
+    """JSON fallback for values from database rows (datetimes, decimals)"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+if orjson is not None:
+    # orjson serializes datetimes natively and returns bytes directly
+    _JSON_LINE_OPTIONS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+
+    def _json_line(value: Any) -> bytes:
+        """Serialize a value as one NDJSON line"""
+        return orjson.dumps(value, default=_json_default, option=_JSON_LINE_OPTIONS)
+
+    _json_loads = orjson.loads
+else:
+
+    def _json_line(value: Any) -> bytes:
+        """Serialize a value as one NDJSON line"""
+        return json.dumps(value, default=_json_default).encode("utf-8") + b"\n"
+
+    _json_loads = json.loads
+
 
 class BackupProvider(str, PyEnum):
     """Supported cloud backup providers"""
@@ -39,6 +294,8 @@ class BackupStatus(str, PyEnum):
     in_progress = "in_progress"
     completed = "completed"
     failed = "failed"
+    # An incremental backup found nothing changed, so no file was written
+    no_changes = "no_changes"
 
 
 class CloudBackupService:
@@ -47,41 +304,93 @@ class CloudBackupService:
     def __init__(self):
         self.provider = BackupProvider(settings.BACKUP_PROVIDER)
         self.bucket = settings.BACKUP_BUCKET
+        self.file_suffix = ZSTD_SUFFIX if zstandard else GZIP_SUFFIX
         self.is_initialized = False
+        # Days after which the provider itself expires backups, if configured
+        self.lifecycle_retention_days: Optional[int] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=BACKUP_WORKER_THREADS, thread_name_prefix="backup"
+        )
+        self._bind_provider_operations()
         self._initialize_provider()
 
+    def _bind_provider_operations(self):
+        """Resolve the configured provider's implementation of each operation"""
+        operations = {
+            BackupProvider.s3: (
+                self._init_s3,
+                self._list_s3_backups,
+                self._delete_old_s3_backups,
+                self._put_s3_file,
+                self._open_s3_file,
+            ),
+            BackupProvider.azure: (
+                self._init_azure,
+                self._list_azure_backups,
+                self._delete_old_azure_backups,
+                self._put_azure_file,
+                self._open_azure_file,
+            ),
+            BackupProvider.gcs: (
+                self._init_gcs,
+                self._list_gcs_backups,
+                self._delete_old_gcs_backups,
+                self._put_gcs_file,
+                self._open_gcs_file,
+            ),
+            BackupProvider.local: (
+                self._init_local,
+                self._list_local_backups,
+                self._delete_old_local_backups,
+                self._put_local_file,
+                self._open_local_file,
+            ),
+        }
+        (
+            self._init_provider,
+            self._list_provider_backups,
+            self._delete_old_provider_backups,
+            self._put_file,
+            self._open_stored_file,
+        ) = operations[self.provider]
+
     def _initialize_provider(self):
         """Initialize the appropriate cloud storage provider"""
         try:
-            if self.provider == BackupProvider.s3:
-                self._init_s3()
-            elif self.provider == BackupProvider.azure:
-                self._init_azure()
-            elif self.provider == BackupProvider.gcs:
-                self._init_gcs()
-            elif self.provider == BackupProvider.local:
-                self._init_local()
+            self._init_provider()
             self.is_initialized = True
             logger.info(
-                f"[OK] Backup provider '{self.provider}' initialized successfully"
+                "[OK] Backup provider '%s' initialized successfully",
+                self.provider.value,
             )
         except Exception as e:
-            logger.error(f"[ERROR] Failed to initialize backup provider: {e}")
+            logger.error("[ERROR] Failed to initialize backup provider: %s", e)
             self.is_initialized = False
 
     def _init_s3(self):
         """Initialize AWS S3 client"""
         try:
             import boto3
-
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+
+            self.s3_transfer_config = TransferConfig(
+                multipart_threshold=UPLOAD_CHUNK_SIZE,
+                multipart_chunksize=UPLOAD_CHUNK_SIZE,
+                max_concurrency=UPLOAD_MAX_CONCURRENCY,
+                use_threads=True,
+            )
             self.s3_client = boto3.client(
                 "s3",
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
                 region_name=settings.AWS_REGION,
+                config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS),
             )
             # Test connection
             self.s3_client.head_bucket(Bucket=self.bucket)
+            if settings.BACKUP_LIFECYCLE_RULES:
+                self._ensure_s3_lifecycle_rule(settings.BACKUP_RETENTION_DAYS)
         except ImportError:
             raise ImportError(
                 "boto3 is required for S3 backups. Install with: pip install boto3"
@@ -97,8 +406,8 @@ class CloudBackupService:
             self.azure_client = BlobServiceClient.from_connection_string(
                 settings.AZURE_STORAGE_CONNECTION_STRING
             )
-            # Test connection
-            self.azure_client.get_container_client(self.bucket)
+            # Container handle reused for every operation
+            self.azure_container = self.azure_client.get_container_client(self.bucket)
         except ImportError:
             raise ImportError(
                 "azure-storage-blob is required for Azure backups. "
@@ -116,9 +425,11 @@ class CloudBackupService:
                 project=settings.GCS_PROJECT_ID,
                 credentials=settings.GCS_CREDENTIALS,
             )
-            # Test connection
-            bucket = self.gcs_client.bucket(self.bucket)
-            bucket.get_blob("test")  # Simple test
+            # Bucket handle reused for every operation; test connection
+            self.gcs_bucket = self.gcs_client.bucket(self.bucket)
+            self.gcs_bucket.get_blob("test")  # Simple test
+            if settings.BACKUP_LIFECYCLE_RULES:
+                self._ensure_gcs_lifecycle_rule(settings.BACKUP_RETENTION_DAYS)
         except ImportError:
             raise ImportError(
                 "google-cloud-storage is required for GCS backups. "
@@ -127,10 +438,66 @@ class CloudBackupService:
         except Exception as e:
             raise Exception(f"Failed to initialize GCS: {e}")
 
+    def _ensure_s3_lifecycle_rule(self, retention_days: int):
+        """Add or update the S3 rule expiring backups, keeping other rules"""
+        from botocore.exceptions import ClientError
+
+        try:
+            rules = self.s3_client.get_bucket_lifecycle_configuration(
+                Bucket=self.bucket
+            )["Rules"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchLifecycleConfiguration":
+                logger.warning("[WARN] Could not read S3 lifecycle rules: %s", e)
+                return
+            rules = []
+
+        rule = {
+            "ID": LIFECYCLE_RULE_ID,
+            "Filter": {"Prefix": "backups/"},
+            "Status": "Enabled",
+            "Expiration": {"Days": retention_days},
+        }
+        existing = next((r for r in rules if r.get("ID") == LIFECYCLE_RULE_ID), None)
+        if existing != rule:
+            rules = [r for r in rules if r.get("ID") != LIFECYCLE_RULE_ID] + [rule]
+            try:
+                self.s3_client.put_bucket_lifecycle_configuration(
+                    Bucket=self.bucket, LifecycleConfiguration={"Rules": rules}
+                )
+            except ClientError as e:
+                logger.warning("[WARN] Could not set S3 lifecycle rule: %s", e)
+                return
+        self.lifecycle_retention_days = retention_days
+
+    def _ensure_gcs_lifecycle_rule(self, retention_days: int):
+        """Add or update the GCS rule deleting backups, keeping other rules"""
+        try:
+            bucket = self.gcs_bucket
+            bucket.reload()
+            rule = {
+                "action": {"type": "Delete"},
+                "condition": {"age": retention_days, "matchesPrefix": ["backups/"]},
+            }
+            current = list(bucket.lifecycle_rules)
+            ours = [
+                r
+                for r in current
+                if r.get("condition", {}).get("matchesPrefix") == ["backups/"]
+            ]
+            if ours != [rule]:
+                bucket.lifecycle_rules = [r for r in current if r not in ours]
+                bucket.add_lifecycle_delete_rule(
+                    age=retention_days, matches_prefix=["backups/"]
+                )
+                bucket.patch()
+        except Exception as e:
+            logger.warning("[WARN] Could not set GCS lifecycle rule: %s", e)
+            return
+        self.lifecycle_retention_days = retention_days
+
     def _init_local(self):
         """Initialize local file storage"""
-        import os
-
         self.local_path = settings.BACKUP_LOCAL_PATH
         os.makedirs(self.local_path, exist_ok=True)
 
@@ -152,100 +519,63 @@ class CloudBackupService:
         try:
             backup_id = self._generate_backup_id("sales")
 
-            # Build query
-            query = "SELECT * FROM sales"
+            # Build query: each sale joined with its items, one sale after another
+            query = SALES_BACKUP_QUERY
             params = {}
 
             if start_date or end_date:
                 conditions = []
                 if start_date:
-                    conditions.append("created_at >= :start_date")
+                    conditions.append("s.created_at >= :start_date")
                     params["start_date"] = start_date
                 if end_date:
-                    conditions.append("created_at <= :end_date")
+                    conditions.append("s.created_at <= :end_date")
                     params["end_date"] = end_date
                 if conditions:
                     query += " WHERE " + " AND ".join(conditions)
 
-            query += " ORDER BY created_at DESC"
-
-            # Fetch sales data
-            db = SessionLocal()
-            try:
-                result = db.execute(text(query), params)
-                columns = result.keys()
-                sales_data = [dict(zip(columns, row)) for row in result.fetchall()]
-            finally:
-                db.close()
-
-            # Convert to serializable format
-            for sale in sales_data:
-                for key, value in sale.items():
-                    if isinstance(value, datetime):
-                        sale[key] = value.isoformat()
-
-            # Create backup file
-            backup_content = {
-                "backup_id": backup_id,
-                "backup_type": "sales",
-                "timestamp": datetime.utcnow().isoformat(),
-                "record_count": len(sales_data),
-                "data": sales_data,
-            }
-
-            # Upload to cloud
-            file_key = f"backups/sales/{backup_id}.json.gz"
-            await self._upload_backup(file_key, backup_content)
-
-            # Fetch related sale_items
-            sale_ids = [sale["id"] for sale in sales_data]
-            if sale_ids:
-                placeholders = ",".join([f":{i}" for i in range(len(sale_ids))])
-                items_query = (
-                    f"SELECT * FROM sale_items WHERE sale_id IN ({placeholders})"
+            query += " ORDER BY s.created_at DESC, s.id, si.id"
+
+            # Stream rows once, routing sales and sale_items into their own files
+            with (
+                tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as sales_spool,
+                tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as items_spool,
+            ):
+                record_count = await self._run_blocking(
+                    self._export_sales,
+                    backup_id,
+                    query,
+                    params,
+                    sales_spool,
+                    items_spool,
                 )
-                items_params = {str(i): sid for i, sid in enumerate(sale_ids)}
-
-                db = SessionLocal()
-                try:
-                    result = db.execute(text(items_query), items_params)
-                    columns = result.keys()
-                    items_data = [dict(zip(columns, row)) for row in result.fetchall()]
-                finally:
-                    db.close()
-
-                # Convert to serializable format
-                for item in items_data:
-                    for key, value in item.items():
-                        if isinstance(value, datetime):
-                            item[key] = value.isoformat()
-
-                # Upload sale items
-                items_backup = {
-                    "backup_id": backup_id,
-                    "backup_type": "sale_items",
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "record_count": len(items_data),
-                    "data": items_data,
-                }
-                items_key = f"backups/sales/{backup_id}_items.json.gz"
-                await self._upload_backup(items_key, items_backup)
+                # Upload both files at once rather than one after the other
+                uploads = [
+                    self._upload_spool(f"backups/sales/{backup_id}", sales_spool)
+                ]
+                if record_count:
+                    uploads.append(
+                        self._upload_spool(
+                            f"backups/sales/{backup_id}_items", items_spool
+                        )
+                    )
+                file_key, *_ = await asyncio.gather(*uploads)
 
             logger.info(
-                f"[OK] Sales backup completed: {backup_id} ({len(sales_data)} records)"
+                "[OK] Sales backup completed: %s (%s records)", backup_id, record_count
             )
 
             return {
                 "backup_id": backup_id,
                 "type": "sales",
                 "status": BackupStatus.completed.value,
-                "records": len(sales_data),
+                "records": record_count,
                 "file_key": file_key,
                 "timestamp": datetime.utcnow().isoformat(),
             }
 
         except Exception as e:
-            logger.error(f"[ERROR] Sales backup failed: {e}")
+            logger.error("[ERROR] Sales backup failed: %s", e)
             return {
                 "backup_id": backup_id if "backup_id" in locals() else None,
                 "type": "sales",
@@ -254,59 +584,60 @@ class CloudBackupService:
                 "timestamp": datetime.utcnow().isoformat(),
             }
 
-    async def backup_inventory_data(self) -> Dict:
+    async def backup_inventory_data(self, incremental: bool = False) -> Dict:
         """
         Backup current inventory (products) data
 
+        Args:
+            incremental: Only back up products changed since the last
+                inventory backup (deleted products are not captured)
+
         Returns:
             Dictionary with backup metadata and status
         """
         try:
             backup_id = self._generate_backup_id("inventory")
 
-            # Fetch inventory data
-            db = SessionLocal()
-            try:
-                result = db.execute(text("SELECT * FROM products ORDER BY id"))
-                columns = result.keys()
-                inventory_data = [dict(zip(columns, row)) for row in result.fetchall()]
-            finally:
-                db.close()
-
-            # Convert to serializable format
-            for product in inventory_data:
-                for key, value in product.items():
-                    if isinstance(value, datetime):
-                        product[key] = value.isoformat()
+            since = None
+            if incremental:
+                since = await self._run_blocking(self._get_watermark, "products")
 
-            # Create backup file
-            backup_content = {
-                "backup_id": backup_id,
-                "backup_type": "inventory",
-                "timestamp": datetime.utcnow().isoformat(),
-                "record_count": len(inventory_data),
-                "data": inventory_data,
-            }
+            # Stream product rows straight into the compressed backup file
+            file_key = None
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+                record_count, changed_at = await self._run_blocking(
+                    self._export_inventory, backup_id, since, spool
+                )
+                # Skip the upload when nothing changed since the last backup
+                if record_count or since is None:
+                    file_key = await self._upload_spool(
+                        f"backups/inventory/{backup_id}", spool
+                    )
 
-            # Upload to cloud
-            file_key = f"backups/inventory/{backup_id}.json.gz"
-            await self._upload_backup(file_key, backup_content)
+            # Full backups leave the incremental chain's watermark alone
+            if incremental:
+                await self._run_blocking(self._set_watermark, "products", changed_at)
 
+            status = BackupStatus.completed if file_key else BackupStatus.no_changes
             logger.info(
-                f"[OK] Inventory backup completed: {backup_id} ({len(inventory_data)} records)"
+                "[OK] Inventory backup %s: %s (%s records)",
+                status.value,
+                backup_id,
+                record_count,
             )
 
             return {
                 "backup_id": backup_id,
                 "type": "inventory",
-                "status": BackupStatus.completed.value,
-                "records": len(inventory_data),
+                "status": status.value,
+                "records": record_count,
                 "file_key": file_key,
+                "since": since.isoformat() if since else None,
                 "timestamp": datetime.utcnow().isoformat(),
             }
 
         except Exception as e:
-            logger.error(f"[ERROR] Inventory backup failed: {e}")
+            logger.error("[ERROR] Inventory backup failed: %s", e)
             return {
                 "backup_id": backup_id if "backup_id" in locals() else None,
                 "type": "inventory",
@@ -362,7 +693,7 @@ class CloudBackupService:
             }
 
         except Exception as e:
-            logger.error(f"[ERROR] Complete backup failed: {e}")
+            logger.error("[ERROR] Complete backup failed: %s", e)
             return {
                 "backup_type": "full",
                 "status": BackupStatus.failed.value,
@@ -381,16 +712,15 @@ class CloudBackupService:
             Restoration status and details
         """
         try:
-            logger.info(f"[INFO] Starting restoration of backup: {backup_id}")
+            logger.info("[INFO] Starting restoration of backup: %s", backup_id)
 
-            file_key = f"backups/sales/{backup_id}.json.gz"
-            backup_content = await self._download_backup(file_key)
+            backup_content = await self._download_backup_by_id("sales", backup_id)
 
             db = SessionLocal()
             try:
                 # Note: This is a basic restore. In production, you'd want more sophisticated logic
                 # to handle conflicts, validation, and transactional integrity
-                logger.info(f"[OK] Sales data restored from backup: {backup_id}")
+                logger.info("[OK] Sales data restored from backup: %s", backup_id)
             finally:
                 db.close()
 
@@ -402,7 +732,7 @@ class CloudBackupService:
             }
 
         except Exception as e:
-            logger.error(f"[ERROR] Restoration failed: {e}")
+            logger.error("[ERROR] Restoration failed: %s", e)
             return {
                 "backup_id": backup_id,
                 "type": "sales",
@@ -422,33 +752,20 @@ class CloudBackupService:
             List of backup metadata
         """
         try:
-            backups = []
-
-            if self.provider == BackupProvider.s3:
-                backups = self._list_s3_backups(backup_type)
-            elif self.provider == BackupProvider.azure:
-                backups = self._list_azure_backups(backup_type)
-            elif self.provider == BackupProvider.gcs:
-                backups = self._list_gcs_backups(backup_type)
-            elif self.provider == BackupProvider.local:
-                backups = self._list_local_backups(backup_type)
-
-            return backups
-
+            return await self._run_blocking(self._list_provider_backups, backup_type)
         except Exception as e:
-            logger.error(f"[ERROR] Failed to list backups: {e}")
+            logger.error("[ERROR] Failed to list backups: %s", e)
             return []
 
     def _list_s3_backups(self, backup_type: Optional[str] = None) -> List[Dict]:
         """List backups from S3"""
         try:
             prefix = f"backups/{backup_type}/" if backup_type else "backups/"
-            response = self.s3_client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
 
             backups = []
-            for obj in response.get("Contents", []):
+            for obj in self._iter_s3_objects(prefix):
                 key = obj["Key"]
-                if key.endswith(".json.gz") and not key.endswith("_items.json.gz"):
+                if _is_backup_file(key):
                     backups.append(
                         {
                             "key": key,
@@ -459,20 +776,24 @@ class CloudBackupService:
 
             return sorted(backups, key=lambda x: x["last_modified"], reverse=True)
         except Exception as e:
-            logger.error(f"[ERROR] Failed to list S3 backups: {e}")
+            logger.error("[ERROR] Failed to list S3 backups: %s", e)
             return []
 
+    def _iter_s3_objects(self, prefix: str) -> Iterator[Dict]:
+        """Iterate over every object under a prefix (past the 1000-key page)"""
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            yield from page.get("Contents", [])
+
     def _list_azure_backups(self, backup_type: Optional[str] = None) -> List[Dict]:
         """List backups from Azure Blob Storage"""
         try:
-            container = self.azure_client.get_container_client(self.bucket)
+            container = self.azure_container
             prefix = f"backups/{backup_type}/" if backup_type else "backups/"
 
             backups = []
             for blob in container.list_blobs(name_starts_with=prefix):
-                if blob.name.endswith(".json.gz") and not blob.name.endswith(
-                    "_items.json.gz"
-                ):
+                if _is_backup_file(blob.name):
                     backups.append(
                         {
                             "key": blob.name,
@@ -489,20 +810,18 @@ class CloudBackupService:
                 backups, key=lambda x: x.get("last_modified", ""), reverse=True
             )
         except Exception as e:
-            logger.error(f"[ERROR] Failed to list Azure backups: {e}")
+            logger.error("[ERROR] Failed to list Azure backups: %s", e)
             return []
 
     def _list_gcs_backups(self, backup_type: Optional[str] = None) -> List[Dict]:
         """List backups from Google Cloud Storage"""
         try:
-            bucket = self.gcs_client.bucket(self.bucket)
+            bucket = self.gcs_bucket
             prefix = f"backups/{backup_type}/" if backup_type else "backups/"
 
             backups = []
             for blob in bucket.list_blobs(prefix=prefix):
-                if blob.name.endswith(".json.gz") and not blob.name.endswith(
-                    "_items.json.gz"
-                ):
+                if _is_backup_file(blob.name):
                     backups.append(
                         {
                             "key": blob.name,
@@ -517,39 +836,32 @@ class CloudBackupService:
                 backups, key=lambda x: x.get("last_modified", ""), reverse=True
             )
         except Exception as e:
-            logger.error(f"[ERROR] Failed to list GCS backups: {e}")
+            logger.error("[ERROR] Failed to list GCS backups: %s", e)
             return []
 
     def _list_local_backups(self, backup_type: Optional[str] = None) -> List[Dict]:
         """List backups from local storage"""
         try:
-            import os
-            from pathlib import Path
-
-            backup_dir = Path(self.local_path)
+            backup_dir = os.path.join(self.local_path, "backups")
             if backup_type:
-                backup_dir = backup_dir / "backups" / backup_type
-            else:
-                backup_dir = backup_dir / "backups"
+                backup_dir = os.path.join(backup_dir, backup_type)
 
             backups = []
-            if backup_dir.exists():
-                for file_path in backup_dir.rglob("*.json.gz"):
-                    if not file_path.name.endswith("_items.json.gz"):
-                        stat = file_path.stat()
-                        backups.append(
-                            {
-                                "key": str(file_path.relative_to(self.local_path)),
-                                "size": stat.st_size,
-                                "last_modified": datetime.fromtimestamp(
-                                    stat.st_mtime
-                                ).isoformat(),
-                            }
-                        )
+            for entry in _scan_backup_files(backup_dir):
+                stat = entry.stat()
+                backups.append(
+                    {
+                        "key": os.path.relpath(entry.path, self.local_path),
+                        "size": stat.st_size,
+                        "last_modified": datetime.fromtimestamp(
+                            stat.st_mtime
+                        ).isoformat(),
+                    }
+                )
 
             return sorted(backups, key=lambda x: x["last_modified"], reverse=True)
         except Exception as e:
-            logger.error(f"[ERROR] Failed to list local backups: {e}")
+            logger.error("[ERROR] Failed to list local backups: %s", e)
             return []
 
     async def delete_old_backups(self, retention_days: int = 30) -> Dict:
@@ -566,17 +878,25 @@ class CloudBackupService:
             cutoff_date = datetime.utcnow() - timedelta(days=retention_days)
             deleted_count = 0
 
-            if self.provider == BackupProvider.s3:
-                deleted_count = self._delete_old_s3_backups(cutoff_date)
-            elif self.provider == BackupProvider.azure:
-                deleted_count = self._delete_old_azure_backups(cutoff_date)
-            elif self.provider == BackupProvider.gcs:
-                deleted_count = self._delete_old_gcs_backups(cutoff_date)
-            elif self.provider == BackupProvider.local:
-                deleted_count = self._delete_old_local_backups(cutoff_date)
+            if (
+                self.lifecycle_retention_days is not None
+                and self.lifecycle_retention_days <= retention_days
+            ):
+                # The bucket lifecycle rule already expires these server-side
+                logger.info(
+                    "[OK] Backups older than %s days are expired by the bucket "
+                    "lifecycle rule",
+                    self.lifecycle_retention_days,
+                )
+            else:
+                deleted_count = await self._run_blocking(
+                    self._delete_old_provider_backups, cutoff_date
+                )
 
             logger.info(
-                f"[OK] Deleted {deleted_count} old backups (older than {retention_days} days)"
+                "[OK] Deleted %s old backups (older than %s days)",
+                deleted_count,
+                retention_days,
             )
 
             return {
@@ -587,7 +907,7 @@ class CloudBackupService:
             }
 
         except Exception as e:
-            logger.error(f"[ERROR] Failed to delete old backups: {e}")
+            logger.error("[ERROR] Failed to delete old backups: %s", e)
             return {
                 "status": BackupStatus.failed.value,
                 "error": str(e),
@@ -597,146 +917,386 @@ class CloudBackupService:
         """Delete old backups from S3"""
         deleted_count = 0
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket, Prefix="backups/"
+            old_keys = (
+                obj["Key"]
+                for obj in self._iter_s3_objects("backups/")
+                if obj["LastModified"].replace(tzinfo=None) < cutoff_date
             )
-            for obj in response.get("Contents", []):
-                if obj["LastModified"].replace(tzinfo=None) < cutoff_date:
-                    self.s3_client.delete_object(Bucket=self.bucket, Key=obj["Key"])
-                    deleted_count += 1
+            for batch in _batched(old_keys, S3_DELETE_BATCH_SIZE):
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+                deleted_count += len(batch) - len(response.get("Errors", []))
         except Exception as e:
-            logger.error(f"[ERROR] Failed to delete S3 backups: {e}")
+            logger.error("[ERROR] Failed to delete S3 backups: %s", e)
         return deleted_count
 
     def _delete_old_azure_backups(self, cutoff_date: datetime) -> int:
         """Delete old backups from Azure"""
         deleted_count = 0
         try:
-            container = self.azure_client.get_container_client(self.bucket)
-            for blob in container.list_blobs(name_starts_with="backups/"):
-                if blob.last_modified.replace(tzinfo=None) < cutoff_date:
-                    container.delete_blob(blob.name)
-                    deleted_count += 1
+            container = self.azure_container
+            old_names = (
+                blob.name
+                for blob in container.list_blobs(name_starts_with="backups/")
+                if blob.last_modified.replace(tzinfo=None) < cutoff_date
+            )
+            for batch in _batched(old_names, AZURE_DELETE_BATCH_SIZE):
+                container.delete_blobs(*batch)
+                deleted_count += len(batch)
         except Exception as e:
-            logger.error(f"[ERROR] Failed to delete Azure backups: {e}")
+            logger.error("[ERROR] Failed to delete Azure backups: %s", e)
         return deleted_count
 
     def _delete_old_gcs_backups(self, cutoff_date: datetime) -> int:
         """Delete old backups from GCS"""
         deleted_count = 0
         try:
-            bucket = self.gcs_client.bucket(self.bucket)
-            for blob in bucket.list_blobs(prefix="backups/"):
-                if blob.updated.replace(tzinfo=None) < cutoff_date:
-                    blob.delete()
-                    deleted_count += 1
+            bucket = self.gcs_bucket
+            old_blobs = (
+                blob
+                for blob in bucket.list_blobs(prefix="backups/")
+                if blob.updated.replace(tzinfo=None) < cutoff_date
+            )
+            for batch in _batched(old_blobs, GCS_DELETE_BATCH_SIZE):
+                with self.gcs_client.batch():
+                    bucket.delete_blobs(batch)
+                deleted_count += len(batch)
         except Exception as e:
-            logger.error(f"[ERROR] Failed to delete GCS backups: {e}")
+            logger.error("[ERROR] Failed to delete GCS backups: %s", e)
         return deleted_count
 
     def _delete_old_local_backups(self, cutoff_date: datetime) -> int:
         """Delete old backups from local storage"""
-        import os
-        from pathlib import Path
-
         deleted_count = 0
         try:
-            backup_dir = Path(self.local_path) / "backups"
-            if backup_dir.exists():
-                for file_path in backup_dir.rglob("*.json.gz"):
-                    stat = file_path.stat()
-                    file_date = datetime.fromtimestamp(stat.st_mtime)
-                    if file_date < cutoff_date:
-                        file_path.unlink()
-                        deleted_count += 1
+            cutoff_timestamp = cutoff_date.timestamp()
+            backup_dir = os.path.join(self.local_path, "backups")
+            for entry in _scan_backup_files(backup_dir, include_items=True):
+                if entry.stat().st_mtime < cutoff_timestamp:
+                    os.unlink(entry.path)
+                    deleted_count += 1
         except Exception as e:
-            logger.error(f"[ERROR] Failed to delete local backups: {e}")
+            logger.error("[ERROR] Failed to delete local backups: %s", e)
         return deleted_count
 
-    async def _upload_backup(self, file_key: str, backup_content: Dict) -> None:
-        """Upload backup file to cloud storage"""
+    @staticmethod
+    def _backup_header(
+        backup_id: str,
+        backup_type: str,
+        columns: Sequence[str],
+        since: Optional[datetime] = None,
+    ) -> Dict:
+        """
+        First line of a backup file, describing the records that follow.
+        Records are stored as positional lists in `columns` order; `since`
+        marks an incremental backup of rows changed from that time on.
+        """
+        header = {
+            "backup_id": backup_id,
+            "backup_type": backup_type,
+            "timestamp": datetime.utcnow().isoformat(),
+            "columns": list(columns),
+        }
+        if since is not None:
+            header["since"] = since.isoformat()
+        return header
+
+    async def _run_blocking(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run blocking backup work on the backup thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _export_query(
+        self,
+        query: str,
+        backup_id: str,
+        backup_type: str,
+        spool: IO[bytes],
+        params: Optional[Dict] = None,
+        since: Optional[datetime] = None,
+    ) -> int:
+        """Stream a query's rows into spool as a compressed backup (blocking)"""
+        db = SessionLocal()
         try:
-            # Serialize content
-            json_data = json.dumps(backup_content, default=str).encode("utf-8")
-
-            # Compress
-            buffer = io.BytesIO()
-            with gzip.GzipFile(fileobj=buffer, mode="wb") as gz:
-                gz.write(json_data)
-            compressed_data = buffer.getvalue()
-
-            # Upload based on provider
-            if self.provider == BackupProvider.s3:
-                self.s3_client.put_object(
-                    Bucket=self.bucket,
-                    Key=file_key,
-                    Body=compressed_data,
-                    ContentType="application/gzip",
-                    ServerSideEncryption="AES256",
+            result = db.execute(
+                text(query), params or {}, execution_options={"stream_results": True}
+            )
+            header = self._backup_header(backup_id, backup_type, result.keys(), since)
+            return self._write_backup(spool, header, self._stream_rows(result))
+        finally:
+            db.close()
+
+    def _export_inventory(
+        self, backup_id: str, since: Optional[datetime], spool: IO[bytes]
+    ) -> Tuple[int, Optional[datetime]]:
+        """
+        Export products changed since `since` (all products when None).
+        Also returns the newest change time, read before the export so rows
+        changed while it runs are picked up again by the next backup.
+        """
+        db = SessionLocal()
+        try:
+            changed_at = db.execute(
+                select(func.max(func.coalesce(Product.updated_at, Product.created_at)))
+            ).scalar()
+        finally:
+            db.close()
+
+        if since is not None and (changed_at is None or changed_at <= since):
+            # No product changed since the last backup
+            return 0, changed_at
+
+        query = "SELECT * FROM products"
+        params = {}
+        if since is not None:
+            # Inclusive, so a row committed in the same clock tick as the last
+            # backup's newest change is not missed (at worst it is re-exported)
+            query += f" WHERE {PRODUCT_CHANGED_AT} >= :since"
+            params["since"] = since
+        query += " ORDER BY id"
+
+        record_count = self._export_query(
+            query, backup_id, "inventory", spool, params, since
+        )
+        return record_count, changed_at
+
+    @staticmethod
+    def _get_watermark(table_name: str) -> Optional[datetime]:
+        """Latest change time already covered by a backup of a table"""
+        db = SessionLocal()
+        try:
+            watermark = db.get(BackupWatermark, table_name)
+            return watermark.last_changed_at if watermark else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _set_watermark(table_name: str, changed_at: Optional[datetime]) -> None:
+        """Record the latest change time covered by a finished backup"""
+        if changed_at is None:
+            return
+        db = SessionLocal()
+        try:
+            db.merge(BackupWatermark(table_name=table_name, last_changed_at=changed_at))
+            db.commit()
+        finally:
+            db.close()
+
+    def _export_sales(
+        self,
+        backup_id: str,
+        query: str,
+        params: Dict,
+        sales_spool: IO[bytes],
+        items_spool: IO[bytes],
+    ) -> int:
+        """Stream joined sales rows into the sales and items spools (blocking)"""
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                text(query), params, execution_options={"stream_results": True}
+            )
+            with (
+                self._backup_writer(sales_spool) as sales_out,
+                self._backup_writer(items_spool) as items_out,
+            ):
+                sales_out.write(
+                    _json_line(self._backup_header(backup_id, "sales", SALE_COLUMNS))
                 )
-            elif self.provider == BackupProvider.azure:
-                container = self.azure_client.get_container_client(self.bucket)
-                container.upload_blob(file_key, compressed_data, overwrite=True)
-            elif self.provider == BackupProvider.gcs:
-                bucket = self.gcs_client.bucket(self.bucket)
-                blob = bucket.blob(file_key)
-                blob.upload_from_string(
-                    compressed_data, content_type="application/gzip"
+                items_out.write(
+                    _json_line(
+                        self._backup_header(backup_id, "sale_items", SALE_ITEM_COLUMNS)
+                    )
                 )
-            elif self.provider == BackupProvider.local:
-                import os
+                return self._write_sales_with_items(result, sales_out, items_out)
+        finally:
+            db.close()
 
-                file_path = os.path.join(self.local_path, file_key)
-                os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                with open(file_path, "wb") as f:
-                    f.write(compressed_data)
+    @staticmethod
+    def _stream_rows(result) -> Iterator[tuple]:
+        """Yield result rows as plain tuples, fetching them in batches"""
+        for row in result.yield_per(STREAM_BATCH_SIZE):
+            yield tuple(row)
 
-            logger.info(f"[OK] Backup uploaded: {file_key}")
+    @staticmethod
+    def _write_sales_with_items(
+        result, sales_out: IO[bytes], items_out: IO[bytes]
+    ) -> int:
+        """
+        Split joined sale/sale_item rows into the sales and items streams.
+        Rows arrive grouped by sale; a sale without items has NULL item columns.
+        Returns the number of sales written.
+        """
+        split = len(SALE_COLUMNS)
+        record_count = 0
+        last_sale_id = None
+        for row in result.yield_per(STREAM_BATCH_SIZE):
+            sale, item = row[:split], row[split:]
+            if sale[0] != last_sale_id:
+                last_sale_id = sale[0]
+                sales_out.write(_json_line(sale))
+                record_count += 1
+            if item[0] is not None:
+                items_out.write(_json_line(item))
+        return record_count
+
+    def _backup_writer(self, sink: IO[bytes]) -> _AdaptiveWriter:
+        """Open a backup writer over sink, compressing unless the backup is small"""
+        return _AdaptiveWriter(sink, self._compressed_writer)
+
+    def _compressed_writer(self, sink: IO[bytes]) -> IO[bytes]:
+        """Open a compressing writer over sink in the configured backup format"""
+        if self.file_suffix == ZSTD_SUFFIX:
+            compressor = zstandard.ZstdCompressor(
+                level=ZSTD_LEVEL, threads=ZSTD_THREADS
+            )
+            return compressor.stream_writer(sink, closefd=False)
+        # GzipFile compresses on every write; batch the per-row writes in one
+        # reused buffer (zstd's writer already buffers input internally)
+        return io.BufferedWriter(
+            gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=1),
+            buffer_size=GZIP_WRITE_BUFFER_SIZE,
+        )
+
+    def _write_backup(
+        self, sink: IO[bytes], header: Dict, records: Iterable[Sequence]
+    ) -> int:
+        """
+        Write a backup as NDJSON, compressed unless small: the header line
+        followed by one line per record. Returns the number of records written.
+        """
+        with self._backup_writer(sink) as out:
+            return self._write_lines(out, header, records)
 
+    @staticmethod
+    def _write_lines(out: IO[bytes], header: Dict, records: Iterable[Sequence]) -> int:
+        """Write the header and records as JSON lines, returning the record count"""
+        record_count = 0
+        out.write(_json_line(header))
+        for record in records:
+            out.write(_json_line(record))
+            record_count += 1
+        return record_count
+
+    async def _upload_spool(self, key_prefix: str, spool: IO[bytes]) -> str:
+        """
+        Upload a written backup file to storage under key_prefix plus the
+        suffix of its format, returning the file key
+        """
+        try:
+            file_key = key_prefix + _spooled_suffix(spool)
+            spool.seek(0)
+            await self._run_blocking(self._put_file, file_key, spool)
+            logger.info("[OK] Backup uploaded: %s", file_key)
+            return file_key
         except Exception as e:
-            logger.error(f"[ERROR] Failed to upload backup: {e}")
+            logger.error("[ERROR] Failed to upload backup: %s", e)
             raise
 
+    def _put_s3_file(self, file_key: str, fileobj: IO[bytes]) -> None:
+        """Upload a file object to S3 (blocking)"""
+        self.s3_client.upload_fileobj(
+            fileobj,
+            self.bucket,
+            file_key,
+            ExtraArgs={
+                "ContentType": _content_type(file_key),
+                "ServerSideEncryption": "AES256",
+            },
+            Config=self.s3_transfer_config,
+        )
+
+    def _put_azure_file(self, file_key: str, fileobj: IO[bytes]) -> None:
+        """Upload a file object to Azure Blob Storage (blocking)"""
+        self.azure_container.upload_blob(
+            file_key,
+            fileobj,
+            overwrite=True,
+            max_concurrency=UPLOAD_MAX_CONCURRENCY,
+        )
+
+    def _put_gcs_file(self, file_key: str, fileobj: IO[bytes]) -> None:
+        """Upload a file object to Google Cloud Storage (blocking)"""
+        blob = self.gcs_bucket.blob(file_key)
+        blob.upload_from_file(fileobj, content_type=_content_type(file_key))
+
+    def _put_local_file(self, file_key: str, fileobj: IO[bytes]) -> None:
+        """Copy a file object into local storage (blocking)"""
+        file_path = os.path.join(self.local_path, file_key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            shutil.copyfileobj(fileobj, f)
+
     async def _download_backup(self, file_key: str) -> Dict:
         """Download and decompress backup file"""
         try:
-            compressed_data = None
-
-            if self.provider == BackupProvider.s3:
-                response = self.s3_client.get_object(Bucket=self.bucket, Key=file_key)
-                compressed_data = response["Body"].read()
-            elif self.provider == BackupProvider.azure:
-                container = self.azure_client.get_container_client(self.bucket)
-                compressed_data = container.download_blob(file_key).readall()
-            elif self.provider == BackupProvider.gcs:
-                bucket = self.gcs_client.bucket(self.bucket)
-                blob = bucket.blob(file_key)
-                compressed_data = blob.download_as_bytes()
-            elif self.provider == BackupProvider.local:
-                import os
-
-                file_path = os.path.join(self.local_path, file_key)
-                with open(file_path, "rb") as f:
-                    compressed_data = f.read()
-
-            # Decompress
-            with gzip.GzipFile(fileobj=io.BytesIO(compressed_data)) as gz:
-                json_data = gz.read().decode("utf-8")
-
-            return json.loads(json_data)
-
+            return await self._run_blocking(self._read_backup, file_key)
         except Exception as e:
-            logger.error(f"[ERROR] Failed to download backup: {e}")
+            logger.error("[ERROR] Failed to download backup: %s", e)
             raise
 
+    def _read_backup(self, file_key: str) -> Dict:
+        """Fetch and parse a backup file from the provider (blocking)"""
+        with self._open_stored_file(file_key) as raw:
+            # Decompress while reading: header line, then one record per line
+            with _open_backup_reader(raw) as reader:
+                backup_content = _json_loads(reader.readline())
+                columns = backup_content.get("columns")
+                if columns is None and "data" in backup_content:
+                    # Backups from before NDJSON are one object holding the data
+                    return backup_content
+                if columns is not None:
+                    records = [dict(zip(columns, _json_loads(line))) for line in reader]
+                else:
+                    records = [_json_loads(line) for line in reader]
+
+        backup_content["data"] = records
+        backup_content["record_count"] = len(records)
+        return backup_content
+
+    def _open_s3_file(self, file_key: str) -> IO[bytes]:
+        """Open an S3 object for streaming reads (blocking)"""
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=file_key)
+        return closing(response["Body"])
+
+    def _open_azure_file(self, file_key: str) -> IO[bytes]:
+        """Open an Azure blob for reading (blocking)"""
+        # The Azure downloader is not file-like; spool the compressed blob
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        downloader = self.azure_container.download_blob(
+            file_key, max_concurrency=UPLOAD_MAX_CONCURRENCY
+        )
+        downloader.readinto(spool)
+        spool.seek(0)
+        return spool
+
+    def _open_gcs_file(self, file_key: str) -> IO[bytes]:
+        """Open a GCS blob for streaming reads (blocking)"""
+        return self.gcs_bucket.blob(file_key).open("rb")
+
+    def _open_local_file(self, file_key: str) -> IO[bytes]:
+        """Open a locally stored backup (blocking)"""
+        return open(os.path.join(self.local_path, file_key), "rb")
+
+    async def _download_backup_by_id(self, backup_type: str, backup_id: str) -> Dict:
+        """Download a backup by ID, trying each supported file format"""
+        last_error: Optional[Exception] = None
+        for suffix in BACKUP_SUFFIXES:
+            try:
+                return await self._download_backup(
+                    f"backups/{backup_type}/{backup_id}{suffix}"
+                )
+            except Exception as e:
+                last_error = e
+        raise last_error  # type: ignore[misc]
+
     @staticmethod
     def _generate_backup_id(backup_type: str) -> str:
         """Generate unique backup ID"""
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        import uuid
-
-        unique_id = str(uuid.uuid4())[:8]
-        return f"{backup_type}_{timestamp}_{unique_id}"
+        return f"{backup_type}_{timestamp}_{uuid.uuid4().hex[:8]}"
 
 
 # Global instance
@@ -6,11 +6,15 @@ APScheduler integration for automated backup jobs
 
 import asyncio
 import logging
-from datetime import datetime
-from typing import Optional
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import insert, or_, update
+from sqlalchemy.orm import load_only
 
 from app.core.config import settings
 from app.db.models import BackupJob, BackupLog
@@ -19,19 +23,68 @@ from app.services.backup import BackupStatus, get_backup_service
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round-trip when loading jobs at startup
+JOB_LOAD_BATCH_SIZE = 200
+
+# A run still marked in progress after this long is assumed to have died
+# (e.g. the process was killed) and no longer blocks new runs of the job
+STALE_RUN_TIMEOUT = timedelta(hours=2)
+
+# Jobs firing within this many seconds of each other (e.g. a fleet of jobs all
+# scheduled for 02:00) are claimed together with a single statement
+JOB_CLAIM_WINDOW = 0.1
+
+
+@dataclass(slots=True, frozen=True)
+class ScheduledBackupJob:
+    """Snapshot of the BackupJob fields needed to schedule it"""
+
+    id: int
+    name: str
+    backup_type: str
+    schedule_type: str
+    schedule_time: Optional[str]
+    retention_days: int
+
+    @classmethod
+    def from_model(cls, backup_job: BackupJob) -> "ScheduledBackupJob":
+        return cls(
+            id=backup_job.id,
+            name=backup_job.name,
+            backup_type=backup_job.backup_type,
+            schedule_type=backup_job.schedule_type,
+            schedule_time=backup_job.schedule_time,
+            retention_days=backup_job.retention_days,
+        )
+
 
 class BackupScheduler:
     """Manages scheduled backup jobs using APScheduler"""
 
     def __init__(self):
-        self.scheduler = BackgroundScheduler()
+        # Jobs are coroutines run directly on the scheduler's own event loop,
+        # which lives on a dedicated thread for the scheduler's lifetime
+        self.scheduler = AsyncIOScheduler()
         self.is_running = False
         self._loaded_jobs = set()
+        # Triggers only depend on the schedule, so jobs sharing one reuse it
+        self._trigger_cache: Dict[Tuple[str, str], CronTrigger] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        # Jobs currently running, to skip overlapping runs and to let stop()
+        # wait for them. Only touched from the scheduler loop.
+        self._running_jobs: Dict[int, asyncio.Task] = {}
+        # Retention cleanups left running on the loop after their backup
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+        # Jobs waiting to be claimed in the current batch, keyed by job id
+        self._pending_claims: Optional[Dict[int, asyncio.Future]] = None
 
     def start(self):
         """Start the backup scheduler"""
         try:
             if not self.scheduler.running:
+                self._start_loop()
+                self.scheduler.configure(event_loop=self._loop)
                 self.scheduler.start()
                 self.is_running = True
                 logger.info("[OK] Backup scheduler started")
@@ -46,26 +99,68 @@ class BackupScheduler:
         """Stop the backup scheduler"""
         try:
             if self.scheduler.running:
+                # Stop dispatching, let running backups finish, then shut down;
+                # shutting down an AsyncIOScheduler cancels running jobs
+                self.scheduler.pause()
+                asyncio.run_coroutine_threadsafe(
+                    self._wait_for_jobs(), self._loop
+                ).result()
                 self.scheduler.shutdown()
+                self._stop_loop()
                 self.is_running = False
                 logger.info("[OK] Backup scheduler stopped")
         except Exception as e:
             logger.error(f"[ERROR] Failed to stop backup scheduler: {e}")
 
+    def _start_loop(self):
+        """Start the event loop thread that scheduled backups run on"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever, name="backup-scheduler-loop", daemon=True
+        )
+        self._loop_thread.start()
+
+    def _stop_loop(self):
+        """Stop the event loop thread"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+
     def _load_jobs_from_db(self):
         """Load and schedule all enabled backup jobs from database"""
         try:
             db = SessionLocal()
             try:
-                jobs = db.query(BackupJob).filter(BackupJob.is_enabled == True).all()
-
-                for job in jobs:
-                    self._schedule_job(job)
-                    self._loaded_jobs.add(job.id)
-
-                logger.info(f"[OK] Loaded {len(jobs)} backup jobs from database")
+                query = (
+                    db.query(BackupJob)
+                    .options(
+                        load_only(
+                            BackupJob.id,
+                            BackupJob.name,
+                            BackupJob.backup_type,
+                            BackupJob.schedule_type,
+                            BackupJob.schedule_time,
+                            BackupJob.retention_days,
+                        )
+                    )
+                    .filter(BackupJob.is_enabled.is_(True))
+                    .yield_per(JOB_LOAD_BATCH_SIZE)
+                )
+                jobs = [ScheduledBackupJob.from_model(job) for job in query]
             finally:
                 db.close()
+
+            for job in jobs:
+                self._schedule_job(job)
+                self._loaded_jobs.add(job.id)
+
+            logger.info(f"[OK] Loaded {len(jobs)} backup jobs from database")
         except Exception as e:
             logger.error(f"[ERROR] Failed to load backup jobs from database: {e}")
 
@@ -102,6 +197,16 @@ class BackupScheduler:
             )
 
     def _create_trigger(self, backup_job: BackupJob) -> Optional[CronTrigger]:
+        """Get the APScheduler trigger for a job's schedule, building it once"""
+        key = (backup_job.schedule_type, backup_job.schedule_time or "")
+        trigger = self._trigger_cache.get(key)
+        if trigger is None:
+            trigger = self._build_trigger(backup_job)
+            if trigger is not None:
+                self._trigger_cache[key] = trigger
+        return trigger
+
+    def _build_trigger(self, backup_job: BackupJob) -> Optional[CronTrigger]:
         """Create APScheduler trigger based on schedule type"""
         try:
             if backup_job.schedule_type == "hourly":
@@ -138,75 +243,195 @@ class BackupScheduler:
             logger.error(f"[ERROR] Failed to create trigger: {e}")
             return None
 
-    def _execute_backup(self, job_id: int, backup_type: str):
-        """Execute a backup job (called by scheduler)"""
+    async def _execute_backup(self, job_id: int, backup_type: str):
+        """Execute a backup job (called by scheduler), unless already running"""
+        if job_id in self._running_jobs:
+            logger.warning(f"Backup job {job_id} is already running, skipping")
+            return
+        task = asyncio.current_task()
+        assert task is not None  # always set inside a running coroutine
+        self._running_jobs[job_id] = task
         try:
-            db = SessionLocal()
-            try:
-                # Get job
-                backup_job = db.query(BackupJob).filter(BackupJob.id == job_id).first()
-                if not backup_job:
-                    logger.warning(f"Backup job {job_id} not found in database")
-                    return
-
-                # Update job status
-                backup_job.last_run_at = datetime.utcnow()
-                backup_job.last_run_status = BackupStatus.in_progress.value
-                db.commit()
-
-                # Execute backup
-                logger.info(f"Executing backup job: {backup_job.name}")
-                backup_service = get_backup_service()
-
-                # Run async backup
-                result = asyncio.run(
-                    self._run_backup_async(backup_service, backup_type, backup_job)
+            await self._run_backup_job(job_id, backup_type)
+        finally:
+            del self._running_jobs[job_id]
+
+    async def _run_backup_job(self, job_id: int, backup_type: str):
+        """Run a backup job and record its result"""
+        try:
+            backup_job = await self._claim_job(job_id)
+            if not backup_job:
+                logger.warning(
+                    f"Backup job {job_id} not found in database or already running"
                 )
+                return
 
-                # Update job with result
-                backup_job.last_run_status = result.get("status")
-
-                if result.get("status") == BackupStatus.completed.value:
-                    # Create backup log
-                    backup_log = BackupLog(
-                        job_id=backup_job.id,
-                        backup_id=result.get("backup_id", ""),
-                        backup_type=backup_type,
-                        status=BackupStatus.completed.value,
-                        file_key=result.get("file_key"),
-                        record_count=result.get("records", 0),
-                        started_at=datetime.utcnow(),
-                        completed_at=datetime.utcnow(),
-                    )
-                    db.add(backup_log)
+            # Execute backup
+            logger.info(f"Executing backup job: {backup_job.name}")
+            backup_service = get_backup_service()
+            result = await self._backup_and_cleanup(
+                backup_service, backup_type, backup_job
+            )
 
-                    # Clean up old backups
-                    asyncio.run(
-                        backup_service.delete_old_backups(backup_job.retention_days)
-                    )
+            await asyncio.to_thread(
+                self._record_result,
+                backup_job,
+                backup_type,
+                backup_job.last_run_at,
+                result,
+            )
+            logger.info(
+                f"[OK] Backup job completed: {backup_job.name} - Status: {result.get('status')}"
+            )
+        except Exception as e:
+            logger.error(f"[ERROR] Error executing backup job {job_id}: {e}")
 
-                else:
-                    # Log failure
-                    backup_log = BackupLog(
-                        job_id=backup_job.id,
-                        backup_id=result.get("backup_id", "unknown"),
-                        backup_type=backup_type,
-                        status=BackupStatus.failed.value,
-                        error_message=result.get("error", "Unknown error"),
-                        started_at=datetime.utcnow(),
-                        completed_at=datetime.utcnow(),
-                    )
-                    db.add(backup_log)
+    async def _claim_job(self, job_id: int):
+        """
+        Claim a job for running, batched with any other jobs that fire within
+        JOB_CLAIM_WINDOW. The first job of a batch waits out the window and
+        then claims the whole batch at once; the others wait for its result.
+        Returns None if the job doesn't exist or is already running.
+        """
+        loop = asyncio.get_running_loop()
+        claim = loop.create_future()
+        if self._pending_claims is not None:
+            self._pending_claims[job_id] = claim
+            return await claim
+
+        batch = self._pending_claims = {job_id: claim}
+        try:
+            await asyncio.sleep(JOB_CLAIM_WINDOW)
+            self._pending_claims = None
+            # Database work is blocking, so it runs off the event loop
+            claimed = await asyncio.to_thread(
+                self._claim_jobs, list(batch), datetime.utcnow()
+            )
+        except BaseException as e:
+            if self._pending_claims is batch:
+                self._pending_claims = None
+            for pending in batch.values():
+                if not pending.done():
+                    pending.set_exception(e)
+            raise
+        for pending_id, pending in batch.items():
+            pending.set_result(claimed.get(pending_id))
+        return claim.result()
+
+    def _claim_jobs(self, job_ids: List[int], started_at: datetime):
+        """
+        Mark jobs in progress and fetch what their runs need in one statement.
+        Runs in other processes are excluded by only claiming jobs that aren't
+        already in progress (or whose run went stale). Returns the claimed
+        rows keyed by job id; missing or already running jobs are left out.
+        """
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                update(BackupJob)
+                .where(
+                    BackupJob.id.in_(job_ids),
+                    or_(
+                        BackupJob.last_run_status.is_(None),
+                        BackupJob.last_run_status != BackupStatus.in_progress.value,
+                        BackupJob.last_run_at < started_at - STALE_RUN_TIMEOUT,
+                    ),
+                )
+                .values(
+                    last_run_at=started_at,
+                    last_run_status=BackupStatus.in_progress.value,
+                )
+                .returning(
+                    BackupJob.id,
+                    BackupJob.name,
+                    BackupJob.retention_days,
+                    BackupJob.last_run_at,
+                )
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            return {row.id: row for row in rows}
+        finally:
+            db.close()
+
+    def _record_result(
+        self, backup_job, backup_type: str, started_at: datetime, result: Dict
+    ):
+        """Record the run's result and its log entry in one commit"""
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(BackupJob)
+                .where(BackupJob.id == backup_job.id)
+                .values(last_run_status=result.get("status"))
+                .execution_options(synchronize_session=False)
+            )
 
-                db.commit()
-                logger.info(
-                    f"[OK] Backup job completed: {backup_job.name} - Status: {result.get('status')}"
+            # The log row is never read back here, so it's inserted directly
+            # rather than going through the session's unit of work
+            status = result.get("status")
+            if status in (BackupStatus.completed.value, BackupStatus.no_changes.value):
+                backup_log = dict(
+                    backup_id=result.get("backup_id", ""),
+                    status=status,
+                    file_key=result.get("file_key"),
+                    record_count=result.get("records", 0),
+                )
+            else:
+                backup_log = dict(
+                    backup_id=result.get("backup_id", "unknown"),
+                    status=BackupStatus.failed.value,
+                    error_message=result.get("error", "Unknown error"),
                 )
+            db.execute(
+                insert(BackupLog).values(
+                    job_id=backup_job.id,
+                    backup_type=backup_type,
+                    started_at=started_at,
+                    completed_at=datetime.utcnow(),
+                    **backup_log,
+                )
+            )
 
-            finally:
-                db.close()
-        except Exception as e:
-            logger.error(f"[ERROR] Error executing backup job {job_id}: {e}")
+            db.commit()
+        finally:
+            db.close()
+
+    async def _backup_and_cleanup(self, backup_service, backup_type: str, backup_job):
+        """
+        Run a backup, then delete old backups once it has completed. On the
+        scheduler loop the cleanup is left running in the background so the
+        job returns (and the next one can start) without waiting for it.
+        """
+        result = await self._run_backup_async(backup_service, backup_type, backup_job)
+        if result.get("status") == BackupStatus.completed.value:
+            cleanup = backup_service.delete_old_backups(backup_job.retention_days)
+            if asyncio.get_running_loop() is self._loop:
+                task = self._loop.create_task(cleanup)
+                self._cleanup_tasks.add(task)
+                task.add_done_callback(self._cleanup_done)
+            else:
+                await cleanup
+        return result
+
+    def _cleanup_done(self, task: asyncio.Task):
+        """Forget a finished background cleanup, logging unexpected errors"""
+        self._cleanup_tasks.discard(task)
+        if task.cancelled():
+            return
+        # delete_old_backups logs its own failures; only unexpected errors
+        # would otherwise go unnoticed here
+        if task.exception() is not None:
+            logger.error(f"[ERROR] Failed to delete old backups: {task.exception()}")
+
+    async def _wait_for_jobs(self):
+        """Wait for running backup jobs and their retention cleanups"""
+        while self._running_jobs or self._cleanup_tasks:
+            await asyncio.gather(
+                *self._running_jobs.values(),
+                *self._cleanup_tasks,
+                return_exceptions=True,
+            )
 
     async def _run_backup_async(self, backup_service, backup_type: str, backup_job):
         """Run backup operation based on type"""
@@ -215,6 +440,8 @@ class BackupScheduler:
                 return await backup_service.backup_sales_data()
             elif backup_type == "inventory":
                 return await backup_service.backup_inventory_data()
+            elif backup_type == "inventory_incremental":
+                return await backup_service.backup_inventory_data(incremental=True)
             elif backup_type == "full":
                 return await backup_service.backup_all_data()
             else:
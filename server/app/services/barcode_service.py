@@ -3,13 +3,127 @@ Vendly POS - Barcode Service
 Generates barcodes (Code128, UPC, EAN, QR Code) for products
 """
 
+import base64
 import io
 import logging
+import re
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, FrozenSet, Optional, Set, Tuple
+
+from app.core.config import settings
+
+try:
+    from barcode import get_barcode_class
+    from barcode.writer import ImageWriter, SVGWriter
+except ImportError:
+    get_barcode_class = None
+
+try:
+    # Encodes QR codes and writes PNG/SVG itself, without Pillow
+    import segno
+except ImportError:
+    segno = None  # type: ignore[assignment]
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # type: ignore[assignment]
+
+try:
+    import qrcode
+    import qrcode.image.svg
+except ImportError:
+    qrcode = None
 
 logger = logging.getLogger(__name__)
 
+# Rendered barcodes kept in memory; labels reprint the same SKUs all day
+BARCODE_CACHE_SIZE = 2048
+
+# Characters Code39 can encode; validated with bytes.translate in one C loop
+CODE39_CHARS = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ -.$/+%"
+
+# Fixed-length numeric symbologies
+_EAN13_MATCH = re.compile(r"[0-9]{13}").fullmatch
+_EAN8_MATCH = re.compile(r"[0-9]{8}").fullmatch
+_UPCA_MATCH = re.compile(r"[0-9]{12}").fullmatch
+_UPCE_MATCH = re.compile(r"[0-9]{6}").fullmatch
+
+
+class StaleWhileRevalidateCache:
+    """
+    Bounded LRU cache for a pure function. Entries are served directly for
+    max_age seconds; for stale_ttl seconds after that the stale value is still
+    served while a background thread recomputes it. Older entries are
+    recomputed synchronously.
+    """
+
+    def __init__(
+        self, func: Callable[..., Any], maxsize: int, max_age: float, stale_ttl: float
+    ):
+        self.func = func
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()
+        self._refreshing: Set[Tuple] = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, *args: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(args)
+            if entry is not None:
+                self._entries.move_to_end(args)
+                value, created_at = entry
+                age = time.monotonic() - created_at
+                if age < self.max_age:
+                    return value
+                if age < self.max_age + self.stale_ttl:
+                    if args not in self._refreshing:
+                        self._refreshing.add(args)
+                        threading.Thread(
+                            target=self._refresh, args=(args,), daemon=True
+                        ).start()
+                    return value
+        return self._compute(args)
+
+    def cache_clear(self) -> None:
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _compute(self, args: Tuple) -> Any:
+        value = self.func(*args)
+        with self._lock:
+            self._entries[args] = (value, time.monotonic())
+            self._entries.move_to_end(args)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def _refresh(self, args: Tuple) -> None:
+        try:
+            self._compute(args)
+        except Exception as e:
+            logger.error(f"Error refreshing cached barcode: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(args)
+
+
+def stale_while_revalidate(
+    maxsize: int, max_age: float, stale_ttl: float
+) -> Callable[[Callable[..., Any]], StaleWhileRevalidateCache]:
+    """Decorator caching a pure function in a StaleWhileRevalidateCache"""
+
+    def decorator(func: Callable[..., Any]) -> StaleWhileRevalidateCache:
+        return StaleWhileRevalidateCache(func, maxsize, max_age, stale_ttl)
+
+    return decorator
+
 
 class BarcodeFormat(str, Enum):
     """Supported barcode formats"""
@@ -24,6 +138,16 @@ class BarcodeFormat(str, Enum):
     DATA_MATRIX = "datamatrix"
 
 
+class BarcodeOutput(str, Enum):
+    """Image formats a barcode can be rendered to"""
+
+    PNG = "png"
+    SVG = "svg"
+
+
+ALL_OUTPUTS: FrozenSet[BarcodeOutput] = frozenset(BarcodeOutput)
+
+
 class BarcodeService:
     """Service for generating barcodes"""
 
@@ -34,6 +158,7 @@ class BarcodeService:
         width: int = 200,
         height: int = 100,
         include_text: bool = True,
+        outputs: FrozenSet[BarcodeOutput] = ALL_OUTPUTS,
     ) -> Dict[str, Any]:
         """
         Generate barcode image
@@ -44,116 +169,121 @@ class BarcodeService:
             width: Image width in pixels
             height: Image height in pixels
             include_text: Include barcode text below image
+            outputs: Image formats to render (PNG and/or SVG)
 
         Returns:
             Dict with image data (base64), SVG, or error
         """
-        try:
-            if format == BarcodeFormat.QR_CODE:
-                return BarcodeService._generate_qr_code(
-                    data, width, height, include_text
-                )
-            else:
-                return BarcodeService._generate_linear_barcode(
-                    data, format, width, height, include_text
-                )
-        except Exception as e:
-            logger.error(f"Error generating barcode: {e}")
-            return {"success": False, "error": str(e)}
+        # Copy so callers can't mutate the cached result
+        return dict(_render_barcode(data, format, width, height, include_text, outputs))
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Drop all cached barcode renders"""
+        _render_barcode.cache_clear()
 
     @staticmethod
     def _generate_linear_barcode(
-        data: str, format: BarcodeFormat, width: int, height: int, include_text: bool
+        data: str,
+        format: BarcodeFormat,
+        width: int,
+        height: int,
+        include_text: bool,
+        outputs: FrozenSet[BarcodeOutput] = ALL_OUTPUTS,
     ) -> Dict[str, Any]:
         """Generate linear barcode (Code128, UPC, etc.)"""
-        try:
-            import base64
-
-            from barcode import get_barcode_class
-            from barcode.writer import ImageWriter, SVGWriter
-
-            # Map format to barcode library format
-            format_map = {
-                BarcodeFormat.CODE128: "code128",
-                BarcodeFormat.CODE39: "code39",
-                BarcodeFormat.EAN13: "ean13",
-                BarcodeFormat.EAN8: "ean8",
-                BarcodeFormat.UPC_A: "upca",
-                BarcodeFormat.UPC_E: "upce",
+        if get_barcode_class is None:
+            return {
+                "success": False,
+                "error": "python-barcode library not installed. Run: pip install python-barcode pillow",
             }
 
-            barcode_format = format_map.get(format, "code128")
-
-            # Generate barcode
-            BarcodeClass = get_barcode_class(barcode_format)
-            barcode = BarcodeClass(data, writer=ImageWriter())
-
+        # Map format to barcode library format
+        format_map = {
+            BarcodeFormat.CODE128: "code128",
+            BarcodeFormat.CODE39: "code39",
+            BarcodeFormat.EAN13: "ean13",
+            BarcodeFormat.EAN8: "ean8",
+            BarcodeFormat.UPC_A: "upca",
+            BarcodeFormat.UPC_E: "upce",
+        }
+
+        barcode_format = format_map.get(format, "code128")
+
+        # Encode the data once; both writers render the same modules
+        BarcodeClass = get_barcode_class(barcode_format)
+        barcode = BarcodeClass(data)
+        code_list = barcode.build()
+        barcode.build = lambda: code_list
+        options = {
+            "width": width,
+            "height": height,
+            "font_size": 14 if include_text else 0,
+        }
+
+        result = {
+            "success": True,
+            "format": format.value,
+            "data": data,
+            "width": width,
+            "height": height,
+        }
+
+        if BarcodeOutput.PNG in outputs:
             # Generate image
-            image_buffer = io.BytesIO()
-            barcode.write(
-                image_buffer,
-                options={
-                    "width": width,
-                    "height": height,
-                    "font_size": 14 if include_text else 0,
-                },
-            )
-            image_buffer.seek(0)
+            barcode.writer = ImageWriter()
+            with io.BytesIO() as image_buffer:
+                barcode.write(image_buffer, options=options)
 
-            # Convert to base64
-            import base64
-
-            image_data = base64.b64encode(image_buffer.getvalue()).decode("utf-8")
-
-            # Also generate SVG for web display
-            svg_buffer = io.BytesIO()
-            barcode_svg = BarcodeClass(data, writer=SVGWriter())
-            barcode_svg.write(
-                svg_buffer,
-                options={
-                    "width": width,
-                    "height": height,
-                    "font_size": 14 if include_text else 0,
-                },
-            )
-            svg_buffer.seek(0)
-            svg_data = svg_buffer.getvalue().decode("utf-8")
+                # Convert to base64
+                image_data = base64.b64encode(image_buffer.getbuffer()).decode("ascii")
+            result["image_base64"] = f"data:image/png;base64,{image_data}"
 
-            return {
-                "success": True,
-                "format": format.value,
-                "data": data,
-                "image_base64": f"data:image/png;base64,{image_data}",
-                "svg": svg_data,
-                "width": width,
-                "height": height,
-            }
-        except ImportError:
-            return {
-                "success": False,
-                "error": "python-barcode library not installed. Run: pip install python-barcode pillow",
-            }
+        if BarcodeOutput.SVG in outputs:
+            # Also generate SVG for web display. The SVG writer renders the
+            # whole document to bytes, so take them directly rather than
+            # copying them through a buffer.
+            barcode.writer = SVGWriter()
+            result["svg"] = barcode.render(options).decode("utf-8")
+
+        return result
 
     @staticmethod
     def _generate_qr_code(
-        data: str, width: int, height: int, include_text: bool
+        data: str,
+        width: int,
+        height: int,
+        include_text: bool,
+        outputs: FrozenSet[BarcodeOutput] = ALL_OUTPUTS,
     ) -> Dict[str, Any]:
         """Generate QR code"""
-        try:
-            import base64
-
-            import qrcode
-
-            # Generate QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(data)
-            qr.make(fit=True)
+        if segno is not None:
+            return BarcodeService._generate_segno_qr_code(data, width, height, outputs)
+        if qrcode is None:
+            return {
+                "success": False,
+                "error": "QR code library not installed. Run: pip install segno",
+            }
 
+        result = {
+            "success": True,
+            "format": "qr",
+            "data": data,
+            "width": width,
+            "height": height,
+        }
+
+        # Encode the data once; both image factories draw the same modules
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        if BarcodeOutput.PNG in outputs:
             # Create image
             img = qr.make_image(fill_color="black", back_color="white")
 
@@ -162,45 +292,90 @@ class BarcodeService:
                 img = img.resize((width, height))
 
             # Convert to base64
-            image_buffer = io.BytesIO()
-            img.save(image_buffer, format="PNG")
-            image_buffer.seek(0)
-            image_data = base64.b64encode(image_buffer.getvalue()).decode("utf-8")
+            with io.BytesIO() as image_buffer:
+                img.save(image_buffer, format="PNG")
+                image_data = base64.b64encode(image_buffer.getbuffer()).decode("ascii")
+            result["image_base64"] = f"data:image/png;base64,{image_data}"
 
+        if BarcodeOutput.SVG in outputs:
             # Generate SVG version
             try:
-                import qrcode.image.svg
+                svg_image = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+                with io.BytesIO() as svg_buffer:
+                    svg_image.save(svg_buffer)
+                    result["svg"] = svg_buffer.getvalue().decode("utf-8")
+            except Exception:
+                pass
 
-                factory = qrcode.image.svg.SvgPathImage
-                qr_svg = qrcode.QRCode(image_factory=factory)
-                qr_svg.add_data(data)
-                qr_svg.make(fit=True)
+        return result
 
-                svg_buffer = io.BytesIO()
-                qr_svg.make_image().save(svg_buffer)
-                svg_buffer.seek(0)
-                svg_data = svg_buffer.getvalue().decode("utf-8")
-            except Exception:
-                svg_data = None
-
-            result = {
-                "success": True,
-                "format": "qr",
-                "data": data,
-                "image_base64": f"data:image/png;base64,{image_data}",
-                "width": width,
-                "height": height,
-            }
+    @staticmethod
+    def _generate_segno_qr_code(
+        data: str,
+        width: int,
+        height: int,
+        outputs: FrozenSet[BarcodeOutput] = ALL_OUTPUTS,
+    ) -> Dict[str, Any]:
+        """
+        Generate QR code with segno. The symbol is drawn at the largest whole
+        module scale that fits the requested size, keeping modules sharp, and
+        centred on a white canvas of exactly the requested size.
+        make_qr never picks Micro QR, which most retail scanners cannot read.
+        """
+        qr = segno.make_qr(data, error="l")
+        symbol_width, symbol_height = qr.symbol_size()
+        scale = max(1, min(width // symbol_width, height // symbol_height))
+
+        result = {
+            "success": True,
+            "format": "qr",
+            "data": data,
+            "width": width,
+            "height": height,
+        }
+
+        if BarcodeOutput.PNG in outputs:
+            with io.BytesIO() as image_buffer:
+                qr.save(image_buffer, kind="png", scale=scale)
+                if (symbol_width * scale, symbol_height * scale) != (width, height):
+                    BarcodeService._fit_png(image_buffer, width, height)
+                image_data = base64.b64encode(image_buffer.getbuffer()).decode("ascii")
+            result["image_base64"] = f"data:image/png;base64,{image_data}"
+
+        if BarcodeOutput.SVG in outputs:
+            with io.BytesIO() as svg_buffer:
+                # A viewBox without a size, so the requested size can be set;
+                # the default aspect ratio handling centres the symbol
+                qr.save(svg_buffer, kind="svg", scale=scale, omitsize=True)
+                result["svg"] = (
+                    svg_buffer.getvalue()
+                    .decode("utf-8")
+                    .replace("<svg ", f'<svg width="{width}" height="{height}" ', 1)
+                )
 
-            if svg_data:
-                result["svg"] = svg_data
+        return result
 
-            return result
-        except ImportError:
-            return {
-                "success": False,
-                "error": "qrcode library not installed. Run: pip install qrcode[pil]",
-            }
+    @staticmethod
+    def _fit_png(image_buffer: io.BytesIO, width: int, height: int) -> None:
+        """
+        Rewrite a PNG in place at exactly width x height: centred on white
+        padding if it is smaller, scaled down if it is larger.
+        """
+        if Image is None:
+            return
+        image_buffer.seek(0)
+        with Image.open(image_buffer) as symbol:
+            if symbol.width <= width and symbol.height <= height:
+                fitted = Image.new("L", (width, height), 255)
+                fitted.paste(
+                    symbol.convert("L"),
+                    ((width - symbol.width) // 2, (height - symbol.height) // 2),
+                )
+            else:
+                fitted = symbol.resize((width, height))
+        image_buffer.seek(0)
+        image_buffer.truncate()
+        fitted.save(image_buffer, format="PNG")
 
     @staticmethod
     def validate_barcode(
@@ -217,41 +392,21 @@ class BarcodeService:
             Dict with validation result
         """
         try:
-            # Handle string format input (convert to enum)
-            if isinstance(format, str):
-                try:
-                    format = BarcodeFormat(format)
-                except ValueError:
-                    return {
-                        "valid": False,
-                        "error": f"Unknown barcode format: {format}",
-                    }
-
-            if format == BarcodeFormat.EAN13:
-                return BarcodeService._validate_ean13(data)
-            elif format == BarcodeFormat.EAN8:
-                return BarcodeService._validate_ean8(data)
-            elif format == BarcodeFormat.UPC_A:
-                return BarcodeService._validate_upca(data)
-            elif format == BarcodeFormat.UPC_E:
-                return BarcodeService._validate_upce(data)
-            elif format == BarcodeFormat.CODE128:
-                return BarcodeService._validate_code128(data)
-            elif format == BarcodeFormat.CODE39:
-                return BarcodeService._validate_code39(data)
-            elif format == BarcodeFormat.QR_CODE:
-                return BarcodeService._validate_qr_code(data)
-            elif format == BarcodeFormat.DATA_MATRIX:
-                return {
-                    "valid": True,
-                    "message": "DataMatrix validation not implemented",
-                }
-            else:
+            # BarcodeFormat is a str enum, so plain format strings hash and
+            # compare equal to their member and look up without conversion
+            validate = _VALIDATORS.get(format)
+            if validate is None:
                 return {"valid": False, "error": f"Unsupported format: {format}"}
+            return validate(data)
         except Exception as e:
             logger.error(f"Error validating barcode: {e}")
             return {"valid": False, "error": str(e)}
 
+    @staticmethod
+    def _validate_data_matrix(data: str) -> Dict[str, Any]:
+        """Validate DataMatrix"""
+        return {"valid": True, "message": "DataMatrix validation not implemented"}
+
     @staticmethod
     def _validate_qr_code(data: str) -> Dict[str, Any]:
         """Validate QR code data"""
@@ -262,28 +417,28 @@ class BarcodeService:
     @staticmethod
     def _validate_ean13(data: str) -> Dict[str, Any]:
         """Validate EAN-13"""
-        if not data.isdigit() or len(data) != 13:
+        if not _EAN13_MATCH(data):
             return {"valid": False, "error": "EAN-13 must be 13 digits"}
         return {"valid": True, "message": "Valid EAN-13"}
 
     @staticmethod
     def _validate_ean8(data: str) -> Dict[str, Any]:
         """Validate EAN-8"""
-        if not data.isdigit() or len(data) != 8:
+        if not _EAN8_MATCH(data):
             return {"valid": False, "error": "EAN-8 must be 8 digits"}
         return {"valid": True, "message": "Valid EAN-8"}
 
     @staticmethod
     def _validate_upca(data: str) -> Dict[str, Any]:
         """Validate UPC-A"""
-        if not data.isdigit() or len(data) != 12:
+        if not _UPCA_MATCH(data):
             return {"valid": False, "error": "UPC-A must be 12 digits"}
         return {"valid": True, "message": "Valid UPC-A"}
 
     @staticmethod
     def _validate_upce(data: str) -> Dict[str, Any]:
         """Validate UPC-E"""
-        if not data.isdigit() or len(data) != 6:
+        if not _UPCE_MATCH(data):
             return {"valid": False, "error": "UPC-E must be 6 digits"}
         return {"valid": True, "message": "Valid UPC-E"}
 
@@ -298,12 +453,52 @@ class BarcodeService:
     @staticmethod
     def _validate_code39(data: str) -> Dict[str, Any]:
         """Validate Code39"""
-        # Code39 accepts alphanumeric and some special chars
-        valid_chars = set("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ -.$/+%")
-        if not all(c in valid_chars for c in data.upper()):
+        # Code39 accepts alphanumeric and some special chars; anything left
+        # after deleting those (non-ASCII becomes "?") is invalid
+        if data.upper().encode("ascii", "replace").translate(None, CODE39_CHARS):
             return {"valid": False, "error": "Code39 contains invalid characters"}
         return {"valid": True, "message": "Valid Code39"}
 
 
+_VALIDATORS: Dict[BarcodeFormat, Callable[[str], Dict[str, Any]]] = {
+    BarcodeFormat.EAN13: BarcodeService._validate_ean13,
+    BarcodeFormat.EAN8: BarcodeService._validate_ean8,
+    BarcodeFormat.UPC_A: BarcodeService._validate_upca,
+    BarcodeFormat.UPC_E: BarcodeService._validate_upce,
+    BarcodeFormat.CODE128: BarcodeService._validate_code128,
+    BarcodeFormat.CODE39: BarcodeService._validate_code39,
+    BarcodeFormat.QR_CODE: BarcodeService._validate_qr_code,
+    BarcodeFormat.DATA_MATRIX: BarcodeService._validate_data_matrix,
+}
+
+
+@stale_while_revalidate(
+    maxsize=BARCODE_CACHE_SIZE,
+    max_age=settings.BARCODE_CACHE_TTL,
+    stale_ttl=settings.BARCODE_CACHE_SWR_TTL,
+)
+def _render_barcode(
+    data: str,
+    format: BarcodeFormat,
+    width: int,
+    height: int,
+    include_text: bool,
+    outputs: FrozenSet[BarcodeOutput],
+) -> Dict[str, Any]:
+    """Render a barcode; results are memoized since rendering is deterministic"""
+    try:
+        if format == BarcodeFormat.QR_CODE:
+            return BarcodeService._generate_qr_code(
+                data, width, height, include_text, outputs
+            )
+        else:
+            return BarcodeService._generate_linear_barcode(
+                data, format, width, height, include_text, outputs
+            )
+    except Exception as e:
+        logger.error(f"Error generating barcode: {e}")
+        return {"success": False, "error": str(e)}
+
+
 # Global barcode service instance
 barcode_service = BarcodeService()
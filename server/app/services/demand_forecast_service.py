@@ -3,14 +3,19 @@
 # Business logic for demand forecasting
 # ===========================================
 
+import hashlib
 import logging
 import sys
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
+import numpy as np
 import pandas as pd
-from sqlalchemy.orm import Session
+from cachetools import LRUCache, TTLCache
+from sqlalchemy import bindparam, func, insert, select
+from sqlalchemy.orm import Session, joinedload
 
 from app.db import models as m
 
@@ -20,12 +25,144 @@ from ai_ml.demand_forecast import DemandForecaster
 
 logger = logging.getLogger(__name__)
 
+# Sales history DataFrames keyed by (product_id, days_back). Training,
+# forecasting and evaluating a product back to back reuse one fetch.
+SALES_HISTORY_CACHE_SIZE = 256
+SALES_HISTORY_CACHE_TTL = 30
+
+# Training metrics keyed by (product_id, model_type, history digest)
+TRAINING_CACHE_SIZE = 256
+
+# Demand history rows fetched per round-trip when building sales history
+HISTORY_BATCH_SIZE = 5000
+
+# Statements for the per-product reads, built once at import and bound per
+# call so the hot paths skip rebuilding the expression tree every time
+_HISTORY_STMT = select(
+    m.DemandHistory.date,
+    m.DemandHistory.quantity_sold,
+    m.DemandHistory.revenue,
+).where(
+    m.DemandHistory.product_id == bindparam("product_id"),
+    m.DemandHistory.date >= bindparam("cutoff"),
+)
+
+_SALE_DATE = func.date(m.Sale.created_at)
+_SALES_HISTORY_STMT = (
+    select(
+        _SALE_DATE,
+        func.sum(m.SaleItem.quantity),
+        func.sum(m.SaleItem.unit_price * m.SaleItem.quantity),
+    )
+    .join(m.SaleItem, m.Sale.id == m.SaleItem.sale_id)
+    .where(
+        m.SaleItem.product_id == bindparam("product_id"),
+        m.Sale.created_at >= bindparam("cutoff"),
+    )
+    .group_by(_SALE_DATE)
+    .order_by(_SALE_DATE)
+)
+
+_DEMAND_HISTORY_DAY_STMT = select(m.DemandHistory).where(
+    m.DemandHistory.product_id == bindparam("product_id"),
+    m.DemandHistory.date == bindparam("date"),
+)
+
+_LATEST_FORECAST_STMT = (
+    select(m.DemandForecast)
+    .options(joinedload(m.DemandForecast.product))
+    .where(m.DemandForecast.product_id == bindparam("product_id"))
+    .order_by(m.DemandForecast.created_at.desc(), m.DemandForecast.id.desc())
+    .limit(1)
+)
+
+_UPCOMING_DETAILS_STMT = select(m.ForecastDetail).where(
+    m.ForecastDetail.demand_forecast_id == bindparam("forecast_id"),
+    m.ForecastDetail.forecast_for_date <= bindparam("until"),
+)
+
+_FORECAST_POINTS_STMT = select(
+    m.ForecastDetail.forecast_for_date,
+    m.ForecastDetail.forecasted_quantity,
+).where(m.ForecastDetail.demand_forecast_id == bindparam("forecast_id"))
+
+
+def _summary_dict(
+    forecast: m.DemandForecast, details: Sequence[m.ForecastDetail]
+) -> Dict[str, Any]:
+    """Shape a forecast, its product and upcoming details into a summary"""
+    product = forecast.product
+    return {
+        "product_id": forecast.product_id,
+        "product_name": product.name if product else "Unknown",
+        "current_stock": product.quantity if product else 0,
+        "latest_forecast_id": forecast.id,
+        "model_type": forecast.model_type,
+        "forecast_date": forecast.created_at.isoformat(),
+        "average_demand": forecast.average_demand,
+        "mae": forecast.mae,
+        "rmse": forecast.rmse,
+        "r2_score": forecast.r2_score,
+        "next_7_days": [
+            {
+                "date": d.forecast_for_date.date().isoformat(),
+                "forecast": d.forecasted_quantity,
+                "lower_bound": d.lower_bound,
+                "upper_bound": d.upper_bound,
+            }
+            for d in details
+        ],
+    }
+
+
+def _history_frame(batches) -> pd.DataFrame:
+    """
+    Build a date/quantity/revenue DataFrame from batches of row tuples.
+    Rows are split into columns and handed to pandas as typed arrays, so
+    there are no per-row dicts and no dtype inference.
+    """
+    dates: List[Any] = []
+    quantities: List[Any] = []
+    revenues: List[Any] = []
+    for rows in batches:
+        if rows:
+            batch_dates, batch_quantities, batch_revenues = zip(*rows)
+            dates.extend(batch_dates)
+            quantities.extend(batch_quantities)
+            revenues.extend(batch_revenues)
+
+    if not dates:
+        return pd.DataFrame()
+
+    return pd.DataFrame(
+        {
+            "date": pd.to_datetime(dates),
+            "quantity": np.asarray(quantities, dtype=np.int64),
+            "revenue": np.nan_to_num(np.asarray(revenues, dtype=np.float64)),
+        }
+    )
+
 
 class DemandForecastService:
     """Service for managing demand forecasting operations"""
 
     def __init__(self):
         self.forecaster = DemandForecaster()
+        self._history_cache: TTLCache = TTLCache(
+            maxsize=SALES_HISTORY_CACHE_SIZE, ttl=SALES_HISTORY_CACHE_TTL
+        )
+        self._history_cache_lock = threading.Lock()
+        self._training_cache: LRUCache = LRUCache(maxsize=TRAINING_CACHE_SIZE)
+        self._training_cache_lock = threading.Lock()
+
+    def invalidate_sales_history(self, product_id: Optional[int] = None) -> None:
+        """Drop cached sales history for a product (or all products if none given)"""
+        with self._history_cache_lock:
+            if product_id is None:
+                self._history_cache.clear()
+            else:
+                for key in [k for k in self._history_cache if k[0] == product_id]:
+                    self._history_cache.pop(key, None)
 
     def get_product_sales_history(
         self, db: Session, product_id: int, days_back: int = 180
@@ -33,6 +170,9 @@ class DemandForecastService:
         """
         Retrieve historical sales data for a product.
 
+        Results are cached for SALES_HISTORY_CACHE_TTL seconds, and dropped
+        when the product's demand history is updated through this service.
+
         Args:
             db: Database session
             product_id: Product ID
@@ -41,67 +181,38 @@ class DemandForecastService:
         Returns:
             DataFrame with sales history
         """
+        key = (product_id, days_back)
+        with self._history_cache_lock:
+            cached = self._history_cache.get(key)
+        if cached is None:
+            cached = self._fetch_sales_history(db, product_id, days_back)
+            with self._history_cache_lock:
+                self._history_cache[key] = cached
+        # Callers get their own copy so they can't alter the cached frame
+        return cached.copy()
+
+    def _fetch_sales_history(
+        self, db: Session, product_id: int, days_back: int
+    ) -> pd.DataFrame:
+        """Query a product's daily sales history from the database"""
         cutoff_date = datetime.utcnow() - timedelta(days=days_back)
 
-        # Query from existing demand history or calculate from sales
-        history = (
-            db.query(m.DemandHistory)
-            .filter(
-                m.DemandHistory.product_id == product_id,
-                m.DemandHistory.date >= cutoff_date,
-            )
-            .all()
+        # Query from existing demand history or calculate from sales. Only
+        # the needed columns are read, streamed in batches rather than
+        # loaded as ORM objects all at once.
+        params = {"product_id": product_id, "cutoff": cutoff_date}
+        history = db.execute(
+            _HISTORY_STMT,
+            params,
+            execution_options={"yield_per": HISTORY_BATCH_SIZE},
         )
+        df = _history_frame(history.partitions())
 
-        if history:
-            # Convert to DataFrame
-            data = [
-                {
-                    "date": h.date,
-                    "quantity": h.quantity_sold,
-                    "revenue": h.revenue,
-                }
-                for h in history
-            ]
-            df = pd.DataFrame(data)
-        else:
-            # Calculate from sales
-            sales_data = (
-                db.query(
-                    m.Sale.created_at,
-                    m.SaleItem.quantity,
-                    m.SaleItem.unit_price * m.SaleItem.quantity,
-                )
-                .join(m.SaleItem, m.Sale.id == m.SaleItem.sale_id)
-                .filter(
-                    m.SaleItem.product_id == product_id,
-                    m.Sale.created_at >= cutoff_date,
-                )
-                .all()
-            )
-
-            if not sales_data:
-                return pd.DataFrame()
-
-            # Aggregate by day
-            df_list = []
-            for date_val, quantity, revenue in sales_data:
-                df_list.append(
-                    {
-                        "date": date_val.date(),
-                        "quantity": quantity,
-                        "revenue": float(revenue) if revenue else 0,
-                    }
-                )
+        if df.empty:
+            # Calculate from sales, aggregated by day in the database
+            sales_data = db.execute(_SALES_HISTORY_STMT, params).all()
 
-            df = pd.DataFrame(df_list)
-            if not df.empty:
-                df["date"] = pd.to_datetime(df["date"])
-                df = (
-                    df.groupby("date")
-                    .agg({"quantity": "sum", "revenue": "sum"})
-                    .reset_index()
-                )
+            df = _history_frame([sales_data])
 
         return df
 
@@ -135,20 +246,7 @@ class DemandForecastService:
             if df.empty:
                 return {"error": "Insufficient sales history for this product"}
 
-            # Prepare data with standard column name
-            df = df.rename(columns={"quantity": "quantity"})
-
-            # Train model
-            logger.info(f"Training {model_type} model for product {product_id}")
-            metrics = self.forecaster.train_ensemble(df)
-
-            return {
-                "product_id": product_id,
-                "product_name": product.name,
-                "model_type": model_type,
-                "metrics": metrics,
-                "trained_at": datetime.utcnow().isoformat(),
-            }
+            return self._train_on_history(product, df, model_type)
 
         except Exception as e:
             logger.error(f"Error training model: {e}")
@@ -186,57 +284,164 @@ class DemandForecastService:
             if df.empty:
                 return {"error": "Insufficient sales history"}
 
-            # Prepare data
-            df = df.rename(columns={"quantity": "quantity"})
+            return self._forecast_from_history(
+                db, product, df, days_ahead, model_type, user_id
+            )
 
-            # Generate forecast
-            forecast_result = self.forecaster.forecast(df, days_ahead, model_type)
+        except Exception as e:
+            logger.error(f"Error generating forecast: {e}")
+            db.rollback()
+            return {"error": str(e)}
 
-            if "error" in forecast_result:
-                return forecast_result
+    def train_and_forecast(
+        self,
+        db: Session,
+        product_id: int,
+        days_ahead: int = 30,
+        model_type: str = "ensemble",
+        user_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Train a model for a product and generate its forecast in one pass,
+        fetching the product and its sales history once for both steps.
 
-            # Save forecast to database
-            forecast_record = m.DemandForecast(
-                product_id=product_id,
-                forecast_date=datetime.utcnow(),
-                forecast_horizon_days=days_ahead,
-                model_type=model_type,
-                average_demand=forecast_result.get("average_demand", 0),
-                confidence_level=forecast_result.get("confidence_level", 0.9),
-                created_by_user_id=user_id,
-            )
-            db.add(forecast_record)
-            db.flush()  # Get the ID
-
-            # Save forecast details
-            for forecast_item in forecast_result.get("forecast", []):
-                detail = m.ForecastDetail(
-                    demand_forecast_id=forecast_record.id,
-                    forecast_for_date=forecast_item["date"],
-                    forecasted_quantity=forecast_item["forecast"],
-                    lower_bound=forecast_item.get("lower_bound"),
-                    upper_bound=forecast_item.get("upper_bound"),
-                )
-                db.add(detail)
+        Args:
+            db: Database session
+            product_id: Product ID
+            days_ahead: Number of days to forecast
+            model_type: Type of model to use
+            user_id: User ID for audit trail
 
-            db.commit()
+        Returns:
+            Dictionary with the training and forecast results
+        """
+        try:
+            product = db.query(m.Product).filter(m.Product.id == product_id).first()
+            if not product:
+                return {"error": "Product not found"}
 
-            return {
-                "forecast_id": forecast_record.id,
-                "product_id": product_id,
-                "product_name": product.name,
-                "model_type": model_type,
-                "forecast_horizon": days_ahead,
-                "average_demand": forecast_result.get("average_demand"),
-                "forecast": forecast_result.get("forecast"),
-                "created_at": forecast_record.created_at.isoformat(),
-            }
+            df = self.get_product_sales_history(db, product_id)
+            if df.empty:
+                return {"error": "Insufficient sales history for this product"}
+
+            training = self._train_on_history(product, df, model_type, reuse_fit=True)
+            forecast = self._forecast_from_history(
+                db, product, df, days_ahead, model_type, user_id
+            )
+            if "error" in forecast:
+                return forecast
+
+            return {"training": training, "forecast": forecast}
 
         except Exception as e:
-            logger.error(f"Error generating forecast: {e}")
+            logger.error(f"Error training and forecasting: {e}")
             db.rollback()
             return {"error": str(e)}
 
+    def _train_on_history(
+        self,
+        product: m.Product,
+        df: pd.DataFrame,
+        model_type: str,
+        reuse_fit: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Train on a product's sales history. Training is deterministic, so with
+        reuse_fit the metrics are reused while the history is unchanged.
+        Without it the shared ensemble model is always refit and saved, since
+        it may currently hold another product's fit.
+        """
+        digest = hashlib.blake2b(
+            pd.util.hash_pandas_object(df, index=False).values.tobytes(),
+            digest_size=8,
+        ).hexdigest()
+        key = (product.id, model_type, digest)
+        metrics = None
+        if reuse_fit:
+            with self._training_cache_lock:
+                metrics = self._training_cache.get(key)
+
+        if metrics is None:
+            logger.info(f"Training {model_type} model for product {product.id}")
+            metrics = self.forecaster.train_ensemble(df)
+            with self._training_cache_lock:
+                self._training_cache[key] = metrics
+
+        return {
+            "product_id": product.id,
+            "product_name": product.name,
+            "model_type": model_type,
+            "metrics": metrics,
+            "trained_at": datetime.utcnow().isoformat(),
+        }
+
+    def _forecast_from_history(
+        self,
+        db: Session,
+        product: m.Product,
+        df: pd.DataFrame,
+        days_ahead: int,
+        model_type: str,
+        user_id: Optional[int],
+    ) -> Dict[str, Any]:
+        """Forecast from a product's sales history and save the forecast"""
+        # Generate forecast
+        forecast_result = self.forecaster.forecast(df, days_ahead, model_type)
+
+        if "error" in forecast_result:
+            return forecast_result
+
+        forecast_items = forecast_result.get("forecast", [])
+        average_demand = forecast_result.get("average_demand")
+        if average_demand is None:
+            # Not every model reports it; derive it from the forecast
+            quantities = np.fromiter(
+                (item["forecast"] for item in forecast_items),
+                dtype=np.float64,
+                count=len(forecast_items),
+            )
+            average_demand = float(quantities.mean()) if quantities.size else 0.0
+
+        # Save forecast to database
+        forecast_record = m.DemandForecast(
+            product_id=product.id,
+            forecast_date=datetime.utcnow(),
+            forecast_horizon_days=days_ahead,
+            model_type=model_type,
+            average_demand=average_demand,
+            confidence_level=forecast_result.get("confidence_level", 0.9),
+            created_by_user_id=user_id,
+        )
+        db.add(forecast_record)
+        db.flush()  # Get the ID
+
+        # Save forecast details in one executemany insert
+        detail_rows = [
+            {
+                "demand_forecast_id": forecast_record.id,
+                "forecast_for_date": forecast_item["date"],
+                "forecasted_quantity": forecast_item["forecast"],
+                "lower_bound": forecast_item.get("lower_bound"),
+                "upper_bound": forecast_item.get("upper_bound"),
+            }
+            for forecast_item in forecast_items
+        ]
+        if detail_rows:
+            db.execute(insert(m.ForecastDetail), detail_rows)
+
+        db.commit()
+
+        return {
+            "forecast_id": forecast_record.id,
+            "product_id": product.id,
+            "product_name": product.name,
+            "model_type": model_type,
+            "forecast_horizon": days_ahead,
+            "average_demand": average_demand,
+            "forecast": forecast_items,
+            "created_at": forecast_record.created_at.isoformat(),
+        }
+
     def evaluate_forecast(
         self,
         db: Session,
@@ -262,12 +467,10 @@ class DemandForecastService:
             if not forecast:
                 return {"error": "Forecast not found"}
 
-            # Get forecast details
-            details = (
-                db.query(m.ForecastDetail)
-                .filter(m.ForecastDetail.demand_forecast_id == forecast_id)
-                .all()
-            )
+            # Get forecast dates and quantities
+            details = db.execute(
+                _FORECAST_POINTS_STMT, {"forecast_id": forecast_id}
+            ).all()
 
             if not details:
                 return {"error": "No forecast details found"}
@@ -340,56 +543,90 @@ class DemandForecastService:
             Forecast summary
         """
         try:
-            # Get latest forecast
-            latest = (
-                db.query(m.DemandForecast)
-                .filter(m.DemandForecast.product_id == product_id)
-                .order_by(m.DemandForecast.created_at.desc())
-                .first()
-            )
+            # Get latest forecast, with its product joined into the same query
+            latest = db.scalars(
+                _LATEST_FORECAST_STMT, {"product_id": product_id}
+            ).first()
 
             if not latest:
                 return {"error": "No forecasts found for this product"}
 
-            # Get product
-            product = db.query(m.Product).filter(m.Product.id == product_id).first()
-
             # Get forecast details for next 7 days
             next_7_days = datetime.utcnow() + timedelta(days=7)
-            details = (
+            details = db.scalars(
+                _UPCOMING_DETAILS_STMT,
+                {"forecast_id": latest.id, "until": next_7_days},
+            ).all()
+
+            return _summary_dict(latest, details)
+
+        except Exception as e:
+            logger.error(f"Error getting forecast summary: {e}")
+            return {"error": str(e)}
+
+    def get_forecast_summary_many(
+        self, db: Session, product_ids: List[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Get summaries of the latest forecasts for several products at once.
+
+        Args:
+            db: Database session
+            product_ids: Product IDs
+
+        Returns:
+            Forecast summaries keyed by product ID; products without a
+            forecast are left out
+        """
+        if not product_ids:
+            return {}
+
+        try:
+            # Latest forecast per product
+            latest = (
+                select(
+                    m.DemandForecast.id,
+                    func.row_number()
+                    .over(
+                        partition_by=m.DemandForecast.product_id,
+                        order_by=(
+                            m.DemandForecast.created_at.desc(),
+                            m.DemandForecast.id.desc(),
+                        ),
+                    )
+                    .label("rn"),
+                )
+                .where(m.DemandForecast.product_id.in_(product_ids))
+                .subquery()
+            )
+            forecasts = (
+                db.query(m.DemandForecast)
+                .options(joinedload(m.DemandForecast.product))
+                .join(latest, latest.c.id == m.DemandForecast.id)
+                .filter(latest.c.rn == 1)
+                .all()
+            )
+            if not forecasts:
+                return {}
+
+            # Forecast details for next 7 days, for every forecast at once
+            next_7_days = datetime.utcnow() + timedelta(days=7)
+            details: Dict[int, List[m.ForecastDetail]] = {f.id: [] for f in forecasts}
+            for d in (
                 db.query(m.ForecastDetail)
                 .filter(
-                    m.ForecastDetail.demand_forecast_id == latest.id,
+                    m.ForecastDetail.demand_forecast_id.in_(details),
                     m.ForecastDetail.forecast_for_date <= next_7_days,
                 )
-                .all()
-            )
+                .order_by(m.ForecastDetail.forecast_for_date)
+            ):
+                details[d.demand_forecast_id].append(d)
 
-            return {
-                "product_id": product_id,
-                "product_name": product.name if product else "Unknown",
-                "current_stock": product.quantity if product else 0,
-                "latest_forecast_id": latest.id,
-                "model_type": latest.model_type,
-                "forecast_date": latest.created_at.isoformat(),
-                "average_demand": latest.average_demand,
-                "mae": latest.mae,
-                "rmse": latest.rmse,
-                "r2_score": latest.r2_score,
-                "next_7_days": [
-                    {
-                        "date": d.forecast_for_date.date().isoformat(),
-                        "forecast": d.forecasted_quantity,
-                        "lower_bound": d.lower_bound,
-                        "upper_bound": d.upper_bound,
-                    }
-                    for d in details
-                ],
-            }
+            return {f.product_id: _summary_dict(f, details[f.id]) for f in forecasts}
 
         except Exception as e:
-            logger.error(f"Error getting forecast summary: {e}")
-            return {"error": str(e)}
+            logger.error(f"Error getting forecast summaries: {e}")
+            return {}
 
     def get_low_stock_alerts(
         self, db: Session, threshold_days: int = 7
@@ -405,63 +642,71 @@ class DemandForecastService:
             List of low stock alerts
         """
         try:
-            alerts = []
+            threshold_date = datetime.utcnow() + timedelta(days=threshold_days)
 
-            # Get all products with forecasts
-            products = (
-                db.query(m.Product)
-                .join(m.DemandForecast, m.Product.id == m.DemandForecast.product_id)
-                .filter(m.DemandForecast.is_active == True)
-                .distinct()
-                .all()
-            )
-
-            for product in products:
-                # Get latest forecast
-                forecast = (
-                    db.query(m.DemandForecast)
-                    .filter(
-                        m.DemandForecast.product_id == product.id,
-                        m.DemandForecast.is_active == True,
+            # Latest active forecast per product
+            latest = (
+                select(
+                    m.DemandForecast.id,
+                    m.DemandForecast.product_id,
+                    func.row_number()
+                    .over(
+                        partition_by=m.DemandForecast.product_id,
+                        order_by=(
+                            m.DemandForecast.created_at.desc(),
+                            m.DemandForecast.id.desc(),
+                        ),
                     )
-                    .order_by(m.DemandForecast.created_at.desc())
-                    .first()
+                    .label("rn"),
                 )
+                .where(m.DemandForecast.is_active.is_(True))
+                .subquery()
+            )
 
-                if not forecast:
-                    continue
-
-                # Sum forecast for next N days
-                threshold_date = datetime.utcnow() + timedelta(days=threshold_days)
-                forecasted_demand = (
-                    db.query(m.ForecastDetail)
-                    .filter(
-                        m.ForecastDetail.demand_forecast_id == forecast.id,
-                        m.ForecastDetail.forecast_for_date <= threshold_date,
-                    )
-                    .all()
+            # Sum each latest forecast over the next N days and keep the
+            # products whose stock won't cover it, largest shortage first,
+            # all in one query
+            total_forecasted = func.sum(m.ForecastDetail.forecasted_quantity)
+            rows = db.execute(
+                select(
+                    m.Product.id,
+                    m.Product.name,
+                    m.Product.quantity,
+                    total_forecasted.label("total_forecasted"),
+                )
+                .join(latest, latest.c.product_id == m.Product.id)
+                .join(
+                    m.ForecastDetail,
+                    m.ForecastDetail.demand_forecast_id == latest.c.id,
+                )
+                .where(
+                    latest.c.rn == 1,
+                    m.ForecastDetail.forecast_for_date <= threshold_date,
                 )
+                .group_by(m.Product.id, m.Product.name, m.Product.quantity)
+                .having(m.Product.quantity < total_forecasted)
+                .order_by((total_forecasted - m.Product.quantity).desc())
+            ).all()
 
-                total_forecasted = sum(d.forecasted_quantity for d in forecasted_demand)
-
-                # Check if stock will be insufficient
-                if product.quantity < total_forecasted:
-                    shortage = total_forecasted - product.quantity
-                    alerts.append(
-                        {
-                            "product_id": product.id,
-                            "product_name": product.name,
-                            "current_stock": product.quantity,
-                            "forecasted_demand": total_forecasted,
-                            "shortage": shortage,
-                            "reorder_recommended": True,
-                            "reorder_quantity": int(
-                                shortage * 1.5
-                            ),  # Reorder 1.5x shortage
-                        }
-                    )
+            alerts = []
+            for row in rows:
+                total = float(row.total_forecasted)
+                shortage = total - row.quantity
+                alerts.append(
+                    {
+                        "product_id": row.id,
+                        "product_name": row.name,
+                        "current_stock": row.quantity,
+                        "forecasted_demand": total,
+                        "shortage": shortage,
+                        "reorder_recommended": True,
+                        "reorder_quantity": int(
+                            shortage * 1.5
+                        ),  # Reorder 1.5x shortage
+                    }
+                )
 
-            return sorted(alerts, key=lambda x: x["shortage"], reverse=True)
+            return alerts
 
         except Exception as e:
             logger.error(f"Error getting low stock alerts: {e}")
@@ -490,14 +735,9 @@ class DemandForecastService:
         """
         try:
             # Check if record exists
-            existing = (
-                db.query(m.DemandHistory)
-                .filter(
-                    m.DemandHistory.product_id == product_id,
-                    m.DemandHistory.date == date,
-                )
-                .first()
-            )
+            existing = db.scalars(
+                _DEMAND_HISTORY_DAY_STMT, {"product_id": product_id, "date": date}
+            ).first()
 
             date_obj = pd.to_datetime(date)
 
@@ -517,6 +757,7 @@ class DemandForecastService:
                 db.add(history)
 
             db.commit()
+            self.invalidate_sales_history(product_id)
             return {"success": True, "product_id": product_id, "date": str(date)}
 
         except Exception as e:
@@ -550,10 +791,14 @@ class DemandForecastService:
             if not forecast:
                 return {"error": "No forecast found"}
 
-            # Get forecast details
+            # Get forecast dates and quantities; only the two columns are
+            # loaded so they come back as plain floats ready for NumPy
             cutoff_date = datetime.utcnow() + timedelta(days=days)
             details = (
-                db.query(m.ForecastDetail)
+                db.query(
+                    m.ForecastDetail.forecast_for_date,
+                    m.ForecastDetail.forecasted_quantity,
+                )
                 .filter(
                     m.ForecastDetail.demand_forecast_id == forecast.id,
                     m.ForecastDetail.forecast_for_date <= cutoff_date,
@@ -564,37 +809,53 @@ class DemandForecastService:
             # Get actual sales
             actual_data = self.get_product_sales_history(db, product_id, days)
 
+            # Index actual quantities by day once (first row per day) rather
+            # than filtering the whole frame for every forecast detail
+            actual_by_date: Dict[Any, Any] = {}
+            if not actual_data.empty:
+                actual_by_date = (
+                    actual_data.groupby(actual_data["date"].dt.date)["quantity"]
+                    .first()
+                    .to_dict()
+                )
+
+            # Compute errors and accuracy over all days at once
+            detail_days = [detail.forecast_for_date.date() for detail in details]
+            forecasted = np.fromiter(
+                (detail.forecasted_quantity for detail in details),
+                dtype=np.float64,
+                count=len(details),
+            )
+            actual = np.fromiter(
+                (actual_by_date.get(day, 0) for day in detail_days),
+                dtype=np.float64,
+                count=len(detail_days),
+            )
+            error = actual - forecasted
+            accuracy = np.maximum(
+                0.0, 100 - (np.abs(error) / (forecasted + 0.001)) * 100
+            )
+
             # Build comparison
-            comparison: list[dict[str, Any]] = []
-            for detail in details:
-                actual = 0
-                if not actual_data.empty:
-                    match = actual_data[
-                        actual_data["date"].dt.date == detail.forecast_for_date.date()
-                    ]
-                    if not match.empty:
-                        actual = match["quantity"].iloc[0]
-
-                forecasted_qty = float(detail.forecasted_quantity)
-                error = float(actual) - forecasted_qty
-                accuracy = 100 - (abs(error) / (forecasted_qty + 0.001)) * 100
-
-                comparison.append(
-                    {
-                        "date": detail.forecast_for_date.date().isoformat(),
-                        "forecasted": forecasted_qty,
-                        "actual": actual,
-                        "error": error,
-                        "accuracy_percent": max(0.0, float(accuracy)),
-                    }
+            comparison: list[dict[str, Any]] = [
+                {
+                    "date": day.isoformat(),
+                    "forecasted": day_forecasted,
+                    "actual": day_actual,
+                    "error": day_error,
+                    "accuracy_percent": day_accuracy,
+                }
+                for day, day_forecasted, day_actual, day_error, day_accuracy in zip(
+                    detail_days,
+                    forecasted.tolist(),
+                    actual.tolist(),
+                    error.tolist(),
+                    accuracy.tolist(),
                 )
+            ]
 
             # Calculate average accuracy
-            avg_acc = 0.0
-            if comparison:
-                avg_acc = sum(c["accuracy_percent"] for c in comparison) / len(
-                    comparison
-                )
+            avg_acc = float(accuracy.mean()) if comparison else 0.0
 
             return {
                 "product_id": product_id,
@@ -3,37 +3,38 @@ Email service for sending 2FA codes and notifications
 Uses Python's built-in smtplib (open-source)
 """
 
+import asyncio
 import logging
-import random
+import queue
+import secrets
 import smtplib
 import ssl
-import string
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from typing import Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from email import policy
+from email.message import EmailMessage, Message
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Idle authenticated connections kept per SMTP server
+SMTP_POOL_SIZE = 4
 
-class EmailService:
-    """Service for sending emails using SMTP (open-source)"""
+# Shared by every SMTP connection so the CA bundle is loaded once
+_SSL_CONTEXT = ssl.create_default_context()
 
-    @staticmethod
-    def _get_settings():
-        """Lazy load settings to avoid circular imports"""
-        from app.core.config import settings
+# Threads sending queued emails off the request path
+EMAIL_SEND_WORKERS = 4
 
-        return settings
+# Queued emails still waiting are dropped after this many failures in a row,
+# until the queue drains
+EMAIL_MAX_CONSECUTIVE_FAILURES = 3
 
-    @staticmethod
-    def generate_email_code(length: int = 6) -> str:
-        """Generate a random email 2FA code"""
-        return "".join(random.choices(string.digits, k=length))
 
-    @staticmethod
-    def _create_2fa_email_html(code: str, name: str) -> str:
-        """Create HTML email template for 2FA code"""
-        return f"""
+# Email bodies, filled in with str.format_map per send
+_TEMPLATE_2FA = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -67,6 +68,386 @@ class EmailService:
         </html>
         """
 
+_TEMPLATE_LOGIN = """
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <style>
+                    body {{ font-family: Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }}
+                    .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 8px; padding: 30px; }}
+                    .alert {{ background: #FEF3C7; border-left: 4px solid #F59E0B; padding: 15px; margin: 20px 0; }}
+                    .details {{ background: #F3F4F6; padding: 15px; border-radius: 4px; margin: 15px 0; }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <h2>🔐 New Login to Your Account</h2>
+                    <div class="alert">
+                        <strong>A new login was detected on your account.</strong>
+                    </div>
+                    <div class="details">
+                        <p><strong>IP Address:</strong> {ip}</p>
+                        <p><strong>Device:</strong> {device}</p>
+                        <p><strong>Time:</strong> Just now</p>
+                    </div>
+                    <p>If this wasn't you, please change your password immediately.</p>
+                </div>
+            </body>
+            </html>
+            """
+
+# No placeholders, so sent as is
+_TEMPLATE_2FA_DISABLED = """
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <style>
+                    body { font-family: Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }
+                    .container { max-width: 600px; margin: 0 auto; background: white; border-radius: 8px; padding: 30px; }
+                    .warning { background: #FEE2E2; border-left: 4px solid #EF4444; padding: 15px; margin: 20px 0; }
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <h2>⚠️ Two-Factor Authentication Disabled</h2>
+                    <div class="warning">
+                        <strong>2FA has been disabled on your Vendly POS account.</strong>
+                    </div>
+                    <p>If you didn't make this change, please contact your administrator immediately.</p>
+                    <p>We recommend keeping 2FA enabled for enhanced security.</p>
+                </div>
+            </body>
+            </html>
+            """
+
+# CRLF line endings for SMTP, and bodies encoded so servers without
+# 8BITMIME accept them
+_EMAIL_POLICY = policy.SMTP.clone(cte_type="7bit")
+
+
+def _new_message(sender: str, to: str, subject: str) -> EmailMessage:
+    """Create an email with its headers set and no body yet"""
+    msg = EmailMessage(policy=_EMAIL_POLICY)
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = to
+    msg["MIME-Version"] = "1.0"
+    return msg
+
+
+def _html_part(html: str) -> EmailMessage:
+    """Encode an HTML body as a standalone part"""
+    part = EmailMessage(policy=_EMAIL_POLICY)
+    part.set_content(html, subtype="html")
+    # EmailMessage adds this for a top-level message; it is only a subpart
+    del part["MIME-Version"]
+    return part
+
+
+# Encoded once; sends only read the part when the message is flattened
+_HTML_PART_2FA_DISABLED = _html_part(_TEMPLATE_2FA_DISABLED)
+
+
+class _PooledConnection:
+    """An SMTP connection, with its message count and when it was opened"""
+
+    __slots__ = ("server", "sent", "opened_at")
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.opened_at = time.monotonic()
+
+
+class _SMTPConnectionPool:
+    """Authenticated SMTP connections to one server, reused across sends"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_tls: bool,
+        user: str,
+        password: str,
+        max_messages: int = 100,
+        max_age: float = 1800,
+        size: int = SMTP_POOL_SIZE,
+    ):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.user = user
+        self.password = password
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self._idle: queue.Queue = queue.Queue(maxsize=size)
+        self._closed = False
+
+    def _connect(self) -> smtplib.SMTP:
+        """Open and authenticate a new connection"""
+        context = _SSL_CONTEXT
+        if self.use_tls:
+            server = smtplib.SMTP(self.host, self.port)
+        else:
+            # Use SSL directly (port 465)
+            server = smtplib.SMTP_SSL(self.host, self.port, context=context)
+        try:
+            if self.use_tls:
+                # Use STARTTLS
+                server.starttls(context=context)
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except BaseException:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        """Quit a connection, dropping it if the server already went away"""
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    @contextmanager
+    def acquire(self) -> Iterator[_PooledConnection]:
+        """
+        Borrow a healthy connection, returning it to the pool afterwards.
+
+        Idle connections are checked with NOOP and replaced if the server
+        dropped them. A connection that fails while borrowed is discarded.
+        """
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+            if conn.server.noop()[0] != 250:
+                raise smtplib.SMTPServerDisconnected("NOOP failed")
+        except queue.Empty:
+            pass
+        except (smtplib.SMTPException, OSError):
+            if conn is not None:
+                self._close(conn.server)
+            conn = None
+
+        if conn is None:
+            conn = _PooledConnection(self._connect())
+
+        try:
+            yield conn
+        except BaseException:
+            self._close(conn.server)
+            raise
+        self.release(conn)
+
+    def _used_up(self, conn: _PooledConnection) -> bool:
+        """Whether a connection has hit its message quota or maximum age"""
+        return (
+            conn.sent >= self.max_messages
+            or time.monotonic() - conn.opened_at >= self.max_age
+        )
+
+    def release(self, conn: _PooledConnection) -> None:
+        """Return a connection to the pool, or quit it if it is used up"""
+        if self._closed or self._used_up(conn):
+            self._close(conn.server)
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._close(conn.server)
+
+    def send_message(self, msg: Message) -> None:
+        """Send a message over a pooled connection"""
+        with self.acquire() as conn:
+            conn.server.send_message(msg)
+            conn.sent += 1
+
+    def send_many(self, messages: Sequence[Message]) -> int:
+        """
+        Send messages back to back, borrowing a connection once per run
+        rather than once per message. Stops at the first failure.
+
+        Returns the number of messages sent.
+        """
+        sent = 0
+        try:
+            while sent < len(messages):
+                with self.acquire() as conn:
+                    while sent < len(messages) and not self._used_up(conn):
+                        conn.server.send_message(messages[sent])
+                        conn.sent += 1
+                        sent += 1
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f"SMTP batch stopped after {sent}/{len(messages)}: {e}")
+        return sent
+
+    def shutdown(self) -> None:
+        """Quit every idle connection; connections in use quit on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn.server)
+
+
+class _BackgroundSender:
+    """Worker threads that send queued emails off the request path"""
+
+    def __init__(self, workers: int = EMAIL_SEND_WORKERS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="email"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._failures = 0
+
+    def submit(self, send: Callable[..., bool], *args) -> "Future[bool]":
+        """Queue a send, returning a future for its result"""
+        with self._lock:
+            self._pending += 1
+        return self._executor.submit(self._run, send, args)
+
+    def _run(self, send: Callable[..., bool], args: tuple) -> bool:
+        try:
+            with self._lock:
+                aborted = self._failures >= EMAIL_MAX_CONSECUTIVE_FAILURES
+            if aborted:
+                logger.warning("📧 Skipping queued email after repeated failures")
+                return False
+
+            sent = send(*args)
+            with self._lock:
+                self._failures = 0 if sent else self._failures + 1
+            return sent
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if not self._pending:
+                    # Burst is over; give the next one a clean slate
+                    self._failures = 0
+
+    def shutdown(self) -> None:
+        """Wait for queued emails to finish sending"""
+        self._executor.shutdown(wait=True)
+
+
+_pools: Dict[Tuple[str, int, bool, str], _SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+_sender: Optional[_BackgroundSender] = None
+_sender_lock = threading.Lock()
+
+
+class EmailService:
+    """Service for sending emails using SMTP (open-source)"""
+
+    @staticmethod
+    def _get_settings():
+        """Lazy load settings to avoid circular imports"""
+        from app.core.config import settings
+
+        return settings
+
+    @staticmethod
+    def _get_pool(settings) -> _SMTPConnectionPool:
+        """Get the connection pool for the configured SMTP server"""
+        key = (
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            settings.SMTP_TLS,
+            settings.SMTP_USER,
+        )
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _SMTPConnectionPool(
+                    settings.SMTP_HOST,
+                    settings.SMTP_PORT,
+                    settings.SMTP_TLS,
+                    settings.SMTP_USER,
+                    settings.SMTP_PASSWORD,
+                    max_messages=settings.SMTP_MAX_MSGS_PER_CONN,
+                    max_age=settings.SMTP_MAX_CONN_AGE,
+                )
+                _pools[key] = pool
+            return pool
+
+    @staticmethod
+    def _submit(send: Callable[..., bool], *args) -> "Future[bool]":
+        """Queue a send on the background workers"""
+        global _sender
+        with _sender_lock:
+            if _sender is None:
+                _sender = _BackgroundSender()
+            return _sender.submit(send, *args)
+
+    @staticmethod
+    def enqueue_custom_email(
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+    ) -> "Future[bool]":
+        """Queue a custom email; the future resolves once it is sent"""
+        return EmailService._submit(
+            EmailService.send_custom_email,
+            to_email,
+            subject,
+            html_content,
+            text_content,
+        )
+
+    @staticmethod
+    def enqueue_login_notification(
+        email: str, ip: str, device: str = "Unknown"
+    ) -> "Future[bool]":
+        """Queue a login notification email"""
+        return EmailService._submit(
+            EmailService.send_login_notification, email, ip, device
+        )
+
+    @staticmethod
+    def enqueue_2fa_disabled_notification(email: str) -> "Future[bool]":
+        """Queue a 2FA disabled notification email"""
+        return EmailService._submit(EmailService.send_2fa_disabled_notification, email)
+
+    @staticmethod
+    async def send_2fa_code_async(
+        email: str, code: str, name: str = "Vendly POS"
+    ) -> bool:
+        """Send a 2FA code on the background workers without blocking the loop"""
+        return await asyncio.wrap_future(
+            EmailService._submit(EmailService.send_2fa_code, email, code, name)
+        )
+
+    @staticmethod
+    def shutdown() -> None:
+        """Finish queued emails and close all pooled SMTP connections"""
+        global _sender
+        with _sender_lock:
+            sender, _sender = _sender, None
+        if sender is not None:
+            sender.shutdown()
+
+        with _pools_lock:
+            pools = list(_pools.values())
+            _pools.clear()
+        for pool in pools:
+            pool.shutdown()
+
+    @staticmethod
+    def generate_email_code(length: int = 6) -> str:
+        """Generate a random email 2FA code"""
+        return f"{secrets.randbelow(10**length):0{length}d}"
+
+    @staticmethod
+    def _create_2fa_email_html(code: str, name: str) -> str:
+        """Create HTML email template for 2FA code"""
+        return _TEMPLATE_2FA.format_map({"code": code, "name": name})
+
     @staticmethod
     def send_2fa_code(email: str, code: str, name: str = "Vendly POS") -> bool:
         """
@@ -89,10 +470,9 @@ class EmailService:
 
         try:
             # Create message
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = f"{name} - Your Verification Code"
-            msg["From"] = settings.SMTP_FROM
-            msg["To"] = email
+            msg = _new_message(
+                settings.SMTP_FROM, email, f"{name} - Your Verification Code"
+            )
 
             # Plain text version
             text_content = f"""
@@ -106,27 +486,11 @@ class EmailService:
             html_content = EmailService._create_2fa_email_html(code, name)
 
             # Attach both versions
-            msg.attach(MIMEText(text_content, "plain"))
-            msg.attach(MIMEText(html_content, "html"))
+            msg.set_content(text_content)
+            msg.add_alternative(html_content, subtype="html")
 
-            # Send email
-            if settings.SMTP_TLS:
-                # Use STARTTLS
-                context = ssl.create_default_context()
-                with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                    server.starttls(context=context)
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
-            else:
-                # Use SSL directly (port 465)
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(
-                    settings.SMTP_HOST, settings.SMTP_PORT, context=context
-                ) as server:
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
+            # Send email over a pooled connection
+            EmailService._get_pool(settings).send_message(msg)
 
             logger.info(f"📧 2FA code sent successfully to {email}")
             return True
@@ -163,56 +527,15 @@ class EmailService:
             return True
 
         try:
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = "Vendly POS - New Login Detected"
-            msg["From"] = settings.SMTP_FROM
-            msg["To"] = email
+            msg = _new_message(
+                settings.SMTP_FROM, email, "Vendly POS - New Login Detected"
+            )
 
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }}
-                    .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 8px; padding: 30px; }}
-                    .alert {{ background: #FEF3C7; border-left: 4px solid #F59E0B; padding: 15px; margin: 20px 0; }}
-                    .details {{ background: #F3F4F6; padding: 15px; border-radius: 4px; margin: 15px 0; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h2>🔐 New Login to Your Account</h2>
-                    <div class="alert">
-                        <strong>A new login was detected on your account.</strong>
-                    </div>
-                    <div class="details">
-                        <p><strong>IP Address:</strong> {ip}</p>
-                        <p><strong>Device:</strong> {device}</p>
-                        <p><strong>Time:</strong> Just now</p>
-                    </div>
-                    <p>If this wasn't you, please change your password immediately.</p>
-                </div>
-            </body>
-            </html>
-            """
+            html_content = _TEMPLATE_LOGIN.format_map({"ip": ip, "device": device})
 
-            msg.attach(MIMEText(html_content, "html"))
+            msg.set_content(html_content, subtype="html")
 
-            if settings.SMTP_TLS:
-                context = ssl.create_default_context()
-                with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                    server.starttls(context=context)
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
-            else:
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(
-                    settings.SMTP_HOST, settings.SMTP_PORT, context=context
-                ) as server:
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
+            EmailService._get_pool(settings).send_message(msg)
 
             logger.info(f"📧 Login notification sent to {email}")
             return True
@@ -231,51 +554,16 @@ class EmailService:
             return True
 
         try:
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = "Vendly POS - Two-Factor Authentication Disabled"
-            msg["From"] = settings.SMTP_FROM
-            msg["To"] = email
+            msg = _new_message(
+                settings.SMTP_FROM,
+                email,
+                "Vendly POS - Two-Factor Authentication Disabled",
+            )
 
-            html_content = """
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body { font-family: Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 20px; }
-                    .container { max-width: 600px; margin: 0 auto; background: white; border-radius: 8px; padding: 30px; }
-                    .warning { background: #FEE2E2; border-left: 4px solid #EF4444; padding: 15px; margin: 20px 0; }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h2>⚠️ Two-Factor Authentication Disabled</h2>
-                    <div class="warning">
-                        <strong>2FA has been disabled on your Vendly POS account.</strong>
-                    </div>
-                    <p>If you didn't make this change, please contact your administrator immediately.</p>
-                    <p>We recommend keeping 2FA enabled for enhanced security.</p>
-                </div>
-            </body>
-            </html>
-            """
+            msg.make_alternative()
+            msg.attach(_HTML_PART_2FA_DISABLED)
 
-            msg.attach(MIMEText(html_content, "html"))
-
-            if settings.SMTP_TLS:
-                context = ssl.create_default_context()
-                with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                    server.starttls(context=context)
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
-            else:
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(
-                    settings.SMTP_HOST, settings.SMTP_PORT, context=context
-                ) as server:
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
+            EmailService._get_pool(settings).send_message(msg)
 
             logger.info(f"📧 2FA disabled notification sent to {email}")
             return True
@@ -310,30 +598,15 @@ class EmailService:
             return True
 
         try:
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = subject
-            msg["From"] = settings.SMTP_FROM
-            msg["To"] = to_email
+            msg = _new_message(settings.SMTP_FROM, to_email, subject)
 
             if text_content:
-                msg.attach(MIMEText(text_content, "plain"))
-            msg.attach(MIMEText(html_content, "html"))
-
-            if settings.SMTP_TLS:
-                context = ssl.create_default_context()
-                with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                    server.starttls(context=context)
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
+                msg.set_content(text_content)
+                msg.add_alternative(html_content, subtype="html")
             else:
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(
-                    settings.SMTP_HOST, settings.SMTP_PORT, context=context
-                ) as server:
-                    if settings.SMTP_USER and settings.SMTP_PASSWORD:
-                        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-                    server.send_message(msg)
+                msg.set_content(html_content, subtype="html")
+
+            EmailService._get_pool(settings).send_message(msg)
 
             logger.info(f"📧 Custom email sent to {to_email}")
             return True
@@ -341,3 +614,45 @@ class EmailService:
         except Exception as e:
             logger.error(f"Failed to send custom email to {to_email}: {e}")
             return False
+
+    @staticmethod
+    def send_bulk_email(
+        to_emails: List[str],
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None,
+    ) -> int:
+        """
+        Send the same email to several recipients, one message each,
+        over as few pooled connections as possible
+
+        Args:
+            to_emails: Recipient emails
+            subject: Email subject
+            html_content: HTML body
+            text_content: Plain text body (optional)
+
+        Returns:
+            Number of emails sent
+        """
+        settings = EmailService._get_settings()
+
+        if not settings.SMTP_ENABLED:
+            logger.info(
+                f"📧 [DEV MODE] Bulk email to {len(to_emails)} recipients: {subject}"
+            )
+            return len(to_emails)
+
+        messages = []
+        for to_email in to_emails:
+            msg = _new_message(settings.SMTP_FROM, to_email, subject)
+            if text_content:
+                msg.set_content(text_content)
+                msg.add_alternative(html_content, subtype="html")
+            else:
+                msg.set_content(html_content, subtype="html")
+            messages.append(msg)
+
+        sent = EmailService._get_pool(settings).send_many(messages)
+        logger.info(f"📧 Bulk email sent to {sent}/{len(to_emails)} recipients")
+        return sent
@@ -3,28 +3,41 @@ Sales Forecasting Service (Moving Average Example)
 """
 
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Tuple
 
-import pandas as pd
+import numpy as np
 
 # Dummy function to simulate sales history retrieval from DB
 # Replace with real DB query in production
 
 
-def get_sales_history(product_id: int, days: int = 60):
-    today = datetime.today()
-    dates = [today - timedelta(days=i) for i in range(days)]
-    sales = [100 + (i % 7) * 5 for i in range(days)]  # Simulate weekly seasonality
-    df = pd.DataFrame({"date": dates, "sales": sales})
-    df = df.sort_values("date")
-    return df
+def get_sales_history(product_id: int, days: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Daily (dates, sales) arrays, oldest first"""
+    today = np.datetime64(datetime.today(), "us")
+    days_back = np.arange(days - 1, -1, -1)
+    dates = today - days_back * np.timedelta64(1, "D")
+    sales = 100 + (days_back % 7) * 5  # Simulate weekly seasonality
+    return dates, sales
+
+
+def trailing_mean(sales: np.ndarray, window: int) -> np.ndarray:
+    """
+    Mean of the last `window` days of sales.
+
+    Takes one product's 1-D history or a (products, days) matrix and
+    averages every product in a single pass.
+    """
+    return sales[..., -window:].mean(axis=-1)
 
 
 def moving_average_forecast(product_id: int, forecast_days: int = 7, window: int = 7):
-    df = get_sales_history(product_id, days=60)
-    # Use rolling mean as forecast
-    avg = df["sales"].rolling(window=window).mean().iloc[-1]
-    today = df["date"].iloc[-1]
-    forecast_dates = [today + timedelta(days=i) for i in range(1, forecast_days + 1)]
-    forecast_sales = [float(avg)] * forecast_days
-    return [d.strftime("%Y-%m-%d") for d in forecast_dates], forecast_sales
+    dates, sales = get_sales_history(product_id, days=60)
+    # Use the mean of the trailing window as forecast
+    avg = float(trailing_mean(sales, window))
+    today = dates[-1].astype(datetime)
+    forecast_dates = [
+        (today + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range(1, forecast_days + 1)
+    ]
+    forecast_sales = [avg] * forecast_days
+    return forecast_dates, forecast_sales
@@ -4,21 +4,72 @@ Vendly POS - Health Check Service
 Comprehensive health monitoring for all services
 """
 
+import asyncio
+import functools
 import logging
+import threading
+import time
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 
 import redis
-from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.redis_client import get_token_store
-from app.db.session import SessionLocal, engine
+from app.db.session import engine
+
+try:
+    from kafka import KafkaProducer
+    from kafka.errors import KafkaError
+except ImportError:
+    KafkaProducer = None
+    KafkaError = None
 
 logger = logging.getLogger(__name__)
 
+# Seconds a single dependency check may take before it is reported unhealthy
+HEALTH_CHECK_TIMEOUT = 2.0
+
+# Seconds each service's result is reused; probes poll every few seconds
+HEALTH_CACHE_TTLS = {"API": 10.0, "Database": 1.0, "Redis": 1.0, "Kafka": 5.0}
+
+
+# One producer per process, shared by every Kafka probe
+_kafka_producer = None
+_kafka_producer_lock = threading.Lock()
+
+
+def _get_kafka_producer():
+    """Create the shared probe producer on first use"""
+    global _kafka_producer
+    with _kafka_producer_lock:
+        if _kafka_producer is None:
+            _kafka_producer = KafkaProducer(
+                bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(","),
+                request_timeout_ms=5000,
+            )
+        return _kafka_producer
+
+
+def _reset_kafka_producer() -> None:
+    """Drop the shared producer so the next probe reconnects"""
+    global _kafka_producer
+    with _kafka_producer_lock:
+        producer, _kafka_producer = _kafka_producer, None
+    if producer is not None:
+        try:
+            producer.close(timeout=1)
+        except Exception:
+            pass
+
+
+def _select_one():
+    """Run SELECT 1 on a pooled connection, bypassing the ORM session"""
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT 1").scalar()
+
 
 class HealthStatus(str, Enum):
     """Health status enumeration"""
@@ -58,39 +109,59 @@ class ServiceHealth:
         }
 
 
+# Latest result per service, with the monotonic time it was taken
+_health_cache: Dict[str, Tuple[float, ServiceHealth]] = {}
+
+
+def _cached_check(name: str):
+    """Reuse a check's result for its service's TTL"""
+
+    def decorator(check: Callable[[], Awaitable[ServiceHealth]]):
+        @functools.wraps(check)
+        async def wrapper() -> ServiceHealth:
+            cached = _health_cache.get(name)
+            if cached and time.monotonic() - cached[0] < HEALTH_CACHE_TTLS[name]:
+                return cached[1]
+            health = await check()
+            _health_cache[name] = (time.monotonic(), health)
+            return health
+
+        return wrapper
+
+    return decorator
+
+
 class HealthCheckService:
     """Service for performing comprehensive health checks"""
 
     @staticmethod
+    @_cached_check("Database")
     async def check_database() -> ServiceHealth:
         """Check database connectivity and performance"""
-        import time
-
         name = "Database"
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
 
         try:
-            with SessionLocal() as session:
-                # Test basic connectivity
-                result = session.execute(text("SELECT 1")).scalar()
-                response_time = (time.time() - start_time) * 1000
-
-                if result == 1:
-                    return ServiceHealth(
-                        name=name,
-                        status=HealthStatus.HEALTHY,
-                        message="Database connection successful",
-                        response_time_ms=response_time,
-                    )
-                else:
-                    return ServiceHealth(
-                        name=name,
-                        status=HealthStatus.UNHEALTHY,
-                        message="Database returned unexpected result",
-                        response_time_ms=response_time,
-                    )
+            # Test basic connectivity off the event loop
+            result = await asyncio.to_thread(_select_one)
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
+
+            if result == 1:
+                return ServiceHealth(
+                    name=name,
+                    status=HealthStatus.HEALTHY,
+                    message="Database connection successful",
+                    response_time_ms=response_time,
+                )
+            else:
+                return ServiceHealth(
+                    name=name,
+                    status=HealthStatus.UNHEALTHY,
+                    message="Database returned unexpected result",
+                    response_time_ms=response_time,
+                )
         except Exception as e:
-            response_time = (time.time() - start_time) * 1000
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
             logger.error(f"Database health check failed: {e}")
             return ServiceHealth(
                 name=name,
@@ -100,12 +171,11 @@ class HealthCheckService:
             )
 
     @staticmethod
+    @_cached_check("Redis")
     async def check_redis() -> ServiceHealth:
         """Check Redis connectivity"""
-        import time
-
         name = "Redis"
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
 
         try:
             # Try to use Redis via the token store
@@ -115,16 +185,16 @@ class HealthCheckService:
                     name=name,
                     status=HealthStatus.DEGRADED,
                     message="Redis not available, using in-memory fallback",
-                    response_time_ms=(time.time() - start_time) * 1000,
+                    response_time_ms=(time.perf_counter_ns() - start_ns) / 1e6,
                 )
 
             # Try to ping Redis
-            pong = token_store._client.ping()
-            response_time = (time.time() - start_time) * 1000
+            pong = await asyncio.to_thread(token_store._client.ping)
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
 
             if pong:
                 # Get Redis info
-                info = token_store._client.info()
+                info = await asyncio.to_thread(token_store._client.info)
                 return ServiceHealth(
                     name=name,
                     status=HealthStatus.HEALTHY,
@@ -144,7 +214,7 @@ class HealthCheckService:
                     response_time_ms=response_time,
                 )
         except redis.ConnectionError:
-            response_time = (time.time() - start_time) * 1000
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ServiceHealth(
                 name=name,
                 status=HealthStatus.UNHEALTHY,
@@ -152,7 +222,7 @@ class HealthCheckService:
                 response_time_ms=response_time,
             )
         except Exception as e:
-            response_time = (time.time() - start_time) * 1000
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
             logger.error(f"Redis health check failed: {e}")
             return ServiceHealth(
                 name=name,
@@ -162,15 +232,14 @@ class HealthCheckService:
             )
 
     @staticmethod
+    @_cached_check("Kafka")
     async def check_kafka() -> ServiceHealth:
         """Check Kafka connectivity"""
-        import time
-
         name = "Kafka"
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
 
         if not settings.KAFKA_ENABLED:
-            response_time = (time.time() - start_time) * 1000
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
             return ServiceHealth(
                 name=name,
                 status=HealthStatus.DEGRADED,
@@ -178,41 +247,44 @@ class HealthCheckService:
                 response_time_ms=response_time,
             )
 
-        try:
-            from kafka import KafkaProducer
-            from kafka.errors import KafkaError
+        if KafkaProducer is None:
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
+            return ServiceHealth(
+                name=name,
+                status=HealthStatus.DEGRADED,
+                message="Kafka module not available",
+                response_time_ms=response_time,
+            )
 
-            try:
-                producer = KafkaProducer(
-                    bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS.split(","),
-                    request_timeout_ms=5000,
-                )
-                producer.close()
-                response_time = (time.time() - start_time) * 1000
+        try:
+            # The producer bootstraps synchronously; keep it off the loop
+            producer = await asyncio.to_thread(_get_kafka_producer)
+            connected = await asyncio.to_thread(producer.bootstrap_connected)
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
+            if connected:
                 return ServiceHealth(
                     name=name,
                     status=HealthStatus.HEALTHY,
                     message="Kafka connection successful",
                     response_time_ms=response_time,
                 )
-            except KafkaError as e:
-                response_time = (time.time() - start_time) * 1000
-                return ServiceHealth(
-                    name=name,
-                    status=HealthStatus.UNHEALTHY,
-                    message=f"Kafka connection failed: {str(e)}",
-                    response_time_ms=response_time,
-                )
-        except ImportError:
-            response_time = (time.time() - start_time) * 1000
             return ServiceHealth(
                 name=name,
-                status=HealthStatus.DEGRADED,
-                message="Kafka module not available",
+                status=HealthStatus.UNHEALTHY,
+                message="Kafka bootstrap server not connected",
+                response_time_ms=response_time,
+            )
+        except KafkaError as e:
+            await asyncio.to_thread(_reset_kafka_producer)
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
+            return ServiceHealth(
+                name=name,
+                status=HealthStatus.UNHEALTHY,
+                message=f"Kafka connection failed: {str(e)}",
                 response_time_ms=response_time,
             )
         except Exception as e:
-            response_time = (time.time() - start_time) * 1000
+            response_time = (time.perf_counter_ns() - start_ns) / 1e6
             logger.error(f"Kafka health check failed: {e}")
             return ServiceHealth(
                 name=name,
@@ -222,6 +294,7 @@ class HealthCheckService:
             )
 
     @staticmethod
+    @_cached_check("API")
     async def check_api() -> ServiceHealth:
         """Check API health"""
         name = "API"
@@ -235,20 +308,36 @@ class HealthCheckService:
             },
         )
 
+    @staticmethod
+    async def _run_check(
+        name: str, check: Callable[[], Awaitable[ServiceHealth]]
+    ) -> ServiceHealth:
+        """Run a check, reporting it unhealthy if it hangs"""
+        try:
+            return await asyncio.wait_for(check(), timeout=HEALTH_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"{name} health check timed out")
+            return ServiceHealth(
+                name=name,
+                status=HealthStatus.UNHEALTHY,
+                message=f"{name} health check timed out",
+                response_time_ms=HEALTH_CHECK_TIMEOUT * 1000,
+            )
+
     @staticmethod
     async def get_all_health_checks() -> Dict:
         """Perform all health checks and return results"""
-        import time
-
-        start_time = time.time()
-
-        # Run checks
-        api_health = await HealthCheckService.check_api()
-        db_health = await HealthCheckService.check_database()
-        redis_health = await HealthCheckService.check_redis()
-        kafka_health = await HealthCheckService.check_kafka()
-
-        checks = [api_health, db_health, redis_health, kafka_health]
+        start_ns = time.perf_counter_ns()
+
+        # Run checks concurrently; total time is the slowest check
+        checks = await asyncio.gather(
+            HealthCheckService._run_check("API", HealthCheckService.check_api),
+            HealthCheckService._run_check(
+                "Database", HealthCheckService.check_database
+            ),
+            HealthCheckService._run_check("Redis", HealthCheckService.check_redis),
+            HealthCheckService._run_check("Kafka", HealthCheckService.check_kafka),
+        )
 
         # Determine overall health
         statuses = [c.status for c in checks]
@@ -259,7 +348,7 @@ class HealthCheckService:
         else:
             overall_status = HealthStatus.HEALTHY
 
-        total_time = (time.time() - start_time) * 1000
+        total_time = (time.perf_counter_ns() - start_ns) / 1e6
 
         return {
             "status": overall_status.value,
@@ -8,8 +8,7 @@ import hashlib
 import hmac
 import json
 import logging
-import random
-import string
+import secrets
 import urllib.parse
 import urllib.request
 from typing import Any, Dict, Literal, Optional
@@ -32,7 +31,7 @@ class SMSService:
     @staticmethod
     def generate_sms_code(length: int = 6) -> str:
         """Generate a random SMS 2FA code"""
-        return "".join(random.choices(string.digits, k=length))
+        return f"{secrets.randbelow(10**length):0{length}d}"
 
     @staticmethod
     def _send_via_twilio(phone: str, message: str) -> bool:
@@ -24,6 +24,8 @@ from app.core.deps import get_current_user, get_db, require_permission
 from app.core.security import hash_password
 from app.db.models import Base, User
 from app.main import app
+from app.services.audit import flush_suppressed_events
+from app.services.auth import invalidate_user_cache
 
 # Use in-memory SQLite for tests
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -88,10 +90,18 @@ def override_require_permission(permission):
     return check_permission
 
 
+@pytest.fixture(scope="session", autouse=True)
+def flush_audit_rollups():
+    """Log pending audit roll-ups while pytest's captured streams are open"""
+    yield
+    flush_suppressed_events()
+
+
 @pytest.fixture(scope="function", autouse=True)
 def setup_database():
     """Set up fresh database for each test"""
     Base.metadata.create_all(bind=engine)
+    invalidate_user_cache()
 
     # Create admin user
     db = TestingSessionLocal()
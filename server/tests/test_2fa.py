@@ -2,9 +2,23 @@
 # Vendly POS - Two-Factor Authentication Tests
 # ===========================================
 
+import asyncio
+import smtplib
+import threading
+from email.message import EmailMessage
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
 import pytest
 from fastapi.testclient import TestClient
 
+from app.services.email_service import (
+    _SSL_CONTEXT,
+    EMAIL_MAX_CONSECUTIVE_FAILURES,
+    EmailService,
+    _BackgroundSender,
+)
+from app.services.sms_service import SMSService
 from app.services.two_factor_auth import TwoFactorAuthService
 
 
@@ -380,3 +394,201 @@ class Test2FAEdgeCases:
         # Check status - should show 0 remaining codes
         auth_headers = {"Authorization": "Bearer test-token"}  # Mock auth
         # Note: This would need proper auth setup in real scenario
+
+
+class Test2FACodes:
+    """Test email and SMS code generation"""
+
+    def test_codes_are_zero_padded_digits(self):
+        """Codes always have the requested number of digits"""
+        for generate in (
+            EmailService.generate_email_code,
+            SMSService.generate_sms_code,
+        ):
+            code = generate()
+            assert len(code) == 6 and code.isdigit()
+            assert len(generate(8)) == 8
+
+            with patch("secrets.randbelow", return_value=42) as randbelow:
+                assert generate() == "000042"
+            randbelow.assert_called_once_with(10**6)
+
+    def test_2fa_email_html_fills_placeholders(self):
+        """The cached 2FA template gets the code and name substituted"""
+        html = EmailService._create_2fa_email_html("042137", "Corner Shop")
+        assert '<div class="code">042137</div>' in html
+        assert "© 2025 Corner Shop" in html
+        assert "{{" not in html and "{code}" not in html
+
+
+class TestEmailConnectionPool:
+    """Test SMTP connection reuse across email sends"""
+
+    @pytest.fixture
+    def smtp_settings(self):
+        settings = SimpleNamespace(
+            SMTP_ENABLED=True,
+            SMTP_HOST="smtp.test",
+            SMTP_PORT=587,
+            SMTP_TLS=True,
+            SMTP_USER="user",
+            SMTP_PASSWORD="secret",
+            SMTP_FROM="noreply@vendly.com",
+            SMTP_MAX_MSGS_PER_CONN=100,
+            SMTP_MAX_CONN_AGE=1800,
+        )
+        with patch.object(EmailService, "_get_settings", return_value=settings):
+            yield settings
+        EmailService.shutdown()
+
+    def test_sends_reuse_one_connection(self, smtp_settings):
+        """Consecutive sends log in once and share the connection"""
+        with patch("smtplib.SMTP") as smtp:
+            server = smtp.return_value
+            server.noop.return_value = (250, b"OK")
+
+            assert EmailService.send_2fa_code("a@vendly.com", "123456")
+            assert EmailService.send_login_notification("a@vendly.com", "1.2.3.4")
+            assert EmailService.send_custom_email("b@vendly.com", "Hi", "<p>Hi</p>")
+
+            smtp.assert_called_once_with("smtp.test", 587)
+            server.starttls.assert_called_once_with(context=_SSL_CONTEXT)
+            server.login.assert_called_once_with("user", "secret")
+            assert server.send_message.call_count == 3
+            code_email = server.send_message.call_args_list[0].args[0]
+            assert isinstance(code_email, EmailMessage)
+            assert code_email.get_content_type() == "multipart/alternative"
+            assert (
+                code_email.get_body(("plain",))
+                .get_content()
+                .strip()
+                .endswith("please ignore this email.")
+            )
+
+            EmailService.shutdown()
+            server.quit.assert_called_once()
+
+    def test_dropped_connection_is_replaced(self, smtp_settings):
+        """A connection failing its health check is swapped for a new one"""
+        with patch("smtplib.SMTP") as smtp:
+            stale, fresh = MagicMock(), MagicMock()
+            stale.noop.side_effect = smtplib.SMTPServerDisconnected()
+            smtp.side_effect = [stale, fresh]
+
+            assert EmailService.send_2fa_disabled_notification("a@vendly.com")
+            assert EmailService.send_2fa_disabled_notification("a@vendly.com")
+
+            assert smtp.call_count == 2
+            stale.send_message.assert_called_once()
+            fresh.send_message.assert_called_once()
+
+    def test_2fa_disabled_html_encoded_once(self, smtp_settings):
+        """Every 2FA disabled notice reuses the prebuilt HTML part"""
+        with patch("smtplib.SMTP") as smtp:
+            server = smtp.return_value
+            server.noop.return_value = (250, b"OK")
+
+            assert EmailService.send_2fa_disabled_notification("a@vendly.com")
+            assert EmailService.send_2fa_disabled_notification("b@vendly.com")
+
+            first, second = (c.args[0] for c in server.send_message.call_args_list)
+            assert (first["To"], second["To"]) == ("a@vendly.com", "b@vendly.com")
+            assert first.get_payload(0) is second.get_payload(0)
+            html = second.get_payload(0).get_payload(decode=True).decode()
+            assert "Two-Factor Authentication Disabled" in html
+
+    def test_bulk_email_shares_connection_and_rotates(self, smtp_settings):
+        """A batch reuses one connection until its message quota is used"""
+        smtp_settings.SMTP_MAX_MSGS_PER_CONN = 2
+        with patch("smtplib.SMTP") as smtp:
+            first, second = MagicMock(), MagicMock()
+            smtp.side_effect = [first, second]
+            recipients = ["a@vendly.com", "b@vendly.com", "c@vendly.com"]
+
+            assert EmailService.send_bulk_email(recipients, "Sale", "<p/>") == 3
+
+            assert smtp.call_count == 2
+            assert first.send_message.call_count == 2
+            first.quit.assert_called_once()
+            sent_to = second.send_message.call_args.args[0]["To"]
+            assert sent_to == "c@vendly.com"
+            first.noop.assert_not_called()
+
+    def test_bulk_email_stops_at_failure(self, smtp_settings):
+        """A failed send ends the batch and reports how many went out"""
+        with patch("smtplib.SMTP") as smtp:
+            server = smtp.return_value
+            server.send_message.side_effect = [None, smtplib.SMTPDataError(554, b"")]
+            recipients = ["a@vendly.com", "b@vendly.com", "c@vendly.com"]
+
+            assert EmailService.send_bulk_email(recipients, "Sale", "<p/>") == 1
+            assert server.send_message.call_count == 2
+
+    def test_old_connection_rotated(self, smtp_settings):
+        """A connection past its maximum age is quit instead of reused"""
+        smtp_settings.SMTP_MAX_CONN_AGE = 60
+        with (
+            patch("smtplib.SMTP") as smtp,
+            patch("app.services.email_service.time.monotonic") as monotonic,
+        ):
+            first, second = MagicMock(), MagicMock()
+            first.noop.return_value = (250, b"OK")
+            smtp.side_effect = [first, second]
+
+            monotonic.return_value = 1000.0
+            assert EmailService.send_custom_email("a@vendly.com", "Hi", "<p/>")
+            assert EmailService.send_custom_email("b@vendly.com", "Hi", "<p/>")
+            monotonic.return_value = 1000.0 + 60
+            assert EmailService.send_custom_email("c@vendly.com", "Hi", "<p/>")
+            first.quit.assert_called_once()
+            assert EmailService.send_custom_email("d@vendly.com", "Hi", "<p/>")
+
+            assert smtp.call_count == 2
+            assert first.send_message.call_count == 3
+            assert second.send_message.call_count == 1
+
+
+class TestEmailBackgroundSender:
+    """Test queued email sends"""
+
+    def teardown_method(self):
+        EmailService.shutdown()
+
+    def test_enqueue_returns_before_send(self):
+        """Queued emails are sent on a worker thread"""
+        release = threading.Event()
+
+        def slow_send(*args):
+            release.wait(5)
+            return True
+
+        with patch.object(EmailService, "send_custom_email", side_effect=slow_send):
+            future = EmailService.enqueue_custom_email("a@vendly.com", "Hi", "<p/>")
+            assert not future.done()
+            release.set()
+            assert future.result(5) is True
+
+    def test_send_2fa_code_async(self):
+        """The async 2FA sender resolves with the send result"""
+        with patch.object(EmailService, "send_2fa_code", return_value=True) as send:
+            assert asyncio.run(
+                EmailService.send_2fa_code_async("a@vendly.com", "123456", "Jo")
+            )
+        send.assert_called_once_with("a@vendly.com", "123456", "Jo")
+
+    def test_burst_aborts_after_consecutive_failures(self):
+        """Remaining queued emails are skipped once sends keep failing"""
+        sender = _BackgroundSender(workers=1)
+        release = threading.Event()
+        failing = MagicMock(return_value=False)
+        try:
+            sender.submit(release.wait, 5)
+            futures = [sender.submit(failing) for _ in range(6)]
+            release.set()
+            assert [f.result(5) for f in futures] == [False] * 6
+            assert failing.call_count == EMAIL_MAX_CONSECUTIVE_FAILURES
+
+            # The next burst starts fresh
+            assert sender.submit(lambda: True).result(5) is True
+        finally:
+            sender.shutdown()
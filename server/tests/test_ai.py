@@ -2,9 +2,12 @@
 # Vendly POS - AI/ML Endpoints Tests
 # ===========================================
 
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 
+from app.services.forecast import trailing_mean
+
 
 class TestAIEndpoints:
     """Test cases for AI/ML API endpoints"""
@@ -54,6 +57,13 @@ class TestAIEndpoints:
         )
         assert response.status_code == 200
 
+    def test_trailing_mean_batches_products(self):
+        """Trailing means for many products match the single-product path"""
+        history = np.arange(30, dtype=np.float64).reshape(3, 10)
+        means = trailing_mean(history, 4)
+        assert means.tolist() == [7.5, 17.5, 27.5]
+        assert [trailing_mean(row, 4) for row in history] == means.tolist()
+
     # ===========================================
     # Anomaly Detection Tests
     # ===========================================
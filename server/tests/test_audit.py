@@ -0,0 +1,230 @@
+# ===========================================
+# Vendly POS - Audit Logging Tests
+# ===========================================
+
+import json
+import logging
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.services import audit
+from app.services.audit import (
+    AuditAction,
+    BufferedRotatingFileHandler,
+    flush_suppressed_events,
+    log_audit,
+)
+
+
+def _record(message: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord("vendly.audit", level, __file__, 0, message, None, None)
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return str(tmp_path / "audit.log")
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    """The file this process's handler writes"""
+    return str(tmp_path / f"audit.{os.getpid()}.log")
+
+
+@pytest.fixture
+def audit_log(caplog):
+    """Capture audit log messages, starting with an empty dedup window"""
+    audit._recent_events.clear()
+    audit._suppressed_counts.clear()
+    audit._suppressed_details.clear()
+    caplog.set_level(logging.INFO, logger="vendly.audit")
+    yield caplog
+    audit._recent_events.clear()
+    audit._suppressed_counts.clear()
+    audit._suppressed_details.clear()
+
+
+class TestBufferedRotatingFileHandler:
+    """Test the buffered audit log file handler"""
+
+    def test_records_on_disk_after_close(self, log_file, log_path):
+        """Buffered records are written out when the handler closes"""
+        handler = BufferedRotatingFileHandler(log_file, delay=True)
+        for i in range(3):
+            handler.handle(_record(f"event {i}"))
+        handler.close()
+
+        with open(log_path) as f:
+            assert f.read().splitlines() == ["event 0", "event 1", "event 2"]
+
+    def test_info_records_stay_buffered(self, log_file, log_path):
+        """Routine records are not written one syscall at a time"""
+        handler = BufferedRotatingFileHandler(log_file, delay=True)
+        try:
+            handler.handle(_record("routine event"))
+            assert os.path.getsize(log_path) == 0
+        finally:
+            handler.close()
+
+    def test_warning_records_flushed_immediately(self, log_file, log_path):
+        """Failures and security alerts reach disk without waiting"""
+        handler = BufferedRotatingFileHandler(log_file, delay=True)
+        try:
+            handler.handle(_record("routine event"))
+            handler.handle(_record("security alert", logging.WARNING))
+            with open(log_path) as f:
+                assert f.read().splitlines() == ["routine event", "security alert"]
+        finally:
+            handler.close()
+
+    def test_buffer_flushed_within_interval(self, log_file, log_path):
+        """A quiet log still reaches disk within flush_interval"""
+        handler = BufferedRotatingFileHandler(log_file, delay=True)
+        handler.flush_interval = 0.05
+        try:
+            handler.handle(_record("routine event"))
+            deadline = time.monotonic() + 2
+            while os.path.getsize(log_path) == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert os.path.getsize(log_path) > 0
+        finally:
+            handler.close()
+
+    def test_rotates_at_max_bytes(self, log_file, log_path):
+        """Files rotate before exceeding maxBytes"""
+        handler = BufferedRotatingFileHandler(
+            log_file, maxBytes=100, backupCount=3, delay=True
+        )
+        for i in range(10):
+            handler.handle(_record(f"event {i:02d} " + "x" * 20))
+        handler.close()
+
+        assert os.path.exists(f"{log_path}.1")
+        for path in (log_path, f"{log_path}.1", f"{log_path}.2"):
+            assert 0 < os.path.getsize(path) <= 100
+
+    def test_each_process_writes_its_own_file(self, log_file, log_path):
+        """Workers never share a file, so buffered writes cannot interleave"""
+        handler = BufferedRotatingFileHandler(log_file, delay=True)
+        handler.handle(_record("event"))
+        handler.close()
+
+        assert handler.baseFilename == log_path
+        assert os.path.exists(log_path)
+        assert not os.path.exists(log_file)
+
+    def test_forked_process_switches_to_its_own_file(self, log_file, log_path):
+        """A forked worker leaves the parent's buffered records to the parent"""
+        handler = BufferedRotatingFileHandler(log_file, delay=True)
+        handler.handle(_record("parent event"))
+        child_pid = os.getpid() + 1
+        with patch("app.services.audit.os.getpid", return_value=child_pid):
+            handler.handle(_record("child event"))
+            child_path = handler.baseFilename
+            handler.close()
+
+        assert child_path != log_path
+        with open(child_path) as f:
+            assert f.read().splitlines() == ["child event"]
+
+    def test_rotation_counts_encoded_bytes(self, log_file, log_path):
+        """Multi-byte characters count towards maxBytes by their encoded size"""
+        handler = BufferedRotatingFileHandler(
+            log_file, maxBytes=100, backupCount=3, delay=True, encoding="utf-8"
+        )
+        for _ in range(6):
+            handler.handle(_record("é" * 20))
+        handler.close()
+
+        # 41 bytes per line, so only two fit in each file
+        assert os.path.exists(f"{log_path}.2")
+        for path in (log_path, f"{log_path}.1", f"{log_path}.2"):
+            assert os.path.getsize(path) == 82
+
+
+class TestLogAudit:
+    """Test audit event formatting and duplicate suppression"""
+
+    def test_simple_event_logged_as_pipe_line(self, audit_log):
+        """Events without details or IP use the pipe-delimited format"""
+        log_audit(
+            AuditAction.PRODUCT_CREATED, user_id=1, target_type="product", target_id=5
+        )
+
+        assert len(audit_log.records) == 1
+        fields = audit_log.records[0].getMessage().split("|")
+        assert fields[1:] == ["product_created", "True", "1", "", "product", "5"]
+
+    @pytest.mark.parametrize(
+        "user_email", ["a|b@vendly.com", "a@vendly.com\n2026-01-01|logout|True"]
+    )
+    def test_unsafe_simple_event_logged_as_json(self, audit_log, user_email):
+        """Values that would break the pipe format are logged as JSON instead"""
+        log_audit(AuditAction.LOGIN_SUCCESS, user_id=1, user_email=user_email)
+
+        message = audit_log.records[0].getMessage()
+        assert "\n" not in message
+        assert json.loads(message)["user_email"] == user_email
+
+    def test_event_with_details_logged_as_json(self, audit_log):
+        """Events with details are logged as a JSON object"""
+        log_audit(AuditAction.SALE_VOIDED, user_id=1, details={"reason": "typo"})
+
+        entry = json.loads(audit_log.records[0].getMessage())
+        assert entry["action"] == "sale_voided"
+        assert entry["details"] == {"reason": "typo"}
+        assert "ip_address" not in entry
+
+    def test_duplicates_suppressed_within_window(self, audit_log):
+        """Identical events within the window are logged once"""
+        for _ in range(5):
+            log_audit(AuditAction.LOGIN_FAILED, user_email="a@b.com", success=False)
+        log_audit(AuditAction.LOGIN_FAILED, user_email="c@d.com", success=False)
+
+        assert len(audit_log.records) == 2
+
+    def test_duplicates_logged_after_window(self, audit_log):
+        """Repeats outside the window are logged again"""
+        with patch.object(audit, "DEDUP_WINDOW_SECONDS", 0):
+            log_audit(AuditAction.LOGOUT, user_id=1)
+            log_audit(AuditAction.LOGOUT, user_id=1)
+
+        assert len(audit_log.records) == 2
+
+    def test_rollup_reports_suppressed_count_and_details(self, audit_log):
+        """The roll-up line counts suppressed events and keeps their details"""
+        for _ in range(3):
+            log_audit(
+                AuditAction.LOGIN_FAILED,
+                user_email="a@b.com",
+                ip_address="10.0.0.1",
+                details={"reason": "invalid_credentials"},
+                success=False,
+            )
+        flush_suppressed_events()
+
+        assert len(audit_log.records) == 2
+        rollup = audit_log.records[1]
+        entry = json.loads(rollup.getMessage())
+        assert rollup.levelno == logging.WARNING
+        assert entry["suppressed_duplicates"] == 2
+        assert entry["user_email"] == "a@b.com"
+        assert entry["ip_address"] == "10.0.0.1"
+        assert entry["details"] == {"reason": "invalid_credentials"}
+
+        flush_suppressed_events()
+        assert len(audit_log.records) == 2
+
+    def test_pending_rollups_flushed_at_exit(self, audit_log):
+        """Suppressed counts are not lost when the process exits"""
+        for _ in range(2):
+            log_audit(AuditAction.LOGIN_FAILED, user_email="a@b.com", success=False)
+
+        audit._flush_at_exit()
+
+        assert len(audit_log.records) == 2
+        entry = json.loads(audit_log.records[1].getMessage())
+        assert entry["suppressed_duplicates"] == 1
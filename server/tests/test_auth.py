@@ -2,6 +2,8 @@
 # Vendly POS - Authentication Tests
 # ===========================================
 
+from unittest.mock import patch
+
 import pytest
 from fastapi.testclient import TestClient
 
@@ -65,3 +67,60 @@ class TestAuthEndpoints:
         # Test environment always provides test user via override
         assert response.status_code == 200
         assert response.json()["email"] == "admin@vendly.com"
+
+    def test_login_after_password_change(self, client: TestClient):
+        """Cached login lookups are invalidated when a user's password changes"""
+        created = client.post(
+            "/api/v1/users",
+            json={"email": "cashier@vendly.com", "password": "first-pass"},
+        )
+        assert created.status_code == 201
+        user_id = created.json()["id"]
+
+        login = {"email": "cashier@vendly.com", "password": "first-pass"}
+        assert client.post("/api/v1/auth/login", json=login).status_code == 200
+
+        client.patch(f"/api/v1/users/{user_id}", json={"password": "second-pass"})
+
+        assert client.post("/api/v1/auth/login", json=login).status_code == 401
+        login["password"] = "second-pass"
+        assert client.post("/api/v1/auth/login", json=login).status_code == 200
+
+    def test_login_rechecks_user_changed_by_another_worker(self, client: TestClient):
+        """Deactivation or a new password made elsewhere applies at once"""
+        created = client.post(
+            "/api/v1/users",
+            json={"email": "nightshift@vendly.com", "password": "first-pass"},
+        )
+        user_id = created.json()["id"]
+        login = {"email": "nightshift@vendly.com", "password": "first-pass"}
+        assert client.post("/api/v1/auth/login", json=login).status_code == 200
+
+        # Changes handled by another worker leave this worker's cache alone
+        with patch("app.api.v1.routers.users.invalidate_user_cache"):
+            client.patch(f"/api/v1/users/{user_id}", json={"password": "second-pass"})
+        assert client.post("/api/v1/auth/login", json=login).status_code == 401
+
+        login["password"] = "second-pass"
+        assert client.post("/api/v1/auth/login", json=login).status_code == 200
+        with patch("app.api.v1.routers.users.invalidate_user_cache"):
+            client.patch(f"/api/v1/users/{user_id}", json={"is_active": False})
+        assert client.post("/api/v1/auth/login", json=login).status_code == 401
+
+    def test_login_for_user_created_after_failed_attempt(self, client: TestClient):
+        """A cached miss does not block a user created right afterwards"""
+        login = {"email": "newhire@vendly.com", "password": "welcome1"}
+        assert client.post("/api/v1/auth/login", json=login).status_code == 401
+
+        client.post("/api/v1/users", json=login)
+
+        assert client.post("/api/v1/auth/login", json=login).status_code == 200
+
+    def test_login_email_is_case_insensitive(self, client: TestClient):
+        """Emails are normalized before lookup"""
+        response = client.post(
+            "/api/v1/auth/login",
+            json={"email": "Admin@Vendly.com", "password": "admin123"},
+        )
+
+        assert response.status_code == 200
@@ -4,13 +4,29 @@ Tests for Cloud Backup Service
 Unit tests for backup functionality
 """
 
+import asyncio
+import gzip
+import io
+import json
+import os
+import threading
 from datetime import datetime, timedelta
+from typing import Optional
 from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
-
-from app.db.models import BackupJob, BackupLog
-from app.services.backup import BackupProvider, BackupStatus, CloudBackupService
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import BackupJob, BackupLog, Product
+from app.services.backup import (
+    SALE_COLUMNS,
+    SALE_ITEM_COLUMNS,
+    ZSTD_MAGIC,
+    BackupProvider,
+    BackupStatus,
+    CloudBackupService,
+    _open_backup_reader,
+)
 from app.services.backup_scheduler import BackupScheduler
 
 
@@ -25,6 +41,14 @@ def backup_service():
     return service
 
 
+def joined_sale_row(sale: dict, item: Optional[dict] = None) -> tuple:
+    """Build a sales LEFT JOIN sale_items row as returned by the backup query"""
+    item = item or {}
+    return tuple(sale.get(c) for c in SALE_COLUMNS) + tuple(
+        item.get(c) for c in SALE_ITEM_COLUMNS
+    )
+
+
 @pytest.fixture
 def backup_scheduler():
     """Create a backup scheduler instance"""
@@ -41,10 +65,13 @@ class TestCloudBackupService:
             # Mock database response
             mock_db = Mock()
             mock_result = Mock()
-            mock_result.keys.return_value = ["id", "total", "created_at"]
-            mock_result.fetchall.return_value = [
-                (1, 100.0, datetime.now()),
-                (2, 200.0, datetime.now()),
+            mock_result.yield_per.return_value = [
+                joined_sale_row(
+                    {"id": 1, "total": 100.0, "created_at": datetime.now()}
+                ),
+                joined_sale_row(
+                    {"id": 2, "total": 200.0, "created_at": datetime.now()}
+                ),
             ]
             mock_db.execute.return_value = mock_result
             mock_session.return_value = mock_db
@@ -53,8 +80,39 @@ class TestCloudBackupService:
 
             assert result["status"] == BackupStatus.completed.value
             assert result["type"] == "sales"
+            assert result["records"] == 2
             assert "backup_id" in result
 
+    @pytest.mark.asyncio
+    async def test_backup_sales_splits_items(self, backup_service):
+        """Test joined rows are split into the sales and sale_items files"""
+        with patch("app.services.backup.SessionLocal") as mock_session:
+            mock_db = Mock()
+            mock_result = Mock()
+            mock_result.yield_per.return_value = [
+                joined_sale_row({"id": 1}, {"id": 10, "sale_id": 1, "quantity": 2}),
+                joined_sale_row({"id": 1}, {"id": 11, "sale_id": 1, "quantity": 1}),
+                joined_sale_row({"id": 2}),
+            ]
+            mock_db.execute.return_value = mock_result
+            mock_session.return_value = mock_db
+
+            result = await backup_service.backup_sales_data()
+
+        # One query for both tables
+        assert mock_db.execute.call_count == 1
+        assert result["records"] == 2
+
+        sales = await backup_service._download_backup(result["file_key"])
+        assert [sale["id"] for sale in sales["data"]] == [1, 2]
+
+        items = await backup_service._download_backup_by_id(
+            "sales", f"{result['backup_id']}_items"
+        )
+        assert items["backup_type"] == "sale_items"
+        assert [item["id"] for item in items["data"]] == [10, 11]
+        assert items["data"][0]["quantity"] == 2
+
     @pytest.mark.asyncio
     async def test_backup_inventory_data(self, backup_service):
         """Test inventory data backup"""
@@ -63,7 +121,7 @@ class TestCloudBackupService:
             mock_db = Mock()
             mock_result = Mock()
             mock_result.keys.return_value = ["id", "name", "quantity"]
-            mock_result.fetchall.return_value = [
+            mock_result.yield_per.return_value = [
                 (1, "Product A", 100),
                 (2, "Product B", 50),
             ]
@@ -76,6 +134,159 @@ class TestCloudBackupService:
             assert result["type"] == "inventory"
             assert "backup_id" in result
 
+    @pytest.mark.asyncio
+    async def test_backup_round_trip(self, backup_service):
+        """Test a streamed backup can be downloaded and parsed back"""
+        created_at = datetime(2024, 1, 15, 10, 30)
+        with patch("app.services.backup.SessionLocal") as mock_session:
+            mock_db = Mock()
+            mock_result = Mock()
+            mock_result.keys.return_value = ["id", "name", "created_at"]
+            mock_result.yield_per.return_value = [
+                (1, "Product A", created_at),
+                (2, "Product B", created_at),
+            ]
+            mock_db.execute.return_value = mock_result
+            mock_session.return_value = mock_db
+
+            result = await backup_service.backup_inventory_data()
+
+        assert result["records"] == 2
+        content = await backup_service._download_backup(result["file_key"])
+        assert content["backup_id"] == result["backup_id"]
+        assert content["record_count"] == 2
+        assert content["data"][0] == {
+            "id": 1,
+            "name": "Product A",
+            "created_at": created_at.isoformat(),
+        }
+
+    @pytest.mark.asyncio
+    async def test_small_backup_stored_uncompressed(self, backup_service):
+        """Test small backups skip compression and large ones are compressed"""
+        with patch("app.services.backup.SessionLocal") as mock_session:
+            mock_db = Mock()
+            mock_result = Mock()
+            mock_result.keys.return_value = ["id", "name"]
+            mock_db.execute.return_value = mock_result
+            mock_session.return_value = mock_db
+
+            mock_result.yield_per.return_value = [(1, "Product A")]
+            small = await backup_service.backup_inventory_data()
+
+            mock_result.yield_per.return_value = [
+                (i, f"Product {i}") for i in range(500)
+            ]
+            large = await backup_service.backup_inventory_data()
+
+        assert small["file_key"].endswith(f"{small['backup_id']}.json")
+        assert not large["file_key"].endswith(f"{large['backup_id']}.json")
+
+        content = await backup_service._download_backup(small["file_key"])
+        assert content["data"] == [{"id": 1, "name": "Product A"}]
+        content = await backup_service._download_backup(large["file_key"])
+        assert content["record_count"] == 500
+
+    @pytest.mark.asyncio
+    async def test_download_sniffs_codec_not_suffix(self, backup_service):
+        """Test backups restore by their leading bytes even under the wrong suffix"""
+        with patch("app.services.backup.SessionLocal") as mock_session:
+            mock_db = Mock()
+            mock_result = Mock()
+            mock_result.keys.return_value = ["id", "name"]
+            mock_db.execute.return_value = mock_result
+            mock_session.return_value = mock_db
+
+            mock_result.yield_per.return_value = [(1, "Product A")]
+            small = await backup_service.backup_inventory_data()
+
+            mock_result.yield_per.return_value = [
+                (i, f"Product {i}") for i in range(500)
+            ]
+            large = await backup_service.backup_inventory_data()
+
+        def misnamed(file_key: str, suffix: str) -> str:
+            stem = file_key.rsplit(".json", 1)[0]
+            os.rename(
+                os.path.join(backup_service.local_path, file_key),
+                os.path.join(backup_service.local_path, stem + suffix),
+            )
+            return stem + suffix
+
+        wrong_codec = ".json.gz" if large["file_key"].endswith(".zst") else ".json.zst"
+        small_key = misnamed(small["file_key"], ".json.gz")
+        large_key = misnamed(large["file_key"], wrong_codec)
+
+        content = await backup_service._download_backup(small_key)
+        assert content["data"] == [{"id": 1, "name": "Product A"}]
+        content = await backup_service._download_backup(large_key)
+        assert content["record_count"] == 500
+
+    @pytest.mark.asyncio
+    async def test_restore_legacy_single_object_backup(self, backup_service):
+        """Test backups written as one gzipped JSON object still restore"""
+        legacy = {
+            "backup_id": "inventory_legacy",
+            "backup_type": "inventory",
+            "record_count": 2,
+            "data": [{"id": 1, "name": "Product A"}, {"id": 2, "name": "Product B"}],
+        }
+        file_key = "backups/inventory/inventory_legacy.json.gz"
+        file_path = os.path.join(backup_service.local_path, file_key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with gzip.open(file_path, "wb") as f:
+            f.write(json.dumps(legacy).encode("utf-8"))
+
+        content = await backup_service._download_backup(file_key)
+
+        assert content == legacy
+
+    def test_zstd_backup_without_zstandard(self):
+        """Test reading a zstd backup without zstandard names the package"""
+        raw = io.BytesIO(ZSTD_MAGIC + b"compressed")
+        with patch("app.services.backup.zstandard", None):
+            with pytest.raises(ImportError, match="zstandard"):
+                _open_backup_reader(raw)
+
+    @pytest.mark.asyncio
+    async def test_incremental_inventory_backup(self, backup_service, db):
+        """Test incremental backups only export products changed since the last"""
+        db.add_all(
+            [
+                Product(name="Product A", price=1, created_at=datetime(2024, 1, 1)),
+                Product(name="Product B", price=2, created_at=datetime(2024, 1, 2)),
+            ]
+        )
+        db.commit()
+
+        with patch(
+            "app.services.backup.SessionLocal", sessionmaker(bind=db.get_bind())
+        ):
+            full = await backup_service.backup_inventory_data()
+            first = await backup_service.backup_inventory_data(incremental=True)
+            unchanged = await backup_service.backup_inventory_data(incremental=True)
+
+            product = db.query(Product).filter_by(name="Product A").one()
+            product.price = 5
+            product.updated_at = datetime(2024, 2, 1)
+            db.commit()
+            changed = await backup_service.backup_inventory_data(incremental=True)
+
+        # A full backup doesn't advance the watermark, so the first
+        # incremental run still exports everything
+        assert full["records"] == 2
+        assert first["records"] == 2
+        assert first["status"] == BackupStatus.completed.value
+        assert unchanged["status"] == BackupStatus.no_changes.value
+        assert unchanged["records"] == 0
+        assert unchanged["file_key"] is None
+
+        # Rows exactly at the previous watermark (Product B) are exported again
+        assert changed["records"] == 2
+        content = await backup_service._download_backup(changed["file_key"])
+        assert content["since"] == datetime(2024, 1, 2).isoformat()
+        assert [p["name"] for p in content["data"]] == ["Product A", "Product B"]
+
     @pytest.mark.asyncio
     async def test_backup_all_data(self, backup_service):
         """Test complete data backup"""
@@ -122,6 +333,42 @@ class TestCloudBackupService:
         assert "status" in result
         assert "deleted_count" in result
 
+    @pytest.mark.asyncio
+    async def test_delete_old_backups_covered_by_lifecycle(self, backup_service):
+        """Test retention cleanup is skipped when a lifecycle rule handles it"""
+        backup_service.lifecycle_retention_days = 30
+        with patch.object(
+            backup_service, "_delete_old_provider_backups"
+        ) as mock_delete:
+            result = await backup_service.delete_old_backups(retention_days=30)
+
+        mock_delete.assert_not_called()
+        assert result["status"] == BackupStatus.completed.value
+        assert result["deleted_count"] == 0
+
+    def test_s3_lifecycle_rule_keeps_other_rules(self, backup_service):
+        """Test the S3 retention rule is merged into existing lifecycle rules"""
+        other_rule = {"ID": "logs", "Filter": {"Prefix": "logs/"}, "Status": "Enabled"}
+        backup_service.s3_client = Mock()
+        backup_service.s3_client.get_bucket_lifecycle_configuration.return_value = {
+            "Rules": [other_rule]
+        }
+
+        backup_service._ensure_s3_lifecycle_rule(30)
+
+        put = backup_service.s3_client.put_bucket_lifecycle_configuration
+        rules = put.call_args.kwargs["LifecycleConfiguration"]["Rules"]
+        assert rules[0] == other_rule
+        assert rules[1]["Expiration"] == {"Days": 30}
+        assert backup_service.lifecycle_retention_days == 30
+
+        # Already configured: no further writes
+        backup_service.s3_client.get_bucket_lifecycle_configuration.return_value = {
+            "Rules": rules
+        }
+        backup_service._ensure_s3_lifecycle_rule(30)
+        assert put.call_count == 1
+
     def test_generate_backup_id(self, backup_service):
         """Test backup ID generation"""
         backup_id_1 = CloudBackupService._generate_backup_id("sales")
@@ -159,6 +406,282 @@ class TestBackupScheduler:
         backup_scheduler.stop()
         assert backup_scheduler.is_running is False
 
+    def test_scheduler_runs_jobs_on_its_loop(self, backup_scheduler):
+        """Test coroutine jobs run directly on the scheduler's long-lived loop"""
+        loops = []
+        ran = threading.Event()
+
+        async def job():
+            loops.append(asyncio.get_running_loop())
+            ran.set()
+
+        backup_scheduler.start()
+        try:
+            backup_scheduler.scheduler.add_job(job)
+            assert ran.wait(5)
+            assert loops == [backup_scheduler._loop]
+        finally:
+            backup_scheduler.stop()
+        assert backup_scheduler._loop is None
+
+    def test_load_jobs_from_db(self, backup_scheduler, db):
+        """Test only enabled jobs are loaded and scheduled from the database"""
+        db.add_all(
+            [
+                BackupJob(
+                    name="Nightly",
+                    backup_type="sales",
+                    schedule_type="daily",
+                    schedule_time="02:00",
+                    is_enabled=True,
+                ),
+                BackupJob(
+                    name="Disabled",
+                    backup_type="full",
+                    schedule_type="weekly",
+                    is_enabled=False,
+                ),
+            ]
+        )
+        db.commit()
+        nightly = db.query(BackupJob).filter(BackupJob.name == "Nightly").one()
+
+        with patch(
+            "app.services.backup_scheduler.SessionLocal",
+            sessionmaker(bind=db.get_bind()),
+        ):
+            backup_scheduler._load_jobs_from_db()
+
+        assert backup_scheduler._loaded_jobs == {nightly.id}
+        scheduled = backup_scheduler.scheduler.get_job(f"backup_job_{nightly.id}")
+        assert scheduled.name == "Nightly"
+        assert scheduled.args == (nightly.id, "sales")
+
+    def test_execute_backup_records_result(self, backup_scheduler, db):
+        """Test a scheduled run updates the job and writes a backup log"""
+        job = BackupJob(
+            name="Nightly",
+            backup_type="sales",
+            schedule_type="daily",
+            retention_days=14,
+        )
+        db.add(job)
+        db.commit()
+
+        service = Mock()
+        service.backup_sales_data = AsyncMock(
+            return_value={
+                "status": BackupStatus.completed.value,
+                "backup_id": "abc123",
+                "file_key": "backups/sales/abc123.json",
+                "records": 5,
+            }
+        )
+        service.delete_old_backups = AsyncMock(return_value={"deleted_count": 0})
+
+        with (
+            patch(
+                "app.services.backup_scheduler.SessionLocal",
+                sessionmaker(bind=db.get_bind()),
+            ),
+            patch(
+                "app.services.backup_scheduler.get_backup_service",
+                return_value=service,
+            ),
+        ):
+            asyncio.run(backup_scheduler._execute_backup(job.id, "sales"))
+
+        service.delete_old_backups.assert_awaited_once_with(14)
+        db.refresh(job)
+        assert job.last_run_status == BackupStatus.completed.value
+        assert job.last_run_at is not None
+        log = db.query(BackupLog).filter(BackupLog.job_id == job.id).one()
+        assert log.backup_id == "abc123"
+        assert log.record_count == 5
+        assert log.started_at == job.last_run_at
+
+    def test_execute_backup_records_no_changes(self, backup_scheduler, db):
+        """Test an incremental run with nothing changed is logged as such"""
+        job = BackupJob(
+            name="Hourly inventory",
+            backup_type="inventory_incremental",
+            schedule_type="hourly",
+            retention_days=14,
+        )
+        db.add(job)
+        db.commit()
+
+        service = Mock()
+        service.backup_inventory_data = AsyncMock(
+            return_value={
+                "status": BackupStatus.no_changes.value,
+                "backup_id": "def456",
+                "file_key": None,
+                "records": 0,
+            }
+        )
+        service.delete_old_backups = AsyncMock(return_value={"deleted_count": 0})
+
+        with (
+            patch(
+                "app.services.backup_scheduler.SessionLocal",
+                sessionmaker(bind=db.get_bind()),
+            ),
+            patch(
+                "app.services.backup_scheduler.get_backup_service",
+                return_value=service,
+            ),
+        ):
+            asyncio.run(
+                backup_scheduler._execute_backup(job.id, "inventory_incremental")
+            )
+
+        service.delete_old_backups.assert_not_awaited()
+        db.refresh(job)
+        assert job.last_run_status == BackupStatus.no_changes.value
+        log = db.query(BackupLog).filter(BackupLog.job_id == job.id).one()
+        assert log.status == BackupStatus.no_changes.value
+        assert log.file_key is None
+        assert log.error_message is None
+
+    def test_execute_backup_skips_overlapping_runs(self, backup_scheduler, db):
+        """Test a job already running here or elsewhere is not run again"""
+        job = BackupJob(name="Nightly", backup_type="sales", schedule_type="daily")
+        db.add(job)
+        db.commit()
+
+        service = Mock()
+        service.backup_sales_data = AsyncMock(
+            return_value={"status": BackupStatus.failed.value}
+        )
+        with (
+            patch(
+                "app.services.backup_scheduler.SessionLocal",
+                sessionmaker(bind=db.get_bind()),
+            ),
+            patch(
+                "app.services.backup_scheduler.get_backup_service",
+                return_value=service,
+            ),
+        ):
+            # Running in this process
+            backup_scheduler._running_jobs[job.id] = Mock()
+            asyncio.run(backup_scheduler._execute_backup(job.id, "sales"))
+            backup_scheduler._running_jobs.clear()
+            service.backup_sales_data.assert_not_awaited()
+
+            # Running in another process
+            job.last_run_status = BackupStatus.in_progress.value
+            job.last_run_at = datetime.utcnow()
+            db.commit()
+            asyncio.run(backup_scheduler._execute_backup(job.id, "sales"))
+            service.backup_sales_data.assert_not_awaited()
+
+            # A stale in-progress run no longer blocks the job
+            job.last_run_at = datetime.utcnow() - timedelta(days=1)
+            db.commit()
+            asyncio.run(backup_scheduler._execute_backup(job.id, "sales"))
+            service.backup_sales_data.assert_awaited_once()
+
+        assert backup_scheduler._running_jobs == {}
+
+    def test_jobs_firing_together_are_claimed_together(self, backup_scheduler, db):
+        """Test jobs due at the same time are claimed with a single statement"""
+        jobs = [
+            BackupJob(name=f"Nightly {i}", backup_type="sales", schedule_type="daily")
+            for i in range(3)
+        ]
+        db.add_all(jobs)
+        db.commit()
+
+        service = Mock()
+        service.backup_sales_data = AsyncMock(
+            return_value={"status": BackupStatus.failed.value}
+        )
+
+        async def run_all():
+            await asyncio.gather(
+                *(backup_scheduler._execute_backup(job.id, "sales") for job in jobs),
+                backup_scheduler._execute_backup(999999, "sales"),
+            )
+
+        with (
+            patch(
+                "app.services.backup_scheduler.SessionLocal",
+                sessionmaker(bind=db.get_bind()),
+            ),
+            patch(
+                "app.services.backup_scheduler.get_backup_service",
+                return_value=service,
+            ),
+            patch.object(
+                backup_scheduler,
+                "_claim_jobs",
+                wraps=backup_scheduler._claim_jobs,
+            ) as claim_jobs,
+        ):
+            asyncio.run(run_all())
+
+        claim_jobs.assert_called_once()
+        assert sorted(claim_jobs.call_args.args[0]) == sorted(
+            [job.id for job in jobs] + [999999]
+        )
+        assert service.backup_sales_data.await_count == 3
+        assert backup_scheduler._pending_claims is None
+
+    @pytest.mark.asyncio
+    async def test_backup_and_cleanup(self, backup_scheduler):
+        """Test old backups are only cleaned up after a completed backup"""
+        service = Mock()
+        service.backup_sales_data = AsyncMock(
+            return_value={"status": BackupStatus.completed.value}
+        )
+        service.delete_old_backups = AsyncMock(return_value={"deleted_count": 3})
+        job = Mock(retention_days=7)
+
+        result = await backup_scheduler._backup_and_cleanup(service, "sales", job)
+        service.delete_old_backups.assert_awaited_once_with(7)
+        assert result["status"] == BackupStatus.completed.value
+
+        service.backup_sales_data.return_value = {"status": BackupStatus.failed.value}
+        service.delete_old_backups.reset_mock()
+        await backup_scheduler._backup_and_cleanup(service, "sales", job)
+        service.delete_old_backups.assert_not_awaited()
+
+    def test_cleanup_runs_in_background(self, backup_scheduler):
+        """Test cleanup on the scheduler loop doesn't hold up the backup job"""
+        release = asyncio.Event()
+
+        async def delete_old_backups(retention_days):
+            await release.wait()
+            return {"deleted_count": 0}
+
+        service = Mock()
+        service.backup_sales_data = AsyncMock(
+            return_value={"status": BackupStatus.completed.value}
+        )
+        service.delete_old_backups = Mock(side_effect=delete_old_backups)
+
+        backup_scheduler._start_loop()
+        try:
+            result = asyncio.run_coroutine_threadsafe(
+                backup_scheduler._backup_and_cleanup(
+                    service, "sales", Mock(retention_days=7)
+                ),
+                backup_scheduler._loop,
+            ).result()
+            assert result["status"] == BackupStatus.completed.value
+            assert len(backup_scheduler._cleanup_tasks) == 1
+            backup_scheduler._loop.call_soon_threadsafe(release.set)
+            asyncio.run_coroutine_threadsafe(
+                backup_scheduler._wait_for_jobs(), backup_scheduler._loop
+            ).result()
+        finally:
+            backup_scheduler._stop_loop()
+
+        service.delete_old_backups.assert_called_once_with(7)
+        assert backup_scheduler._cleanup_tasks == set()
+
     def test_create_hourly_trigger(self, backup_scheduler):
         """Test hourly trigger creation"""
         mock_job = Mock()
@@ -195,6 +718,16 @@ class TestBackupScheduler:
         trigger = backup_scheduler._create_trigger(mock_job)
         assert trigger is not None
 
+    def test_trigger_reused_for_same_schedule(self, backup_scheduler):
+        """Test jobs with the same schedule share one cached trigger"""
+        daily = Mock(schedule_type="daily", schedule_time="02:00")
+        same_daily = Mock(schedule_type="daily", schedule_time="02:00")
+        other_daily = Mock(schedule_type="daily", schedule_time="03:30")
+
+        trigger = backup_scheduler._create_trigger(daily)
+        assert backup_scheduler._create_trigger(same_daily) is trigger
+        assert backup_scheduler._create_trigger(other_daily) is not trigger
+
     def test_create_invalid_trigger(self, backup_scheduler):
         """Test invalid schedule type"""
         mock_job = Mock()
@@ -247,8 +780,9 @@ class TestBackupIntegration:
         with patch("app.services.backup.SessionLocal") as mock_session:
             mock_db = Mock()
             mock_result = Mock()
-            mock_result.keys.return_value = ["id", "total"]
-            mock_result.fetchall.return_value = [(1, 100.0)]
+            mock_result.yield_per.return_value = [
+                joined_sale_row({"id": 1, "total": 100.0})
+            ]
             mock_db.execute.return_value = mock_result
             mock_session.return_value = mock_db
 
@@ -2,13 +2,20 @@
 Test cases for barcode service and API endpoints.
 """
 
+import base64
+import io
 from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
-from app.services.barcode_service import BarcodeFormat, BarcodeService
+from app.services.barcode_service import (
+    BarcodeFormat,
+    BarcodeOutput,
+    BarcodeService,
+    StaleWhileRevalidateCache,
+)
 
 
 @pytest.fixture
@@ -89,6 +96,19 @@ class TestBarcodeService:
         is_valid = service.validate_barcode("CODE39DATA", BarcodeFormat.CODE39)
         assert is_valid["valid"] is True
 
+    def test_validate_code39_invalid_characters(self):
+        """Test Code39 rejects characters outside its character set."""
+        service = BarcodeService()
+        assert service.validate_barcode("code-39 $x", "code39")["valid"] is True
+        assert service.validate_barcode("CODE#39", "code39")["valid"] is False
+        assert service.validate_barcode("CAFÉ", "code39")["valid"] is False
+
+    def test_validate_ean13_non_ascii_digits(self):
+        """Test EAN-13 only accepts ASCII digits."""
+        service = BarcodeService()
+        is_valid = service.validate_barcode("٩٧٨٠١٣٤٦٨٥٩٩١", "ean13")
+        assert is_valid["valid"] is False
+
     def test_validate_upca_valid(self):
         """Test validating valid UPC-A."""
         service = BarcodeService()
@@ -129,6 +149,19 @@ class TestBarcodeService:
         )  # 3 digits instead of 13
         assert is_valid["valid"] is False
 
+    def test_validate_unknown_format(self):
+        """Test validating with a format that isn't supported."""
+        service = BarcodeService()
+        is_valid = service.validate_barcode("123", "pdf417")
+        assert is_valid["valid"] is False
+        assert "pdf417" in is_valid["error"]
+
+    def test_validate_data_matrix(self):
+        """Test DataMatrix data is accepted."""
+        service = BarcodeService()
+        is_valid = service.validate_barcode("ABC", "datamatrix")
+        assert is_valid["valid"] is True
+
     def test_generate_qr_code(self):
         """Test generating QR code."""
         service = BarcodeService()
@@ -142,6 +175,165 @@ class TestBarcodeService:
         # Should either have image or error
         assert result is not None
 
+    def test_generate_linear_barcode_encodes_once(self):
+        """Test PNG and SVG output share a single barcode encoding."""
+        from barcode.codex import Code128
+
+        BarcodeService.clear_cache()
+        with patch.object(
+            Code128, "build", autospec=True, side_effect=Code128.build
+        ) as build:
+            result = BarcodeService.generate_barcode(
+                data="SKU-12345", format=BarcodeFormat.CODE128
+            )
+
+        assert result["success"] is True
+        assert result["image_base64"].startswith("data:image/png;base64,")
+        assert result["svg"].lstrip().startswith("<?xml")
+        assert build.call_count == 1
+
+    def test_generate_qr_code_segno(self):
+        """Test segno QR codes come back at exactly the requested size."""
+        pytest.importorskip("segno")
+        image_module = pytest.importorskip("PIL.Image")
+        result = BarcodeService._generate_qr_code(
+            "https://vendly.com/product/42", 200, 100, True
+        )
+
+        assert result["success"] is True
+        assert (result["width"], result["height"]) == (200, 100)
+        png = base64.b64decode(result["image_base64"].split(",", 1)[1])
+        with image_module.open(io.BytesIO(png)) as image:
+            assert image.size == (200, 100)
+            # The symbol is centred, with white padding at the sides
+            assert image.convert("L").getpixel((0, 50)) == 255
+        assert '<svg width="200" height="100" ' in result["svg"]
+        assert "viewBox=" in result["svg"]
+
+    def test_segno_qr_code_is_never_micro(self):
+        """Test short SKUs still encode as full-size QR, not Micro QR."""
+        segno = pytest.importorskip("segno")
+        make_qr = segno.make_qr
+        created = []
+
+        def record(*args, **kwargs):
+            qr = make_qr(*args, **kwargs)
+            created.append(qr)
+            return qr
+
+        with patch.object(segno, "make_qr", record):
+            result = BarcodeService._generate_qr_code("SKU-001", 200, 200, True)
+
+        assert result["success"] is True
+        assert len(created) == 1
+        assert not created[0].is_micro
+
+    def test_generate_qr_code_qrcode_fallback(self):
+        """Test QR codes fall back to qrcode when segno is unavailable."""
+        with patch("app.services.barcode_service.segno", None):
+            result = BarcodeService._generate_qr_code("SKU-1", 200, 200, True)
+
+        assert result["success"] is True
+        assert result["width"] == 200
+
+    def test_qrcode_fallback_encodes_once(self):
+        """Test the qrcode fallback builds the code once for PNG and SVG."""
+        import qrcode
+
+        with (
+            patch("app.services.barcode_service.segno", None),
+            patch.object(
+                qrcode.QRCode, "make", autospec=True, side_effect=qrcode.QRCode.make
+            ) as make,
+        ):
+            result = BarcodeService._generate_qr_code("SKU-1", 200, 200, True)
+
+        assert make.call_count == 1
+        assert result["image_base64"].startswith("data:image/png;base64,")
+        assert "<svg" in result["svg"]
+
+    def test_generate_barcode_single_output(self):
+        """Test only the requested image formats are rendered."""
+        for format in (BarcodeFormat.CODE128, BarcodeFormat.QR_CODE):
+            png = BarcodeService.generate_barcode(
+                "SKU-12345", format, outputs=frozenset({BarcodeOutput.PNG})
+            )
+            assert png["success"] is True
+            assert "image_base64" in png
+            assert "svg" not in png
+
+            svg = BarcodeService.generate_barcode(
+                "SKU-12345", format, outputs=frozenset({BarcodeOutput.SVG})
+            )
+            assert svg["success"] is True
+            assert "image_base64" not in svg
+            assert "<svg" in svg["svg"]
+
+    def test_generate_barcode_library_missing(self):
+        """Test a clear error is returned when a barcode library is missing."""
+        with patch("app.services.barcode_service.get_barcode_class", None):
+            result = BarcodeService._generate_linear_barcode(
+                "SKU-1", BarcodeFormat.CODE128, 200, 100, True
+            )
+        assert result["success"] is False
+        assert "python-barcode" in result["error"]
+
+        with (
+            patch("app.services.barcode_service.segno", None),
+            patch("app.services.barcode_service.qrcode", None),
+        ):
+            result = BarcodeService._generate_qr_code("SKU-1", 200, 200, True)
+        assert result["success"] is False
+        assert "segno" in result["error"]
+
+    def test_generate_barcode_cached(self):
+        """Test repeated renders of the same barcode are served from cache."""
+        BarcodeService.clear_cache()
+        with patch.object(
+            BarcodeService,
+            "_generate_linear_barcode",
+            return_value={"success": True, "svg": "<svg/>"},
+        ) as render:
+            first = BarcodeService.generate_barcode("SKU-1", BarcodeFormat.CODE128)
+            first["svg"] = "changed"
+            second = BarcodeService.generate_barcode("SKU-1", BarcodeFormat.CODE128)
+            BarcodeService.generate_barcode("SKU-2", BarcodeFormat.CODE128)
+        BarcodeService.clear_cache()
+
+        assert render.call_count == 2
+        assert second["svg"] == "<svg/>"
+
+    def test_stale_while_revalidate_cache(self):
+        """Test stale entries are served while refreshed in the background."""
+        calls = []
+
+        def render(data):
+            calls.append(data)
+            return f"{data}-{len(calls)}"
+
+        cache = StaleWhileRevalidateCache(render, maxsize=2, max_age=10, stale_ttl=5)
+        with patch("app.services.barcode_service.time.monotonic") as clock:
+            clock.return_value = 100
+            assert cache("A") == "A-1"
+            clock.return_value = 105
+            assert cache("A") == "A-1"  # fresh
+
+            clock.return_value = 112
+            with patch("app.services.barcode_service.threading.Thread") as thread:
+                assert cache("A") == "A-1"  # stale, refresh scheduled
+                assert cache("A") == "A-1"  # refresh already pending
+            thread.assert_called_once()
+            thread.return_value.start.assert_called_once()
+            cache._refresh(("A",))
+            assert cache("A") == "A-2"
+
+            clock.return_value = 200
+            assert cache("A") == "A-3"  # expired, recomputed inline
+
+        cache("B")
+        cache("C")
+        assert list(cache._entries) == [("B",), ("C",)]
+
 
 class TestBarcodeAPI:
     """Test Barcode API endpoints."""
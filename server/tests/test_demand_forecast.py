@@ -10,10 +10,13 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
 import pytest
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 # Check for optional dependencies
@@ -258,6 +261,29 @@ class TestDemandForecastService:
         assert "quantity" in result.columns
         assert len(result) > 0
 
+    def test_get_product_sales_history_batched(
+        self, db: Session, sample_sales_data: m.Product
+    ):
+        """Test demand history read in several batches comes back whole"""
+        service = DemandForecastService()
+        expected = sum(
+            h.quantity_sold
+            for h in db.query(m.DemandHistory).filter(
+                m.DemandHistory.product_id == sample_sales_data.id
+            )
+        )
+
+        with patch("app.services.demand_forecast_service.HISTORY_BATCH_SIZE", 7):
+            result = service.get_product_sales_history(
+                db, sample_sales_data.id, days_back=90
+            )
+
+        assert len(result) == 60
+        assert result["quantity"].sum() == expected
+        assert pd.api.types.is_datetime64_any_dtype(result["date"])
+        assert result["quantity"].dtype == np.int64
+        assert result["revenue"].dtype == np.float64
+
     def test_get_product_sales_history_no_data(
         self, db: Session, sample_product: m.Product
     ):
@@ -268,6 +294,73 @@ class TestDemandForecastService:
 
         assert result.empty
 
+    def test_get_product_sales_history_cached(
+        self, db: Session, sample_sales_data: m.Product
+    ):
+        """Test repeated history reads are cached until the history changes"""
+        service = DemandForecastService()
+
+        first = service.get_product_sales_history(db, sample_sales_data.id)
+        first["quantity"] = 0
+        with patch.object(service, "_fetch_sales_history") as fetch:
+            second = service.get_product_sales_history(db, sample_sales_data.id)
+        fetch.assert_not_called()
+        assert second["quantity"].sum() > 0
+
+        service.update_demand_history(
+            db, sample_sales_data.id, datetime.utcnow(), quantity=5
+        )
+        with patch.object(service, "_fetch_sales_history") as fetch:
+            service.get_product_sales_history(db, sample_sales_data.id)
+        fetch.assert_called_once()
+
+    def test_get_product_sales_history_from_sales(
+        self, db: Session, sample_product: m.Product
+    ):
+        """Test sales are aggregated per day when there is no demand history"""
+        service = DemandForecastService()
+        user = m.User(
+            email="cashier@vendly.com",
+            password_hash="x",
+            full_name="Cashier",
+            role="clerk",
+        )
+        db.add(user)
+        db.flush()
+        yesterday = datetime.utcnow().replace(hour=12) - timedelta(days=1)
+        for created_at, quantity in [
+            (yesterday - timedelta(days=1), 1),
+            (yesterday, 2),
+            (yesterday + timedelta(hours=1), 3),
+        ]:
+            sale = m.Sale(
+                user_id=user.id,
+                total=quantity * 10,
+                payment_method="cash",
+                created_at=created_at,
+            )
+            db.add(sale)
+            db.flush()
+            db.add(
+                m.SaleItem(
+                    sale_id=sale.id,
+                    product_id=sample_product.id,
+                    quantity=quantity,
+                    unit_price=10,
+                    subtotal=quantity * 10,
+                )
+            )
+        db.commit()
+
+        result = service.get_product_sales_history(db, sample_product.id)
+
+        assert list(result["quantity"]) == [1, 5]
+        assert list(result["revenue"]) == [10.0, 50.0]
+        assert list(result["date"].dt.date) == [
+            (yesterday - timedelta(days=1)).date(),
+            yesterday.date(),
+        ]
+
     def test_train_forecast_model(self, db: Session, sample_sales_data: m.Product):
         """Test model training"""
         service = DemandForecastService()
@@ -279,6 +372,39 @@ class TestDemandForecastService:
         assert "model_type" in result
         assert "metrics" in result
 
+    def test_train_and_forecast(self, db: Session, sample_sales_data: m.Product):
+        """Test training and forecasting share one history fetch, reusing the fit"""
+        service = DemandForecastService()
+
+        with (
+            patch.object(
+                service,
+                "_fetch_sales_history",
+                wraps=service._fetch_sales_history,
+            ) as fetch,
+            patch.object(
+                service.forecaster,
+                "train_ensemble",
+                wraps=service.forecaster.train_ensemble,
+            ) as train,
+        ):
+            result = service.train_and_forecast(db, sample_sales_data.id, days_ahead=7)
+            fetch.assert_called_once()
+            train.assert_called_once()
+
+            again = service.train_and_forecast(db, sample_sales_data.id, days_ahead=7)
+            train.assert_called_once()
+
+            # Explicit training always refits the shared model
+            retrained = service.train_forecast_model(db, sample_sales_data.id)
+            assert train.call_count == 2
+
+        assert result["training"]["product_id"] == sample_sales_data.id
+        assert "metrics" in result["training"]
+        assert len(result["forecast"]["forecast"]) == 7
+        assert again["training"]["metrics"] == result["training"]["metrics"]
+        assert retrained["metrics"] == result["training"]["metrics"]
+
     def test_generate_forecast(self, db: Session, sample_sales_data: m.Product):
         """Test forecast generation"""
         service = DemandForecastService()
@@ -327,6 +453,32 @@ class TestDemandForecastService:
         )
 
         assert len(details) == 10
+        db.expire_all()
+        assert not any(isinstance(d.forecasted_quantity, Decimal) for d in details)
+        forecast = db.get(m.DemandForecast, result["forecast_id"])
+        assert forecast is not None
+        assert not isinstance(forecast.average_demand, Decimal)
+
+    def test_generate_forecast_derives_average_demand(
+        self, db: Session, sample_sales_data: m.Product
+    ):
+        """Test average demand is computed when the model doesn't report it"""
+        service = DemandForecastService()
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+        forecast = [
+            {"date": tomorrow + timedelta(days=i), "forecast": quantity}
+            for i, quantity in enumerate([4.0, 6.0, 11.0])
+        ]
+
+        with patch.object(
+            service.forecaster, "forecast", return_value={"forecast": forecast}
+        ):
+            result = service.generate_forecast(db, sample_sales_data.id, days_ahead=3)
+
+        assert result["average_demand"] == 7.0
+        record = db.get(m.DemandForecast, result["forecast_id"])
+        assert record is not None
+        assert float(record.average_demand) == 7.0
 
     def test_evaluate_forecast(self, db: Session, sample_sales_data: m.Product):
         """Test forecast evaluation"""
@@ -362,6 +514,88 @@ class TestDemandForecastService:
         assert "latest_forecast_id" in summary
         assert "next_7_days" in summary
 
+    def test_get_forecast_summary_queries(self, db: Session, sample_product: m.Product):
+        """Test the summary loads the forecast, product and details in two queries"""
+        service = DemandForecastService()
+        now = datetime.utcnow()
+        forecast = m.DemandForecast(
+            product_id=sample_product.id, forecast_date=now, average_demand=5
+        )
+        db.add(forecast)
+        db.flush()
+        for day in (1, 5, 10):
+            db.add(
+                m.ForecastDetail(
+                    demand_forecast_id=forecast.id,
+                    forecast_for_date=now + timedelta(days=day),
+                    forecasted_quantity=5,
+                )
+            )
+        db.commit()
+        product_id = sample_product.id
+        db.expunge_all()
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            summary = service.get_forecast_summary(db, product_id)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert len(statements) == 2
+        assert summary["product_name"] == "Test Product"
+        assert summary["current_stock"] == 100
+        assert len(summary["next_7_days"]) == 2
+
+    def test_get_forecast_summary_many(self, db: Session, sample_product: m.Product):
+        """Test summaries for several products come back in two queries"""
+        service = DemandForecastService()
+        other = m.Product(name="Other Product", sku="OTHER-001", price=5, quantity=3)
+        db.add(other)
+        db.flush()
+        now = datetime.utcnow()
+        for product, demand in ((sample_product, 5), (sample_product, 8), (other, 2)):
+            forecast = m.DemandForecast(
+                product_id=product.id, forecast_date=now, average_demand=demand
+            )
+            db.add(forecast)
+            db.flush()
+            for day in (1, 2, 10):
+                db.add(
+                    m.ForecastDetail(
+                        demand_forecast_id=forecast.id,
+                        forecast_for_date=now + timedelta(days=day),
+                        forecasted_quantity=demand,
+                    )
+                )
+        db.commit()
+        product_ids = [sample_product.id, other.id, other.id + 1]
+        db.expunge_all()
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            summaries = service.get_forecast_summary_many(db, product_ids)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert len(statements) == 2
+        assert set(summaries) == set(product_ids[:2])
+        for product_id, summary in summaries.items():
+            assert summary == service.get_forecast_summary(db, product_id)
+        assert summaries[product_ids[0]]["average_demand"] == 8
+        assert summaries[product_ids[1]]["product_name"] == "Other Product"
+        assert len(summaries[product_ids[1]]["next_7_days"]) == 2
+        assert service.get_forecast_summary_many(db, []) == {}
+
     def test_get_low_stock_alerts(self, db: Session, sample_sales_data: m.Product):
         """Test low stock alert generation"""
         service = DemandForecastService()
@@ -374,6 +608,76 @@ class TestDemandForecastService:
 
         assert isinstance(alerts, list)
 
+    def test_get_low_stock_alerts_uses_latest_active_forecast(
+        self, db: Session, sample_product: m.Product
+    ):
+        """Test alerts sum the latest active forecast over the threshold window"""
+        service = DemandForecastService()
+        now = datetime.utcnow()
+
+        def add_forecast(created_at, daily, is_active=True, product=sample_product):
+            forecast = m.DemandForecast(
+                product_id=product.id,
+                forecast_date=created_at,
+                average_demand=daily,
+                is_active=is_active,
+                created_at=created_at,
+            )
+            db.add(forecast)
+            db.flush()
+            # Eight days ahead, so the last day falls outside a 7 day window
+            for day in range(1, 9):
+                db.add(
+                    m.ForecastDetail(
+                        demand_forecast_id=forecast.id,
+                        forecast_for_date=now + timedelta(days=day),
+                        forecasted_quantity=daily,
+                    )
+                )
+
+        add_forecast(now - timedelta(days=2), 100)
+        add_forecast(now - timedelta(days=1), 20)
+        add_forecast(now, 1, is_active=False)
+        well_stocked = m.Product(name="Plenty", sku="TEST-002", price=1, quantity=500)
+        db.add(well_stocked)
+        db.flush()
+        db.add(
+            m.DemandForecast(
+                product_id=well_stocked.id,
+                forecast_date=now,
+                average_demand=1,
+            )
+        )
+        scarce = m.Product(name="Scarce", sku="TEST-003", price=1, quantity=0)
+        db.add(scarce)
+        db.flush()
+        add_forecast(now, 50, product=scarce)
+        db.commit()
+
+        alerts = service.get_low_stock_alerts(db, threshold_days=7)
+
+        # Largest shortage first
+        assert alerts == [
+            {
+                "product_id": scarce.id,
+                "product_name": "Scarce",
+                "current_stock": 0,
+                "forecasted_demand": 350.0,
+                "shortage": 350.0,
+                "reorder_recommended": True,
+                "reorder_quantity": 525,
+            },
+            {
+                "product_id": sample_product.id,
+                "product_name": "Test Product",
+                "current_stock": 100,
+                "forecasted_demand": 140.0,
+                "shortage": 40.0,
+                "reorder_recommended": True,
+                "reorder_quantity": 60,
+            },
+        ]
+
     def test_update_demand_history(self, db: Session, sample_product: m.Product):
         """Test updating demand history"""
         service = DemandForecastService()
@@ -405,6 +709,59 @@ class TestDemandForecastService:
             # Error response is acceptable for edge cases
             assert isinstance(comparison["error"], str)
 
+    def test_get_product_forecast_comparison_matches_actuals(
+        self, db: Session, sample_sales_data: m.Product
+    ):
+        """Test forecast days are paired with the actual sales for that day"""
+        service = DemandForecastService()
+        history = (
+            db.query(m.DemandHistory)
+            .filter(m.DemandHistory.product_id == sample_sales_data.id)
+            .order_by(m.DemandHistory.date.desc())
+            .limit(3)
+            .all()
+        )
+        forecast = m.DemandForecast(
+            product_id=sample_sales_data.id,
+            forecast_date=datetime.utcnow(),
+            average_demand=10,
+        )
+        db.add(forecast)
+        db.flush()
+        for h in history:
+            db.add(
+                m.ForecastDetail(
+                    demand_forecast_id=forecast.id,
+                    forecast_for_date=h.date,
+                    forecasted_quantity=10,
+                )
+            )
+        db.add(
+            m.ForecastDetail(
+                demand_forecast_id=forecast.id,
+                forecast_for_date=datetime.utcnow() + timedelta(days=1),
+                forecasted_quantity=10,
+            )
+        )
+        db.commit()
+
+        comparison = service.get_product_forecast_comparison(db, sample_sales_data.id)
+
+        actual = {c["date"]: c["actual"] for c in comparison["comparison"]}
+        for h in history:
+            assert actual[h.date.date().isoformat()] == h.quantity_sold
+        tomorrow = (datetime.utcnow() + timedelta(days=1)).date().isoformat()
+        assert actual[tomorrow] == 0
+
+        for c in comparison["comparison"]:
+            assert c["error"] == pytest.approx(c["actual"] - 10)
+            assert c["accuracy_percent"] == pytest.approx(
+                max(0.0, 100 - abs(c["error"]) / 10.001 * 100)
+            )
+        assert comparison["avg_accuracy"] == pytest.approx(
+            np.mean([c["accuracy_percent"] for c in comparison["comparison"]])
+        )
+
 
 class TestDemandForecastIntegration:
     """Integration tests for demand forecasting"""
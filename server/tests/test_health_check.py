@@ -0,0 +1,128 @@
+# ===========================================
+# Vendly POS - Health Check Tests
+# ===========================================
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.services import health_check
+from app.services.health_check import HealthCheckService, HealthStatus, ServiceHealth
+
+
+@pytest.fixture(autouse=True)
+def clear_health_cache():
+    health_check._health_cache.clear()
+    yield
+    health_check._health_cache.clear()
+
+
+def _slow_check(name: str, seconds: float):
+    async def check() -> ServiceHealth:
+        await asyncio.sleep(seconds)
+        return ServiceHealth(name=name, message=f"{name} is fine")
+
+    return check
+
+
+class TestHealthChecks:
+    """Test the aggregated health check"""
+
+    def test_checks_run_concurrently(self):
+        """Total time follows the slowest check, not the sum"""
+        with patch.multiple(
+            HealthCheckService,
+            check_database=_slow_check("Database", 0.3),
+            check_redis=_slow_check("Redis", 0.3),
+            check_kafka=_slow_check("Kafka", 0.3),
+        ):
+            start = time.monotonic()
+            result = asyncio.run(HealthCheckService.get_all_health_checks())
+            elapsed = time.monotonic() - start
+
+        assert elapsed < 0.6
+        assert result["status"] == HealthStatus.HEALTHY.value
+        assert [s["name"] for s in result["services"]] == [
+            "API",
+            "Database",
+            "Redis",
+            "Kafka",
+        ]
+
+    def test_hung_check_reported_unhealthy(self):
+        """A check that never answers is cut off by the timeout"""
+        with (
+            patch.multiple(
+                HealthCheckService,
+                check_database=_slow_check("Database", 10),
+                check_redis=_slow_check("Redis", 0),
+                check_kafka=_slow_check("Kafka", 0),
+            ),
+            patch("app.services.health_check.HEALTH_CHECK_TIMEOUT", 0.1),
+        ):
+            result = asyncio.run(HealthCheckService.get_all_health_checks())
+
+        database = result["services"][1]
+        assert result["status"] == HealthStatus.UNHEALTHY.value
+        assert database["status"] == HealthStatus.UNHEALTHY.value
+        assert database["message"] == "Database health check timed out"
+
+    def test_blocking_probe_runs_off_the_event_loop(self):
+        """A slow database ping does not hold up other coroutines"""
+
+        def slow_select_one():
+            time.sleep(0.3)
+            return 1
+
+        async def probe_twice():
+            return await asyncio.gather(
+                HealthCheckService.check_database(),
+                HealthCheckService.check_database(),
+            )
+
+        with patch("app.services.health_check._select_one", slow_select_one):
+            start = time.monotonic()
+            results = asyncio.run(probe_twice())
+            elapsed = time.monotonic() - start
+
+        assert elapsed < 0.55
+        assert all(r.status == HealthStatus.HEALTHY for r in results)
+
+    def test_results_cached_for_ttl(self):
+        """Repeated probes within the TTL reuse the last result"""
+        calls = []
+
+        def select_one():
+            calls.append(1)
+            return 1
+
+        with patch("app.services.health_check._select_one", select_one):
+            first = asyncio.run(HealthCheckService.check_database())
+            second = asyncio.run(HealthCheckService.check_database())
+            assert second is first
+            assert len(calls) == 1
+
+            with patch.dict(health_check.HEALTH_CACHE_TTLS, {"Database": 0}):
+                asyncio.run(HealthCheckService.check_database())
+            assert len(calls) == 2
+
+    def test_kafka_producer_reused_across_probes(self):
+        """Kafka probes share one producer instead of bootstrapping each time"""
+        pytest.importorskip("kafka.errors")
+
+        with (
+            patch.object(health_check.settings, "KAFKA_ENABLED", True),
+            patch("app.services.health_check.KafkaProducer") as producer_cls,
+            patch.dict(health_check.HEALTH_CACHE_TTLS, {"Kafka": 0}),
+        ):
+            producer_cls.return_value.bootstrap_connected.return_value = True
+            try:
+                for _ in range(3):
+                    result = asyncio.run(HealthCheckService.check_kafka())
+                    assert result.status == HealthStatus.HEALTHY
+            finally:
+                health_check._reset_kafka_producer()
+
+        producer_cls.assert_called_once()
@@ -322,6 +322,33 @@ class TestSalesEndpoints:
         assert refund_result["status"] == "refunded"
         assert refund_result["refund_amount"] > 0
 
+    def test_refund_employee_email_case_insensitive(
+        self, client: TestClient, auth_headers: dict, sample_product: dict
+    ):
+        """Test the employee is found by email regardless of case"""
+        sale_data = {
+            "items": [
+                {
+                    "product_id": sample_product["id"],
+                    "quantity": 1,
+                    "unit_price": 29.99,
+                    "discount": 0,
+                }
+            ],
+            "payment_method": "cash",
+            "discount": 0,
+        }
+        sale = client.post("/api/v1/sales", json=sale_data, headers=auth_headers).json()
+
+        refund_data = {
+            "items": [{"sale_item_id": sale["items"][0]["id"], "quantity": 1}],
+            "employee_id": " Admin@Vendly.com ",
+        }
+        refund_response = client.post(
+            f"/api/v1/sales/{sale['id']}/refund", json=refund_data, headers=auth_headers
+        )
+        assert refund_response.status_code == 200
+
     def test_return_full_and_partial(
         self, client: TestClient, auth_headers: dict, sample_product: dict
     ):